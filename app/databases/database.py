@@ -1,25 +1,110 @@
-import os
-
-from dotenv import load_dotenv
 from sqlalchemy import create_engine
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.helpers.metrics import after_cursor_execute
+from app.helpers.metrics import before_cursor_execute
+from app.settings import settings
+
+# Async drivers used for each sync backend
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+
+def get_async_database_url(database_url):
+    """
+    Translate a sync database url into the url of its async driver
+    """
+    url = make_url(database_url)
+    return url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()])
+
+
+def get_engine_options(database_url, engine_settings):
+    """
+    Build the create_engine keyword arguments of a database url from the settings
+    """
+    options = {"pool_pre_ping": engine_settings.db_pool_pre_ping, "pool_recycle": engine_settings.db_pool_recycle}
+    url = make_url(database_url)
+    if url.get_backend_name() == "sqlite":
+        if url.database in (None, "", ":memory:"):
+            # In-memory databases live in a single connection, there is no pool to size
+            return {"connect_args": {"check_same_thread": False}}
+        options["connect_args"] = {"check_same_thread": False}
+    options.update(
+        pool_size=engine_settings.db_pool_size,
+        max_overflow=engine_settings.db_max_overflow,
+        pool_timeout=engine_settings.db_pool_timeout,
+    )
+    return options
+
+
+def set_sqlite_pragmas(engine, engine_settings):
+    """
+    Apply the SQLite pragmas of the settings to every new connection of engine.
 
-load_dotenv('.env')
+    WAL lets readers run while a writer commits, synchronous=NORMAL only syncs at
+    checkpoints in WAL mode, busy_timeout makes writers wait for the lock instead of
+    failing with "database is locked".
+    """
+    pragmas = [
+        f"PRAGMA journal_mode={engine_settings.sqlite_journal_mode}",
+        f"PRAGMA synchronous={engine_settings.sqlite_synchronous}",
+        f"PRAGMA busy_timeout={int(engine_settings.sqlite_busy_timeout)}",
+        f"PRAGMA mmap_size={int(engine_settings.sqlite_mmap_size)}",
+        f"PRAGMA cache_size={int(engine_settings.sqlite_cache_size)}",
+    ]
 
-USER = os.getenv('POSTGRES_USER')
-PASSWORD = os.getenv('POSTGRES_PASSWORD')
-HOST = os.getenv('POSTGRES_HOST')
-DB = os.getenv('POSTGRES_DATABASE')
-#
-# SQLALCHEMY_DATABASE_URL = f'postgresql://{USER}:{PASSWORD}@{HOST}/{DB}'
-# engine = create_engine(SQLALCHEMY_DATABASE_URL, pool_pre_ping=True)
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./requests.db"
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+
+def build_engine(database_url, engine_settings):
+    engine = create_engine(database_url, **get_engine_options(database_url, engine_settings))
+    if engine.dialect.name == "sqlite":
+        set_sqlite_pragmas(engine, engine_settings)
+    return engine
+
+
+def build_async_engine(database_url, engine_settings):
+    async_url = get_async_database_url(database_url)
+    options = get_engine_options(database_url, engine_settings)
+    if "pool_size" in options:
+        # aiosqlite defaults to NullPool, a new connection and pragmas on every checkout
+        options["poolclass"] = AsyncAdaptedQueuePool
+    engine = create_async_engine(async_url, **options)
+    if engine.dialect.name == "sqlite":
+        set_sqlite_pragmas(engine.sync_engine, engine_settings)
+    return engine
+
+
+# Every engine, the async ones through their sync_engine, reports its statements to the request metrics
+event.listen(Engine, "before_cursor_execute", before_cursor_execute)
+event.listen(Engine, "after_cursor_execute", after_cursor_execute)
+
+SQLALCHEMY_DATABASE_URL = settings.get_database_url()
+engine = build_engine(SQLALCHEMY_DATABASE_URL, settings)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
+
+DATABASE_ASYNC = settings.database_async
+
+async_engine = None
+AsyncSessionLocal = None
+if DATABASE_ASYNC:
+    async_engine = build_async_engine(SQLALCHEMY_DATABASE_URL, settings)
+    # Objects are serialized after the commit, outside of the session greenlet, so they must not expire
+    AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
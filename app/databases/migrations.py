@@ -0,0 +1,178 @@
+"""
+Schema migrations for databases created before a change of the models.
+
+Base.metadata.create_all only creates missing tables, so anything added to an existing
+table (indexes, columns) needs a migration. Each migration runs once, the applied
+versions are recorded in the schema_migrations table.
+"""
+from datetime import datetime
+
+from sqlalchemy import Column
+from sqlalchemy import DateTime
+from sqlalchemy import Integer
+from sqlalchemy import String
+from sqlalchemy import Table
+from sqlalchemy import bindparam
+from sqlalchemy import func
+from sqlalchemy import insert
+from sqlalchemy import inspect
+from sqlalchemy import select
+from sqlalchemy import text
+from sqlalchemy import update
+
+from app.databases.database import Base
+from app.helpers.text import normalize_text
+# Registers the tables of the models in Base.metadata
+from app.helpers import jobs  # noqa: F401
+from app.requests import idempotency  # noqa: F401
+from app.requests import models  # noqa: F401
+
+
+schema_migrations = Table(
+    'schema_migrations',
+    Base.metadata,
+    Column('version', Integer, primary_key=True),
+    Column('description', String, nullable=False),
+    Column('applied_at', DateTime, nullable=False, default=datetime.now),
+)
+
+
+def add_requests_indexes(connection):
+    statements = [
+        "CREATE INDEX IF NOT EXISTS ix_requests_created_at_id ON requests (created_at, id)",
+        "CREATE INDEX IF NOT EXISTS ix_requests_status_created_at ON requests (status, created_at, id)",
+        "CREATE INDEX IF NOT EXISTS ix_requests_grimorio_id_created_at ON requests (grimorio_id, created_at, id)",
+        "CREATE INDEX IF NOT EXISTS ix_requests_affinity_created_at ON requests (affinity, created_at, id)",
+        "CREATE INDEX IF NOT EXISTS ix_requests_identification ON requests (identification)",
+    ]
+    for statement in statements:
+        connection.execute(text(statement))
+
+
+def add_requests_search_columns(connection, batch_size=1000):
+    columns = {column["name"] for column in inspect(connection).get_columns("requests")}
+    for column in ("name_normalized", "last_name_normalized"):
+        if column not in columns:
+            connection.execute(text(f"ALTER TABLE requests ADD COLUMN {column} VARCHAR"))
+
+    # The folding is done in Python, the same normalize_text the inserts use
+    requests = models.Request.__table__
+    backfill = (
+        update(requests)
+        .where(requests.c.id == bindparam("request_id"))
+        .values(
+            name_normalized=bindparam("name_value"),
+            last_name_normalized=bindparam("last_name_value"),
+            updated_at=requests.c.updated_at,
+        )
+    )
+    while True:
+        rows = connection.execute(
+            select(requests.c.id, requests.c.name, requests.c.last_name)
+            .where(requests.c.name_normalized.is_(None))
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        connection.execute(backfill, [
+            {
+                "request_id": row.id,
+                "name_value": normalize_text(row.name),
+                "last_name_value": normalize_text(row.last_name),
+            }
+            for row in rows
+        ])
+
+    statements = [
+        "CREATE INDEX IF NOT EXISTS ix_requests_name_normalized ON requests (name_normalized, id)",
+        "CREATE INDEX IF NOT EXISTS ix_requests_last_name_normalized ON requests (last_name_normalized, id)",
+        # Replaces ix_requests_identification, the search pages by (identification, id)
+        "CREATE INDEX IF NOT EXISTS ix_requests_identification_id ON requests (identification, id)",
+        "DROP INDEX IF EXISTS ix_requests_identification",
+    ]
+    for statement in statements:
+        connection.execute(text(statement))
+
+
+def add_idempotency_keys_table(connection):
+    idempotency.idempotency_keys.create(connection, checkfirst=True)
+
+
+def add_jobs_table(connection):
+    jobs.jobs.create(connection, checkfirst=True)
+
+
+def add_requests_archive_table(connection):
+    models.ArchivedRequest.__table__.create(connection, checkfirst=True)
+
+
+# (version, description, migration), in the order they must be applied
+MIGRATIONS = [
+    (1, "Add indexes for the hot filters of the requests table", add_requests_indexes),
+    (2, "Add the normalized name columns of the request search", add_requests_search_columns),
+    (3, "Add the idempotency keys of POST /solicitud", add_idempotency_keys_table),
+    (4, "Add the table of the database job queue", add_jobs_table),
+    (5, "Add the archive of the requests", add_requests_archive_table),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(connection):
+    """
+    Get the last applied migration version, 0 for a database without migrations
+    """
+    return connection.execute(select(func.coalesce(func.max(schema_migrations.c.version), 0))).scalar()
+
+
+def schema_is_current(engine):
+    """
+    Check whether the database has every migration applied, False if it was never migrated
+    """
+    with engine.connect() as connection:
+        if not inspect(connection).has_table(schema_migrations.name):
+            return False
+        return get_schema_version(connection) >= LATEST_VERSION
+
+
+def ensure_schema(engine):
+    """
+    Run the migrations only if the schema version is behind.
+
+    create_all inspects every table before issuing any DDL, an up to date database is
+    checked with a single version query instead. New tables must therefore come with
+    a migration, or they won't be created on existing databases.
+
+    Returns:
+        list: The versions applied by this call.
+    """
+    if schema_is_current(engine):
+        return []
+    return run_migrations(engine)
+
+
+def run_migrations(engine):
+    """
+    Create the missing tables and apply the pending migrations.
+
+    Returns:
+        list: The versions applied by this call.
+    """
+    Base.metadata.create_all(bind=engine)
+    applied = []
+    with engine.begin() as connection:
+        current_version = get_schema_version(connection)
+        for version, description, migration in MIGRATIONS:
+            if version <= current_version:
+                continue
+            migration(connection)
+            connection.execute(insert(schema_migrations).values(version=version, description=description))
+            applied.append(version)
+    return applied
+
+
+if __name__ == '__main__':
+    from app.databases.database import engine
+
+    applied_versions = run_migrations(engine)
+    print(f"Applied migrations: {applied_versions}" if applied_versions else "Database is up to date")
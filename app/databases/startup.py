@@ -0,0 +1,89 @@
+"""
+Cold start of a worker: everything the first request would otherwise pay for.
+"""
+import logging
+import time
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.databases.migrations import ensure_schema
+from app.requests.sampler import get_grimorio_sampler
+
+logger = logging.getLogger("uvicorn.error")
+
+
+def pool_size(engine):
+    """
+    Number of connections kept by the pool of engine, 1 for the single connection pools
+    """
+    size = getattr(engine.pool, "size", None)
+    return size() if callable(size) else 1
+
+
+def warm_pool(engine):
+    """
+    Open the connections of the pool up front, so the first requests skip the connect and the pragmas
+    """
+    connections = [engine.connect() for _ in range(pool_size(engine))]
+    for connection in connections:
+        connection.execute(text("SELECT 1"))
+    for connection in connections:
+        connection.close()
+    return len(connections)
+
+
+async def warm_async_pool(async_engine):
+    connections = [await async_engine.connect().start() for _ in range(pool_size(async_engine.sync_engine))]
+    for connection in connections:
+        await connection.execute(text("SELECT 1"))
+    for connection in connections:
+        await connection.close()
+    return len(connections)
+
+
+def preload_grimorios(db):
+    """
+    Build the grimorio sampler of the engine bound to db, False if there are no grimorios yet
+    """
+    try:
+        get_grimorio_sampler(db)
+    except LookupError:
+        return False
+    return True
+
+
+def preload_engine_grimorios(engine):
+    with Session(engine) as db:
+        return preload_grimorios(db)
+
+
+async def warm_up(engine, async_engine=None):
+    """
+    Prepare the database of a new worker before it takes traffic.
+
+    The schema DDL is skipped when the version check passes, the pools are filled and
+    the grimorio samplers of both engines are built.
+
+    Returns:
+        dict: What was done and how long it took, in seconds.
+    """
+    started = time.perf_counter()
+    migrations = await run_in_threadpool(ensure_schema, engine)
+    connections = await run_in_threadpool(warm_pool, engine)
+    grimorios_loaded = await run_in_threadpool(preload_engine_grimorios, engine)
+    if async_engine is not None:
+        connections += await warm_async_pool(async_engine)
+        # Async sessions run the sync views on async_engine.sync_engine, a sampler of its own
+        async with AsyncSession(async_engine) as db:
+            await db.run_sync(preload_grimorios)
+    report = {
+        "migrations": migrations,
+        "pool_connections": connections,
+        "grimorios_loaded": grimorios_loaded,
+        "warm_up_seconds": round(time.perf_counter() - started, 4),
+    }
+    logger.info("Database warmed up: %s", report)
+    return report
@@ -0,0 +1,55 @@
+import csv
+import io
+import json
+
+
+JSON_CONTENT_TYPE = "application/json"
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+CSV_CONTENT_TYPE = "text/csv"
+
+SUPPORTED_CONTENT_TYPES = (JSON_CONTENT_TYPE, NDJSON_CONTENT_TYPE, CSV_CONTENT_TYPE)
+
+
+def parse_bulk_payload(body, content_type):
+    """
+    Parse the body of a bulk upload into a list of records.
+
+    Args:
+        body (bytes): The raw request body.
+        content_type (str): One of SUPPORTED_CONTENT_TYPES.
+
+    Returns:
+        list: One dict per record, in upload order.
+
+    Raises:
+        ValueError: If the body can't be parsed with the given content type.
+    """
+    try:
+        text = body.decode("utf-8-sig")
+    except UnicodeDecodeError as error:
+        raise ValueError("Payload must be UTF-8 encoded") from error
+
+    if content_type == JSON_CONTENT_TYPE:
+        try:
+            records = json.loads(text)
+        except json.JSONDecodeError as error:
+            raise ValueError("Invalid JSON payload") from error
+        if not isinstance(records, list):
+            raise ValueError("JSON payload must be an array of requests")
+        return records
+
+    if content_type == NDJSON_CONTENT_TYPE:
+        records = []
+        for line_number, line in enumerate(text.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError as error:
+                raise ValueError(f"Invalid NDJSON line {line_number}") from error
+        return records
+
+    if content_type == CSV_CONTENT_TYPE:
+        return list(csv.DictReader(io.StringIO(text)))
+
+    raise ValueError(f"Unsupported content type: {content_type}")
@@ -0,0 +1,244 @@
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import orjson
+from starlette.concurrency import run_in_threadpool
+
+
+MISSING = object()
+# Marks an invalidate_all among the deferred invalidations
+ALL_KEYS = object()
+
+# Invalidations of the views run by the async layer, applied once they return. The
+# views run in SQLAlchemy greenlets with a copy of the context, which still points
+# to the same list
+deferred_invalidations = ContextVar("deferred_invalidations", default=None)
+
+
+class CacheBackend:
+    """
+    Interface of the cache backends used by ReadThroughCache. The async helpers of
+    ReadThroughCache call a blocking backend in the threadpool.
+    """
+    blocking = False
+
+    def get(self, key):
+        """
+        Get the value of key, MISSING if it isn't cached
+        """
+        raise NotImplementedError
+
+    def set(self, key, value):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class MemoryCache(CacheBackend):
+    """
+    In-process LRU cache whose entries expire ttl seconds after being set
+    """
+
+    def __init__(self, maxsize=10000, ttl=60, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return MISSING
+            expires_at, value = entry
+            if expires_at <= self.clock():
+                del self.entries[key]
+                return MISSING
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (self.clock() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class RedisCache(CacheBackend):
+    """
+    Cache shared by every worker, values are stored as JSON with a ttl.
+
+    Requires the redis package, which is only needed when this backend is selected.
+    """
+    blocking = True
+
+    def __init__(self, url, ttl=60, prefix="cache:"):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return MISSING if value is None else orjson.loads(value)
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, orjson.dumps(value), ex=self.ttl)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=f"{self.prefix}*"))
+        if keys:
+            self.client.delete(*keys)
+
+
+class ReadThroughCache:
+    """
+    Load values through a backend and count hits and misses.
+
+    A value loaded while an invalidation happened is returned but not stored, so a
+    read racing with a write can't put the old value back in the cache.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.lock = threading.Lock()
+
+    def get_or_load(self, key, loader):
+        """
+        Get the cached value of key or load it with loader(), None values are not cached
+        """
+        if self.backend is None:
+            return loader()
+
+        value = self.backend.get(key)
+        if value is not MISSING:
+            with self.lock:
+                self.hits += 1
+            return value
+
+        with self.lock:
+            self.misses += 1
+            invalidations = self.invalidations
+        value = loader()
+        if value is not None and invalidations == self.invalidations:
+            self.backend.set(key, value)
+        return value
+
+    async def call_backend(self, method, *args):
+        if self.backend.blocking:
+            return await run_in_threadpool(method, *args)
+        return method(*args)
+
+    async def get_or_load_async(self, key, loader):
+        """
+        get_or_load for the event loop, loader is a coroutine function
+        """
+        if self.backend is None:
+            return await loader()
+
+        value = await self.call_backend(self.backend.get, key)
+        if value is not MISSING:
+            with self.lock:
+                self.hits += 1
+            return value
+
+        with self.lock:
+            self.misses += 1
+            invalidations = self.invalidations
+        value = await loader()
+        if value is not None and invalidations == self.invalidations:
+            await self.call_backend(self.backend.set, key, value)
+        return value
+
+    def invalidate(self, *keys):
+        if self.backend is None:
+            return
+        with self.lock:
+            self.invalidations += 1
+        deferred = deferred_invalidations.get()
+        if deferred is not None:
+            deferred.extend(keys)
+            return
+        for key in keys:
+            self.backend.delete(key)
+
+    def invalidate_all(self):
+        if self.backend is None:
+            return
+        with self.lock:
+            self.invalidations += 1
+        deferred = deferred_invalidations.get()
+        if deferred is not None:
+            deferred.append(ALL_KEYS)
+            return
+        self.backend.clear()
+
+    @contextmanager
+    def defer_invalidations(self):
+        """
+        Collect the invalidations made inside the block instead of applying them, for
+        apply_invalidations. Loads that started before still don't store their value.
+        """
+        invalidations = []
+        token = deferred_invalidations.set(invalidations)
+        try:
+            yield invalidations
+        finally:
+            deferred_invalidations.reset(token)
+
+    async def apply_invalidations(self, invalidations):
+        if self.backend is None or not invalidations:
+            return
+        if ALL_KEYS in invalidations:
+            await self.call_backend(self.backend.clear)
+            return
+        for key in invalidations:
+            await self.call_backend(self.backend.delete, key)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__ if self.backend is not None else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+
+def build_cache_backend(backend, ttl=60, maxsize=10000, redis_url=None, prefix="cache:"):
+    """
+    Build a cache backend by name: memory, redis or none
+    """
+    if backend == 'none':
+        return None
+    if backend == 'redis':
+        return RedisCache(redis_url, ttl=ttl, prefix=prefix)
+    return MemoryCache(maxsize=maxsize, ttl=ttl)
@@ -1,11 +1,29 @@
 from typing import Annotated
 
 from fastapi import Depends
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
+from app.databases.database import AsyncSessionLocal
 from app.databases.database import SessionLocal
 
 
+class ThreadedSession:
+    """
+    Expose a sync Session through the run_sync interface of AsyncSession.
+
+    Used when the async engine is disabled, the sync views then run in the threadpool
+    so they still don't block the event loop.
+    """
+
+    def __init__(self, session):
+        self.session = session
+
+    async def run_sync(self, fn, *args, **kwargs):
+        return await run_in_threadpool(fn, self.session, *args, **kwargs)
+
+
 def get_db():
     db = SessionLocal()
     try:
@@ -14,4 +32,18 @@ def get_db():
         db.close()
 
 
-db_dependency = Annotated[Session, Depends(get_db)]
\ No newline at end of file
+async def get_async_db():
+    if AsyncSessionLocal is None:
+        db = SessionLocal()
+        try:
+            yield ThreadedSession(db)
+        finally:
+            db.close()
+        return
+
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+db_dependency = Annotated[Session, Depends(get_db)]
+async_db_dependency = Annotated[AsyncSession, Depends(get_async_db)]
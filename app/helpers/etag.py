@@ -0,0 +1,72 @@
+import hashlib
+from datetime import datetime
+from datetime import timezone
+from email.utils import format_datetime
+from email.utils import parsedate_to_datetime
+
+
+def as_datetime(value):
+    """
+    Accept datetimes or their ISO strings, as stored by JSON cache backends
+    """
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def make_etag(*parts):
+    """
+    Build a strong ETag from the parts that identify a representation
+    """
+    digest = hashlib.sha1()
+    for part in parts:
+        if isinstance(part, datetime):
+            part = part.isoformat()
+        digest.update(str(part).encode())
+        digest.update(b"\0")
+    return f'"{digest.hexdigest()}"'
+
+
+def http_date(value):
+    """
+    Format a naive local datetime, as stored in updated_at, as an HTTP date
+    """
+    return format_datetime(as_datetime(value).astimezone(timezone.utc), usegmt=True)
+
+
+def etag_matches(if_none_match, etag):
+    """
+    Weak comparison of If-None-Match against an ETag, as required for GET requests
+    """
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (candidate.strip() for candidate in if_none_match.split(","))
+    return any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+
+def not_modified_since(if_modified_since, last_modified):
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    # HTTP dates have second precision
+    modified = as_datetime(last_modified).astimezone(timezone.utc).replace(microsecond=0)
+    return modified <= since
+
+
+def is_not_modified(headers, etag, last_modified=None):
+    """
+    Evaluate the conditional headers of a GET, If-None-Match takes precedence over If-Modified-Since
+    """
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since is not None and last_modified is not None:
+        return not_modified_since(if_modified_since, last_modified)
+    return False
+
+
+def has_conditional_headers(headers):
+    return "if-none-match" in headers or "if-modified-since" in headers
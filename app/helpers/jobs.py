@@ -0,0 +1,385 @@
+"""
+Background jobs run after the commit of a request, outside of its latency.
+
+A JobQueue runs the registered handlers on a pool of worker threads. The jobs are
+kept by a store: MemoryJobStore keeps them in the process, DatabaseJobStore in the
+jobs table so they survive restarts and can be shared by several workers. A job
+that raises is retried with exponential backoff until max_attempts, then it is
+marked as failed with its last error.
+
+Handlers are called as handler(db, **payload) with a session of their own, they
+must be idempotent: a job whose worker died is run again once its lease expires.
+"""
+import heapq
+import itertools
+import logging
+import threading
+import time
+import uuid
+from dataclasses import asdict
+from dataclasses import dataclass
+from dataclasses import field
+from datetime import datetime
+from datetime import timedelta
+from typing import Optional
+
+import orjson
+from sqlalchemy import Column
+from sqlalchemy import DateTime
+from sqlalchemy import Index
+from sqlalchemy import Integer
+from sqlalchemy import String
+from sqlalchemy import Table
+from sqlalchemy import Text
+from sqlalchemy import and_
+from sqlalchemy import delete
+from sqlalchemy import func
+from sqlalchemy import insert
+from sqlalchemy import or_
+from sqlalchemy import select
+from sqlalchemy import update
+
+from app.databases.database import Base
+from app.databases.database import SessionLocal
+from app.helpers.metrics import metrics_registry
+from app.settings import settings
+
+logger = logging.getLogger("uvicorn.error")
+
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+JOB_STATUSES = (JOB_PENDING, JOB_RUNNING, JOB_SUCCEEDED, JOB_FAILED)
+
+# Seconds between two prunes of the finished jobs
+PRUNE_INTERVAL = 60
+# Seconds between two reports of the jobs by status, counting them walks every job kept
+DEPTH_REPORT_INTERVAL = 5
+
+jobs = Table(
+    'jobs',
+    Base.metadata,
+    Column('id', String, primary_key=True),
+    Column('name', String, nullable=False),
+    Column('payload', Text, nullable=False),
+    Column('status', String, nullable=False),
+    Column('attempts', Integer, nullable=False),
+    Column('max_attempts', Integer, nullable=False),
+    Column('run_at', DateTime, nullable=False),
+    Column('locked_until', DateTime),
+    Column('last_error', Text),
+    Column('created_at', DateTime, nullable=False),
+    Column('updated_at', DateTime, nullable=False),
+    Index('ix_jobs_status_run_at', 'status', 'run_at'),
+)
+
+
+@dataclass(slots=True)
+class Job:
+    id: str
+    name: str
+    payload: dict
+    max_attempts: int
+    status: str = JOB_PENDING
+    attempts: int = 0
+    run_at: datetime = field(default_factory=datetime.now)
+    last_error: Optional[str] = None
+    created_at: datetime = field(default_factory=datetime.now)
+    updated_at: datetime = field(default_factory=datetime.now)
+
+    def to_dict(self):
+        return asdict(self)
+
+
+class MemoryJobStore:
+    """
+    Jobs of this process, lost on restart. Finished jobs are kept retention seconds
+    so their status can still be read.
+    """
+
+    def __init__(self, retention=86400):
+        self.retention = retention
+        self.jobs = {}
+        self.ready = []
+        self.sequence = itertools.count()
+        self.lock = threading.Lock()
+
+    def add(self, job):
+        with self.lock:
+            self.jobs[job.id] = job
+            heapq.heappush(self.ready, (job.run_at, next(self.sequence), job.id))
+
+    def claim(self, lease):
+        """
+        Take the next job due, None if there is none. Workers only die with the
+        process, and the jobs with them, so there is no lease to keep.
+        """
+        now = datetime.now()
+        with self.lock:
+            if not self.ready or self.ready[0][0] > now:
+                return None
+            _, _, job_id = heapq.heappop(self.ready)
+            job = self.jobs[job_id]
+            job.status = JOB_RUNNING
+            job.attempts += 1
+            job.updated_at = now
+            return Job(**job.to_dict())
+
+    def finish(self, job, status, error=None, run_at=None):
+        """
+        Record the outcome of a claimed job, a pending status retries it at run_at
+        """
+        with self.lock:
+            stored = self.jobs[job.id]
+            stored.status = status
+            stored.last_error = error
+            stored.updated_at = datetime.now()
+            if status == JOB_PENDING:
+                stored.run_at = run_at
+                heapq.heappush(self.ready, (run_at, next(self.sequence), job.id))
+
+    def get(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return None if job is None else Job(**job.to_dict())
+
+    def depth(self):
+        """
+        Number of jobs by status
+        """
+        with self.lock:
+            counts = dict.fromkeys(JOB_STATUSES, 0)
+            for job in self.jobs.values():
+                counts[job.status] += 1
+            return counts
+
+    def prune(self):
+        expired = datetime.now() - timedelta(seconds=self.retention)
+        with self.lock:
+            for job_id in [
+                job.id for job in self.jobs.values()
+                if job.status in (JOB_SUCCEEDED, JOB_FAILED) and job.updated_at < expired
+            ]:
+                del self.jobs[job_id]
+
+
+class DatabaseJobStore:
+    """
+    Jobs in the jobs table. A claimed job is leased, if its worker dies another
+    worker takes it again once the lease expires.
+    """
+
+    def __init__(self, session_factory, retention=86400):
+        self.session_factory = session_factory
+        self.retention = retention
+
+    @staticmethod
+    def to_job(row):
+        values = dict(row._mapping)
+        values.pop("locked_until")
+        values["payload"] = orjson.loads(values["payload"])
+        return Job(**values)
+
+    def add(self, job):
+        values = job.to_dict()
+        values["payload"] = orjson.dumps(job.payload).decode()
+        with self.session_factory() as db:
+            db.execute(insert(jobs).values(values))
+            db.commit()
+
+    def claim(self, lease):
+        now = datetime.now()
+        claimable = or_(
+            and_(jobs.c.status == JOB_PENDING, jobs.c.run_at <= now),
+            and_(jobs.c.status == JOB_RUNNING, jobs.c.locked_until < now),
+        )
+        next_job = (
+            select(jobs.c.id)
+            .where(claimable)
+            .order_by(jobs.c.run_at)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        with self.session_factory() as db:
+            # Backends with row locks skip the jobs other workers are claiming. Without
+            # them, claimable is checked again by the UPDATE on the latest row version,
+            # so a job claimed meanwhile by another worker no longer matches
+            row = db.execute(
+                update(jobs).where(jobs.c.id == next_job, claimable)
+                .values(
+                    status=JOB_RUNNING, attempts=jobs.c.attempts + 1,
+                    locked_until=now + timedelta(seconds=lease), updated_at=now,
+                )
+                .returning(*jobs.c)
+            ).first()
+            db.commit()
+        return None if row is None else self.to_job(row)
+
+    def finish(self, job, status, error=None, run_at=None):
+        values = {"status": status, "last_error": error, "locked_until": None, "updated_at": datetime.now()}
+        if run_at is not None:
+            values["run_at"] = run_at
+        with self.session_factory() as db:
+            db.execute(update(jobs).where(jobs.c.id == job.id).values(values))
+            db.commit()
+
+    def get(self, job_id):
+        with self.session_factory() as db:
+            row = db.execute(select(jobs).where(jobs.c.id == job_id)).first()
+        return None if row is None else self.to_job(row)
+
+    def depth(self):
+        with self.session_factory() as db:
+            counts = dict(db.execute(select(jobs.c.status, func.count()).group_by(jobs.c.status)).all())
+        return {status: counts.get(status, 0) for status in JOB_STATUSES}
+
+    def prune(self):
+        expired = datetime.now() - timedelta(seconds=self.retention)
+        with self.session_factory() as db:
+            db.execute(delete(jobs).where(jobs.c.status.in_((JOB_SUCCEEDED, JOB_FAILED)), jobs.c.updated_at < expired))
+            db.commit()
+
+
+class JobQueue:
+    """
+    Run jobs on a pool of worker threads.
+
+        job_queue.register("send_email", send_email)
+        job = job_queue.enqueue("send_email", {"request_id": uuid})
+    """
+
+    def __init__(
+        self, store, session_factory, max_attempts=5, retry_delay=1.0, poll_interval=1.0, lease=300
+    ):
+        self.store = store
+        self.session_factory = session_factory
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.handlers = {}
+        self.workers = []
+        self.wakeup = threading.Event()
+        self.stopping = threading.Event()
+        self.last_prune = time.monotonic()
+        self.last_depth_report = None
+
+    def register(self, name, handler):
+        self.handlers[name] = handler
+
+    def enqueue(self, name, payload, max_attempts=None):
+        """
+        Queue a job, call it after the commit of the data it needs.
+
+        Returns:
+            Job: The queued job, its id tells its status through get.
+        """
+        if name not in self.handlers:
+            raise ValueError(f"Unknown job: {name}")
+        job = Job(str(uuid.uuid4()), name, payload, max_attempts or self.max_attempts)
+        self.store.add(job)
+        self.wakeup.set()
+        return job
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def run_next(self):
+        """
+        Run the next job due in the calling thread.
+
+        Returns:
+            bool: False if no job was due.
+        """
+        job = self.store.claim(self.lease)
+        if job is None:
+            return False
+        try:
+            with self.session_factory() as db:
+                self.handlers[job.name](db, **job.payload)
+        except Exception as error:
+            message = f"{type(error).__name__}: {error}"
+            if job.attempts >= job.max_attempts:
+                logger.exception("Job %s %s failed after %s attempts", job.name, job.id, job.attempts)
+                self.store.finish(job, JOB_FAILED, message)
+            else:
+                delay = self.retry_delay * 2 ** (job.attempts - 1)
+                logger.warning("Job %s %s failed, retrying in %.1fs: %s", job.name, job.id, delay, message)
+                self.store.finish(job, JOB_PENDING, message, run_at=datetime.now() + timedelta(seconds=delay))
+        else:
+            self.store.finish(job, JOB_SUCCEEDED)
+        return True
+
+    def run_pending(self):
+        """
+        Run the jobs due until there are none left, returns how many ran
+        """
+        count = 0
+        while self.run_next():
+            count += 1
+        return count
+
+    def report_depth(self):
+        for status, count in self.store.depth().items():
+            metrics_registry.set_gauge("job_queue_jobs", "Jobs in the queue by status.", count, [("status", status)])
+
+    def work(self):
+        while not self.stopping.is_set():
+            self.wakeup.clear()
+            try:
+                ran = self.run_next()
+                now = time.monotonic()
+                if self.last_depth_report is None or now - self.last_depth_report > DEPTH_REPORT_INTERVAL:
+                    self.last_depth_report = now
+                    self.report_depth()
+                if not ran and time.monotonic() - self.last_prune > PRUNE_INTERVAL:
+                    self.last_prune = time.monotonic()
+                    self.store.prune()
+            except Exception:
+                # The store itself failed, wait before trying again
+                logger.exception("Job worker error")
+                ran = False
+            if not ran:
+                self.wakeup.wait(self.poll_interval)
+
+    def start(self, workers):
+        """
+        Start the worker threads, once per process
+        """
+        self.stopping.clear()
+        for index in range(workers):
+            worker = threading.Thread(target=self.work, name=f"job-worker-{index}", daemon=True)
+            worker.start()
+            self.workers.append(worker)
+        metrics_registry.set_gauge("job_queue_workers", "Threads running jobs.", len(self.workers))
+
+    def stop(self, timeout=5.0):
+        """
+        Stop the workers after their current job, the pending ones stay in the store
+        """
+        self.stopping.set()
+        self.wakeup.set()
+        for worker in self.workers:
+            worker.join(timeout)
+        self.workers = []
+        metrics_registry.set_gauge("job_queue_workers", "Threads running jobs.", 0)
+
+
+def build_job_store(backend, session_factory, retention=86400):
+    """
+    Build a job store by name: memory or database
+    """
+    if backend == 'database':
+        return DatabaseJobStore(session_factory, retention=retention)
+    return MemoryJobStore(retention=retention)
+
+
+job_queue = JobQueue(
+    build_job_store(settings.job_queue_backend, SessionLocal, retention=settings.job_retention),
+    SessionLocal,
+    max_attempts=settings.job_max_attempts,
+    retry_delay=settings.job_retry_delay,
+    poll_interval=settings.job_poll_interval,
+)
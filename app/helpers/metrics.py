@@ -0,0 +1,236 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Upper bounds of the latency histogram, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UNMATCHED_ROUTE = "<unmatched>"
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@dataclass(slots=True)
+class QueryStats:
+    """
+    SQL executed while serving one HTTP request
+    """
+    statements: int = 0
+    duration: float = 0.0
+    rows: int = 0
+
+
+# Stats of the request being served. Sessions run in the threadpool or in SQLAlchemy
+# greenlets with a copy of the context, which still points to the same QueryStats
+current_query_stats = ContextVar("current_query_stats", default=None)
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the context of the statement, so a statement that fails leaves nothing behind
+    context.query_started = time.perf_counter()
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = current_query_stats.get()
+    if stats is None:
+        return
+    stats.statements += 1
+    stats.duration += time.perf_counter() - context.query_started
+    # DBAPI rowcount is -1 for SELECTs, the rows are counted as the result fetches them
+    # instead. The RETURNING rows of an executemany are fetched by SQLAlchemy itself.
+    if cursor.description is not None and not executemany:
+        context.cursor = RowCountingCursor(cursor, stats)
+
+
+class RowCountingCursor:
+    """
+    DBAPI cursor adding the rows fetched through it to a QueryStats, nothing is buffered
+    """
+
+    def __init__(self, cursor, stats):
+        self.cursor = cursor
+        self.stats = stats
+
+    def fetchone(self):
+        row = self.cursor.fetchone()
+        if row is not None:
+            self.stats.rows += 1
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self.cursor.fetchmany(*args, **kwargs)
+        self.stats.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self.cursor.fetchall()
+        self.stats.rows += len(rows)
+        return rows
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+
+@contextmanager
+def count_queries():
+    """
+    Collect the SQL statements executed by every engine, in any thread, inside the block.
+
+    Yields:
+        list: The statements, filled as they are executed.
+    """
+    statements = []
+
+    def record_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(Engine, "after_cursor_execute", record_statement)
+    try:
+        yield statements
+    finally:
+        event.remove(Engine, "after_cursor_execute", record_statement)
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def format_labels(labels):
+    return ",".join(f'{name}="{escape_label(value)}"' for name, value in labels)
+
+
+class MetricsRegistry:
+    """
+    Per route HTTP latency and SQL usage, rendered in the Prometheus text format
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.latency = {}
+            self.responses = {}
+            self.queries = {}
+            self.gauges = {}
+
+    def observe(self, method, route, status_code, duration, query_stats):
+        """
+        Record a served request
+        """
+        key = (method, route)
+        with self.lock:
+            bucket_counts, total, count = self.latency.get(key, ([0] * len(self.buckets), 0.0, 0))
+            for index, bound in enumerate(self.buckets):
+                if duration <= bound:
+                    bucket_counts[index] += 1
+            self.latency[key] = (bucket_counts, total + duration, count + 1)
+
+            response_key = (method, route, status_code)
+            self.responses[response_key] = self.responses.get(response_key, 0) + 1
+
+            statements, sql_duration, rows = self.queries.get(key, (0, 0.0, 0))
+            self.queries[key] = (
+                statements + query_stats.statements, sql_duration + query_stats.duration, rows + query_stats.rows
+            )
+
+    def set_gauge(self, name, description, value, labels=()):
+        """
+        Set a gauge, labels is a sequence of (name, value) pairs
+        """
+        with self.lock:
+            self.gauges.setdefault(name, (description, {}))[1][tuple(labels)] = value
+
+    def render(self):
+        """
+        Render every metric in the Prometheus text exposition format
+        """
+        with self.lock:
+            latency = {key: (list(values[0]), *values[1:]) for key, values in self.latency.items()}
+            responses = dict(self.responses)
+            queries = dict(self.queries)
+            gauges = {name: (description, dict(values)) for name, (description, values) in self.gauges.items()}
+
+        lines = []
+
+        def header(name, metric_type, description):
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {metric_type}")
+
+        def sample(name, labels, value):
+            lines.append(f"{name}{{{format_labels(labels)}}} {value}")
+
+        header("http_request_duration_seconds", "histogram", "Latency of the HTTP requests by route.")
+        for (method, route), (bucket_counts, total, count) in sorted(latency.items()):
+            labels = [("method", method), ("route", route)]
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                sample("http_request_duration_seconds_bucket", [*labels, ("le", bound)], bucket_count)
+            sample("http_request_duration_seconds_bucket", [*labels, ("le", "+Inf")], count)
+            sample("http_request_duration_seconds_sum", labels, total)
+            sample("http_request_duration_seconds_count", labels, count)
+
+        header("http_requests_total", "counter", "HTTP requests by route and status.")
+        for (method, route, status_code), count in sorted(responses.items()):
+            sample("http_requests_total", [("method", method), ("route", route), ("status", status_code)], count)
+
+        sql_metrics = [
+            ("db_statements_total", "SQL statements executed by route."),
+            ("db_statement_duration_seconds_total", "Time spent executing SQL by route."),
+            ("db_rows_total", "Rows returned by the SQL statements by route."),
+        ]
+        for index, (name, description) in enumerate(sql_metrics):
+            header(name, "counter", description)
+            for (method, route), values in sorted(queries.items()):
+                sample(name, [("method", method), ("route", route)], values[index])
+
+        for name, (description, values) in sorted(gauges.items()):
+            header(name, "gauge", description)
+            for labels, value in sorted(values.items()):
+                lines.append(f"{name}{{{format_labels(labels)}}} {value}" if labels else f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+metrics_registry = MetricsRegistry()
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording the latency and the SQL usage of every HTTP request.
+
+    Requests are labelled by the path template of their route, so /solicitud/{uuid}
+    is a single series whatever the uuid.
+    """
+
+    def __init__(self, app, registry=metrics_registry):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        stats = QueryStats()
+        token = current_query_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - started
+            current_query_stats.reset(token)
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or UNMATCHED_ROUTE
+            self.registry.observe(scope["method"], route_path, status_code, duration, stats)
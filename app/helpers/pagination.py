@@ -0,0 +1,68 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def encode_payload(payload):
+    data = json.dumps(payload, separators=(",", ":"))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+
+def decode_payload(cursor):
+    padding = "=" * (-len(cursor) % 4)
+    return json.loads(base64.urlsafe_b64decode(cursor + padding))
+
+
+def encode_cursor(created_at, object_id):
+    """
+    Build an opaque cursor pointing right after the (created_at, id) pair
+    """
+    return encode_payload([created_at.isoformat(), object_id])
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor created by encode_cursor.
+
+    Args:
+        cursor (str): The opaque cursor sent by the client.
+
+    Returns:
+        tuple: The (created_at, id) pair the next page starts after.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        created_at, object_id = decode_payload(cursor)
+        return datetime.fromisoformat(created_at), str(object_id)
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError) as error:
+        raise ValueError(f"Invalid cursor: {cursor}") from error
+
+
+def encode_key_cursor(positions):
+    """
+    Build an opaque cursor from several (key, id) positions, None for a position not started yet
+    """
+    return encode_payload([list(position) if position is not None else None for position in positions])
+
+
+def decode_key_cursor(cursor, count):
+    """
+    Decode a cursor created by encode_key_cursor with count positions.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        positions = decode_payload(cursor)
+        if len(positions) != count:
+            raise ValueError
+        return [(str(position[0]), str(position[1])) if position is not None else None for position in positions]
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError, IndexError) as error:
+        raise ValueError(f"Invalid cursor: {cursor}") from error
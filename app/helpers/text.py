@@ -0,0 +1,18 @@
+import unicodedata
+
+
+def normalize_text(value):
+    """
+    Fold a text for case and accent insensitive matching.
+
+    Args:
+        value (str): The text to fold, e.g. "  José  Pérez".
+
+    Returns:
+        str: The text without accents, casefolded and with single spaces, e.g. "jose perez".
+    """
+    if value is None:
+        return None
+    decomposed = unicodedata.normalize("NFKD", value)
+    unaccented = "".join(character for character in decomposed if not unicodedata.combining(character))
+    return " ".join(unaccented.casefold().split())
@@ -1,12 +1,67 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+from fastapi.responses import PlainTextResponse
+from starlette import status
+from starlette.concurrency import run_in_threadpool
 
-from app.requests import models as requests_models
 from app.requests.endpoints import router as user_router
+from app.databases.database import async_engine
+from app.databases.database import SessionLocal
 from app.databases.database import engine
+from app.databases.startup import warm_up
+from app.helpers.jobs import job_queue
+from app.helpers.metrics import PROMETHEUS_CONTENT_TYPE
+from app.helpers.metrics import MetricsMiddleware
+from app.helpers.metrics import metrics_registry
+from app.requests.archive import schedule_archival
+from app.requests.views import enqueue_missing_assignments
+from app.settings import settings
+
+# Startup time is measured from the import of the app to the end of the warm up
+IMPORT_STARTED = time.perf_counter()
+
+logger = logging.getLogger('uvicorn.error')
+
 
+@asynccontextmanager
+async def lifespan(app):
+    app.state.ready = False
+    report = await warm_up(engine, async_engine)
+    report['startup_seconds'] = round(time.perf_counter() - IMPORT_STARTED, 4)
+    metrics_registry.set_gauge(
+        'app_startup_seconds', 'Time from the import of the app to ready.', report['startup_seconds']
+    )
+    logger.info('Ready to take traffic in %.3fs', report['startup_seconds'])
+    job_queue.start(settings.job_workers)
+    if settings.async_assignment:
+        with SessionLocal() as db:
+            queued = await run_in_threadpool(enqueue_missing_assignments, db)
+        logger.info('Queued %s pending grimorio assignments', queued)
+    archival = None
+    if settings.archive_interval:
+        archival = asyncio.create_task(schedule_archival(settings.archive_interval))
+    app.state.startup = report
+    app.state.ready = True
+    yield
+    app.state.ready = False
+    if archival is not None:
+        archival.cancel()
+    await run_in_threadpool(job_queue.stop)
+    # The pooled aiosqlite connections run on threads of their own that keep the process alive
+    if async_engine is not None:
+        await async_engine.dispose()
+    engine.dispose()
 
-app = FastAPI()
+
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
+app.state.ready = False
+app.state.startup = None
 
 origins = ['*']
 
@@ -14,9 +69,25 @@ app.add_middleware(
     CORSMiddleware, allow_origins=origins, allow_credentials=True, allow_methods=['*'], allow_headers=['*']
 )
 
-requests_models.Base.metadata.create_all(bind=engine)
+app.add_middleware(MetricsMiddleware)
 
 # Routes
 app.include_router(user_router)
 
 
+@app.get('/metrics', include_in_schema=False)
+async def metrics():
+    """
+    Latency and SQL usage of every route, in the Prometheus text format
+    """
+    return PlainTextResponse(metrics_registry.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
+@app.get('/ready', include_in_schema=False)
+async def ready():
+    """
+    Readiness probe, 503 until the database is warmed up
+    """
+    if not app.state.ready:
+        return ORJSONResponse({'status': 'starting'}, status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+    return {'status': 'ready', 'startup': app.state.startup}
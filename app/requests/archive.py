@@ -0,0 +1,132 @@
+"""
+Hot/cold archival of the requests.
+
+Rejected requests older than archive_rejected_after_days, and any request that is
+not approved older than archive_after_days, are moved to the requests_archive table
+in batches of archive_batch_size, each batch in its own transaction. The requests
+table and its indexes then only hold the live requests. Approved requests stay, the
+grimorio assignments and their counters are read from the requests table.
+
+GET /solicitud/{uuid} still finds an archived request while archive_reads is on,
+GET /solicitudes?archived=true lists the archive.
+
+Archival runs as a job of the job queue: on demand through POST /solicitudes/archivar,
+every archive_interval seconds when it is not 0, or from the command line:
+
+    python -m app.requests.archive
+"""
+import asyncio
+import sys
+from datetime import datetime
+from datetime import timedelta
+
+from sqlalchemy import delete
+from sqlalchemy import insert
+from sqlalchemy import literal
+from sqlalchemy import select
+from starlette.concurrency import run_in_threadpool
+
+from app.helpers.jobs import job_queue
+from app.requests.events import ARCHIVED
+from app.requests.events import change_feed
+from app.requests.models import ArchivedRequest
+from app.requests.models import Request
+from app.requests.models import RequestStatus
+from app.requests.views import request_cache
+from app.settings import settings
+
+
+ARCHIVE_JOB = "archive_requests"
+ARCHIVED_COLUMNS = [column.key for column in Request.__table__.columns]
+
+
+def archive_batch(db, conditions, batch_size, archived_at):
+    """
+    Move the oldest batch_size requests matching conditions to the archive.
+
+    Returns:
+        int: The number of requests moved.
+    """
+    rows = db.execute(
+        select(Request.id, Request.status, Request.grimorio_id)
+        .where(*conditions)
+        .order_by(Request.created_at, Request.id)
+        .limit(batch_size)
+    ).all()
+    if not rows:
+        return 0
+
+    ids = [row.id for row in rows]
+    db.execute(
+        insert(ArchivedRequest).from_select(
+            [*ARCHIVED_COLUMNS, "archived_at"],
+            select(*[Request.__table__.c[key] for key in ARCHIVED_COLUMNS], literal(archived_at))
+            .where(Request.id.in_(ids)),
+        )
+    )
+    db.execute(delete(Request).where(Request.id.in_(ids)).execution_options(synchronize_session=False))
+    db.commit()
+    request_cache.invalidate(*ids)
+    change_feed.publish_many([(ARCHIVED, row.id, row.status, row.grimorio_id) for row in rows])
+    return len(rows)
+
+
+def archive_requests(db, rejected_after_days=None, after_days=None, batch_size=None, now=None):
+    """
+    Move the rejected and the aged out requests to the archive, approved requests are kept.
+
+    Args:
+        rejected_after_days (int): Age in days after which rejected requests are archived.
+        after_days (int): Age in days after which any request that is not approved is archived.
+        batch_size (int): Requests moved per transaction.
+
+    Returns:
+        int: The number of requests archived.
+    """
+    rejected_after_days = settings.archive_rejected_after_days if rejected_after_days is None else rejected_after_days
+    after_days = settings.archive_after_days if after_days is None else after_days
+    batch_size = batch_size or settings.archive_batch_size
+    now = now or datetime.now()
+
+    policies = [
+        # Walks ix_requests_status_created_at
+        [
+            Request.status == RequestStatus.REJECTED.value,
+            Request.created_at < now - timedelta(days=rejected_after_days),
+        ],
+        # Walks ix_requests_created_at_id
+        [
+            Request.status != RequestStatus.APPROVED.value,
+            Request.created_at < now - timedelta(days=after_days),
+        ],
+    ]
+    archived = 0
+    for conditions in policies:
+        while True:
+            moved = archive_batch(db, conditions, batch_size, now)
+            archived += moved
+            if moved < batch_size:
+                break
+    return archived
+
+
+job_queue.register(ARCHIVE_JOB, archive_requests)
+
+
+async def schedule_archival(interval):
+    """
+    Queue an archival every interval seconds, run as a task of the app lifespan
+    """
+    while True:
+        await asyncio.sleep(interval)
+        # The database job store inserts the job, off the event loop
+        await run_in_threadpool(job_queue.enqueue, ARCHIVE_JOB, {})
+
+
+if __name__ == '__main__':
+    from app.databases.database import SessionLocal
+
+    if sys.argv[1:]:
+        sys.exit("Usage: python -m app.requests.archive, the policy is read from the settings")
+    with SessionLocal() as db:
+        print(f"{archive_requests(db)} requests archived")
@@ -0,0 +1,159 @@
+"""
+Async versions of the views.
+
+Each function runs its sync counterpart through run_sync, on an AsyncSession the queries are
+executed by the async driver inside a greenlet, so the event loop is never blocked and the
+validation and assignment rules live in a single place.
+
+The request cache is used from here rather than from the views, a shared backend is
+a network round-trip that has to stay off the event loop.
+"""
+from app.requests import views
+
+
+async def run_write(db, view, *args, **kwargs):
+    """
+    Run a write view, applying the cache invalidations it makes once it returns
+    """
+    with views.request_cache.defer_invalidations() as invalidations:
+        try:
+            return await db.run_sync(view, *args, **kwargs)
+        finally:
+            await views.request_cache.apply_invalidations(invalidations)
+
+
+async def get_all_objects(db, **kwargs):
+    """
+    Get a page of requests ordered by (created_at, id)
+    """
+    return await db.run_sync(views.get_all_objects, **kwargs)
+
+
+async def get_page_version(db, **kwargs):
+    """
+    Get the (id, updated_at) pairs and next cursor of a page of requests
+    """
+    return await db.run_sync(views.get_page_version, **kwargs)
+
+
+async def get_object_version(db, uuid):
+    """
+    Get the updated_at of a request without loading it
+    """
+    return await db.run_sync(views.get_object_version, uuid)
+
+
+async def search_objects(db, query, **kwargs):
+    """
+    Search requests by identification or by name and last name
+    """
+    return await db.run_sync(views.search_objects, query, **kwargs)
+
+
+async def get_object(db, uuid):
+    """
+    Get a request by id
+    """
+    return await db.run_sync(views.get_object, uuid)
+
+
+async def get_cached_object(db, uuid):
+    """
+    Get a request by id as a dict, through the request cache
+    """
+    return await views.request_cache.get_or_load_async(uuid, lambda: db.run_sync(views.load_cached_object, uuid))
+
+
+async def create_obj(db, request_data):
+    """
+    Create a new request
+    """
+    return await db.run_sync(views.create_obj, request_data)
+
+
+async def create_obj_idempotent(db, request_data, idempotency_key):
+    """
+    Create a new request once per Idempotency-Key
+    """
+    return await db.run_sync(views.create_obj_idempotent, request_data, idempotency_key)
+
+
+async def create_objs(db, records, **kwargs):
+    """
+    Create many requests in a single transaction
+    """
+    return await db.run_sync(views.create_objs, records, **kwargs)
+
+
+async def create_batch(db, records):
+    """
+    Create the requests queued by the write batcher in a single transaction
+    """
+    return await db.run_sync(views.create_batch, records)
+
+
+async def request_exists(db, uuid):
+    """
+    Get a request by id
+    """
+    return await db.run_sync(views.request_exists, uuid)
+
+
+async def update_object(db, request_uuid, request_data):
+    """
+    Update a request by uuid
+    """
+    return await run_write(db, views.update_object, request_uuid, request_data)
+
+
+async def update_status(db, status, uuid):
+    """
+    Update the status of a request, False if it doesn't exist
+    """
+    return await run_write(db, views.update_status, status, uuid)
+
+
+async def update_status_deferred(db, status, uuid):
+    """
+    Update the status of a request, leaving the grimorio of an approval undrawn
+    """
+    return await run_write(db, views.update_status_deferred, status, uuid)
+
+
+async def delete_object(db, uuid):
+    """
+    Delete a request by id
+    """
+    return await run_write(db, views.delete_object, uuid)
+
+
+async def update_statuses(db, status, **kwargs):
+    """
+    Update the status of many requests in a single transaction
+    """
+    return await run_write(db, views.update_statuses, status, **kwargs)
+
+
+async def delete_objects(db, **kwargs):
+    """
+    Delete many requests in a single transaction
+    """
+    return await run_write(db, views.delete_objects, **kwargs)
+
+
+async def assign_grimorio(db):
+    return await db.run_sync(views.assign_grimorio)
+
+
+async def get_grimoire_assignments(db):
+    """
+    Get all grimorios with their requests
+    """
+    return await db.run_sync(views.get_grimoire_assignments)
+
+
+async def get_assignment_stats(db):
+    """
+    Get the number of requests per grimorio, tipo_trebol, affinity and status
+    """
+    return await db.run_sync(views.get_assignment_stats)
@@ -0,0 +1,100 @@
+"""
+Optional unique constraint on the identification of the requests.
+
+Without it a person can send several requests. With it a second request with the
+same identification is refused with 409, whatever the write path.
+
+Each process checks once whether the constraint exists. A write that runs into it
+while the process thought it disabled checks again.
+
+    python -m app.requests.constraints enable|disable
+"""
+import sys
+import threading
+import weakref
+
+from sqlalchemy import func
+from sqlalchemy import inspect
+from sqlalchemy import select
+from sqlalchemy import text
+
+from app.requests.models import Request
+
+
+UNIQUE_IDENTIFICATION_INDEX = 'ux_requests_identification'
+
+# Whether each engine has the constraint, checked once per engine
+_enabled_engines = weakref.WeakKeyDictionary()
+_enabled_lock = threading.Lock()
+
+
+def enable_unique_identification(engine):
+    """
+    Create the unique index on requests.identification.
+
+    Raises:
+        ValueError: If some identifications are already repeated.
+    """
+    with engine.begin() as connection:
+        repeated = connection.execute(
+            select(func.count()).select_from(
+                select(Request.identification).group_by(Request.identification).having(func.count() > 1).subquery()
+            )
+        ).scalar()
+        if repeated:
+            raise ValueError(f"{repeated} identifications are repeated, remove the duplicates first")
+        connection.execute(text(
+            f"CREATE UNIQUE INDEX IF NOT EXISTS {UNIQUE_IDENTIFICATION_INDEX} ON requests (identification)"
+        ))
+    with _enabled_lock:
+        _enabled_engines[engine] = True
+
+
+def disable_unique_identification(engine):
+    with engine.begin() as connection:
+        connection.execute(text(f"DROP INDEX IF EXISTS {UNIQUE_IDENTIFICATION_INDEX}"))
+    with _enabled_lock:
+        _enabled_engines[engine] = False
+
+
+def forget_unique_identification(engine):
+    """
+    Check again whether the constraint exists on the next unique_identification_enabled call
+    """
+    with _enabled_lock:
+        _enabled_engines.pop(engine, None)
+
+
+def is_identification_conflict(error):
+    """
+    Whether an IntegrityError is a violation of the unique identification index. SQLite
+    names the column of the index, PostgreSQL the index itself.
+    """
+    message = str(error.orig)
+    return UNIQUE_IDENTIFICATION_INDEX in message or f"{Request.__tablename__}.identification" in message
+
+
+def unique_identification_enabled(engine):
+    enabled = _enabled_engines.get(engine)
+    if enabled is None:
+        indexes = inspect(engine).get_indexes(Request.__tablename__)
+        enabled = any(index["name"] == UNIQUE_IDENTIFICATION_INDEX for index in indexes)
+        with _enabled_lock:
+            _enabled_engines[engine] = enabled
+    return enabled
+
+
+if __name__ == '__main__':
+    from app.databases.database import engine
+
+    if sys.argv[1:] == ['enable']:
+        try:
+            enable_unique_identification(engine)
+        except ValueError as error:
+            sys.exit(str(error))
+        print("Unique identification enabled")
+    elif sys.argv[1:] == ['disable']:
+        disable_unique_identification(engine)
+        print("Unique identification disabled")
+    else:
+        sys.exit("Usage: python -m app.requests.constraints enable|disable")
@@ -0,0 +1,156 @@
+"""
+Optional counter rows backing GET /asignaciones/estadisticas.
+
+request_counts keeps one row per (grimorio_id, status, affinity) with the number of
+requests in it. Triggers on the requests table keep the rows current inside the same
+transaction as every INSERT, UPDATE and DELETE, so single, bulk and future write paths
+are all covered. The statistics then read at most a few hundred rows instead of
+grouping the whole table.
+
+Each process checks once whether the counters exist. A process that finds them
+dropped checks again, one started before they were enabled keeps grouping the
+table until it is restarted.
+
+    python -m app.requests.counters enable|disable
+"""
+import sys
+import threading
+import weakref
+
+from sqlalchemy import inspect
+from sqlalchemy import text
+
+
+COUNTERS_TABLE = 'request_counts'
+
+CREATE_TABLE = """
+CREATE TABLE IF NOT EXISTS request_counts (
+    grimorio_id VARCHAR NOT NULL,
+    status VARCHAR NOT NULL,
+    affinity VARCHAR NOT NULL,
+    total INTEGER NOT NULL,
+    PRIMARY KEY (grimorio_id, status, affinity)
+)
+"""
+
+# Requests without grimorio are counted under '' because NULLs never conflict in a primary key
+BACKFILL = """
+INSERT INTO request_counts (grimorio_id, status, affinity, total)
+SELECT COALESCE(grimorio_id, ''), status, affinity, COUNT(*) FROM requests
+GROUP BY COALESCE(grimorio_id, ''), status, affinity
+"""
+
+INCREMENT = """
+INSERT INTO request_counts (grimorio_id, status, affinity, total)
+VALUES (COALESCE(NEW.grimorio_id, ''), NEW.status, NEW.affinity, 1)
+ON CONFLICT (grimorio_id, status, affinity) DO UPDATE SET total = request_counts.total + 1
+"""
+
+# The rows counted under '' are the requests without grimorio
+SELECT_COUNTS = """
+SELECT NULLIF(grimorio_id, '') AS grimorio_id, status, affinity, total
+FROM request_counts WHERE total > 0
+"""
+
+DECREMENT = """
+UPDATE request_counts SET total = total - 1
+WHERE grimorio_id = COALESCE(OLD.grimorio_id, '') AND status = OLD.status AND affinity = OLD.affinity
+"""
+
+SQLITE_TRIGGERS = [
+    f"CREATE TRIGGER IF NOT EXISTS request_counts_insert AFTER INSERT ON requests BEGIN {INCREMENT}; END",
+    f"CREATE TRIGGER IF NOT EXISTS request_counts_delete AFTER DELETE ON requests BEGIN {DECREMENT}; END",
+    "CREATE TRIGGER IF NOT EXISTS request_counts_update AFTER UPDATE OF status, affinity, grimorio_id ON requests "
+    "WHEN OLD.status IS NOT NEW.status OR OLD.affinity IS NOT NEW.affinity "
+    f"OR OLD.grimorio_id IS NOT NEW.grimorio_id BEGIN {DECREMENT}; {INCREMENT}; END",
+]
+
+POSTGRESQL_TRIGGERS = [
+    f"""
+    CREATE OR REPLACE FUNCTION request_counts_trigger() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            {DECREMENT};
+        END IF;
+        IF TG_OP IN ('UPDATE', 'INSERT') THEN
+            {INCREMENT};
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS request_counts_trigger ON requests",
+    "CREATE TRIGGER request_counts_trigger AFTER INSERT OR DELETE OR UPDATE OF status, affinity, grimorio_id "
+    "ON requests FOR EACH ROW EXECUTE FUNCTION request_counts_trigger()",
+]
+
+DROP_STATEMENTS = {
+    'sqlite': [
+        "DROP TRIGGER IF EXISTS request_counts_insert",
+        "DROP TRIGGER IF EXISTS request_counts_delete",
+        "DROP TRIGGER IF EXISTS request_counts_update",
+        "DROP TABLE IF EXISTS request_counts",
+    ],
+    'postgresql': [
+        "DROP TRIGGER IF EXISTS request_counts_trigger ON requests",
+        "DROP FUNCTION IF EXISTS request_counts_trigger()",
+        "DROP TABLE IF EXISTS request_counts",
+    ],
+}
+
+# Whether each engine has the counters, checked once per engine
+_enabled_engines = weakref.WeakKeyDictionary()
+_enabled_lock = threading.Lock()
+
+
+def enable_request_counters(engine):
+    """
+    Create the counters table and its triggers, and fill it from the current requests
+    """
+    triggers = {'sqlite': SQLITE_TRIGGERS, 'postgresql': POSTGRESQL_TRIGGERS}[engine.dialect.name]
+    with engine.begin() as connection:
+        connection.execute(text(CREATE_TABLE))
+        connection.execute(text("DELETE FROM request_counts"))
+        for statement in triggers:
+            connection.execute(text(statement))
+        connection.execute(text(BACKFILL))
+    with _enabled_lock:
+        _enabled_engines[engine] = True
+
+
+def disable_request_counters(engine):
+    with engine.begin() as connection:
+        for statement in DROP_STATEMENTS[engine.dialect.name]:
+            connection.execute(text(statement))
+    with _enabled_lock:
+        _enabled_engines[engine] = False
+
+
+def counters_enabled(engine):
+    enabled = _enabled_engines.get(engine)
+    if enabled is None:
+        enabled = inspect(engine).has_table(COUNTERS_TABLE)
+        with _enabled_lock:
+            _enabled_engines[engine] = enabled
+    return enabled
+
+
+def forget_request_counters(engine):
+    """
+    Check again whether the counters exist on the next counters_enabled call
+    """
+    with _enabled_lock:
+        _enabled_engines.pop(engine, None)
+
+
+if __name__ == '__main__':
+    from app.databases.database import engine
+
+    if sys.argv[1:] == ['enable']:
+        enable_request_counters(engine)
+        print("Request counters enabled")
+    elif sys.argv[1:] == ['disable']:
+        disable_request_counters(engine)
+        print("Request counters disabled")
+    else:
+        sys.exit("Usage: python -m app.requests.counters enable|disable")
@@ -1,137 +1,472 @@
+import asyncio
+
+import orjson
 from fastapi import APIRouter
+from fastapi import Header
 from fastapi import Path
+from fastapi import Query
 from fastapi import HTTPException
+from fastapi import Request as HTTPRequest
+from fastapi import Response
+from fastapi import WebSocket
+from fastapi.responses import StreamingResponse
 from starlette import status
+from starlette.concurrency import run_in_threadpool
 from typing import List
+from typing import Optional
+from app.helpers.db_dependency import async_db_dependency
 from app.helpers.db_dependency import db_dependency
+from app.helpers.bulk_payload import JSON_CONTENT_TYPE
+from app.helpers.bulk_payload import SUPPORTED_CONTENT_TYPES
+from app.helpers.bulk_payload import parse_bulk_payload
+from app.helpers.etag import has_conditional_headers
+from app.helpers.etag import http_date
+from app.helpers.etag import is_not_modified
+from app.helpers.etag import make_etag
+from app.helpers.jobs import job_queue
+from app.helpers.pagination import DEFAULT_PAGE_SIZE
+from app.helpers.pagination import MAX_PAGE_SIZE
 
+from app.requests.schemas import MAX_BULK_IDS
+from app.requests.schemas import AssignmentsEnvelope
+from app.requests.schemas import RequestBulkSelection
+from app.requests.schemas import RequestBulkUpdateStatus
 from app.requests.schemas import RequestCreate
+from app.requests.schemas import RequestDetailEnvelope
+from app.requests.schemas import RequestEnvelope
+from app.requests.schemas import RequestPageEnvelope
 from app.requests.schemas import RequestUpdate
 from app.requests.schemas import RequestUpdateStatus
-from app.requests.views import create_obj
-from app.requests.views import request_exists
-from app.requests.views import update_object
-from app.requests.views import update_status
-from app.requests.views import status_exists
-from app.requests.views import get_all_objects
-from app.requests.views import get_object
-from app.requests.views import delete_object
+from app.requests.archive import ARCHIVE_JOB
+from app.requests.async_views import create_obj
+from app.requests.async_views import create_obj_idempotent
+from app.requests.async_views import create_objs
+from app.requests.async_views import update_object
+from app.requests.async_views import update_status
+from app.requests.async_views import get_all_objects
+from app.requests.async_views import get_cached_object
+from app.requests.async_views import get_object_version
+from app.requests.async_views import get_page_version
+from app.requests.async_views import search_objects
+from app.requests.async_views import get_assignment_stats
+from app.requests.async_views import delete_object
+from app.requests.async_views import delete_objects
+from app.requests.async_views import update_status_deferred
+from app.requests.async_views import update_statuses
+from app.requests.events import change_feed
+from app.requests.events import forward_events
+from app.requests.events import sse_stream
+from app.requests.models import RequestStatus
+from app.requests.validators import status_exists
+from app.requests.validators import valid_affinity
+from app.requests.views import ASSIGN_GRIMORIO_JOB
+from app.requests.views import BULK_CHUNK_SIZE
 from app.requests.views import get_grimoire_assignments
+from app.requests.views import iter_grimoire_assignments
+from app.requests.views import request_cache
+from app.requests.write_batcher import create_batcher
 
 from app.scripts.create_grimorio_fixtures import create_grimorio_fixtures
+from app.settings import settings
 
 router = APIRouter()
 
 
 # Create grimorios fixtures
 @router.get("/create-grimorios-fixtures", status_code=status.HTTP_200_OK)
-async def create_grimorios_fixtures(db: db_dependency):
+async def create_grimorios_fixtures(db: async_db_dependency):
     """
     Create grimorios fixtures
     """
-    create_grimorio_fixtures(db)
+    await db.run_sync(create_grimorio_fixtures)
     return {
         "message": "Grimorios fixtures created successfully"
     }
 
 
-@router.get("/solicitudes", status_code=status.HTTP_200_OK)
-async def get_all_requests(db: db_dependency):
+def set_validators(response, etag, last_modified):
+    response.headers["ETag"] = etag
+    if last_modified is not None:
+        response.headers["Last-Modified"] = http_date(last_modified)
+
+
+def not_modified_response(etag, last_modified):
+    response = Response(status_code=status.HTTP_304_NOT_MODIFIED)
+    set_validators(response, etag, last_modified)
+    return response
+
+
+def page_validators(versions, next_cursor):
     """
-    Get all requests
+    Get the ETag and Last-Modified of a page from its (id, updated_at) pairs
     """
-    objects = get_all_objects(db)
+    etag = make_etag(*(part for version in versions for part in version), next_cursor)
+    last_modified = max((updated_at for _, updated_at in versions if updated_at is not None), default=None)
+    return etag, last_modified
+
+
+@router.get("/solicitudes", status_code=status.HTTP_200_OK, response_model=RequestPageEnvelope)
+async def get_all_requests(
+    db: async_db_dependency,
+    http_request: HTTPRequest,
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    request_status: Optional[str] = Query(None, alias="status"),
+    affinity: Optional[str] = None,
+    grimorio_id: Optional[str] = None,
+    archived: bool = False,
+):
+    """
+    Get a page of requests, use next_cursor to get the following one. archived=true lists the archive
+    """
+    if request_status is not None and not status_exists(request_status):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid status")
+
+    if affinity is not None and not valid_affinity(affinity):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid affinity: {affinity}")
+
+    page = {
+        "limit": limit, "cursor": cursor, "request_status": request_status, "affinity": affinity,
+        "grimorio_id": grimorio_id, "archived": archived
+    }
+    if has_conditional_headers(http_request.headers):
+        # Revalidation only reads (id, updated_at) of the page, no request is loaded or serialized
+        etag, last_modified = page_validators(*await get_page_version(db, **page))
+        if is_not_modified(http_request.headers, etag, last_modified):
+            return not_modified_response(etag, last_modified)
+
+    objects, next_cursor = await get_all_objects(db, **page)
+    set_validators(response, *page_validators([(obj.id, obj.updated_at) for obj in objects], next_cursor))
     return {
         "message": "Requests retrieved successfully",
-        "data": objects
+        "data": objects,
+        "next_cursor": next_cursor
+    }
+
+
+@router.get("/solicitudes/buscar", status_code=status.HTTP_200_OK, response_model=RequestPageEnvelope)
+async def search_requests(
+    db: async_db_dependency,
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+):
+    """
+    Search requests by identification or by the beginning of the name and last name
+    """
+    objects, next_cursor = await search_objects(db, q, limit=limit, cursor=cursor)
+    return {
+        "message": "Requests retrieved successfully",
+        "data": objects,
+        "next_cursor": next_cursor
     }
 
 
-@router.get("/solicitud/{uuid}", status_code=status.HTTP_200_OK)
-async def get_request(db: db_dependency, uuid: str):
+def event_filters(request_ids, statuses):
+    """
+    Validate the filters of the change feed
+    """
+    if request_ids is not None and len(request_ids) > MAX_BULK_IDS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"At most {MAX_BULK_IDS} ids")
+    for request_status in statuses or ():
+        if not status_exists(request_status):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid status")
+
+
+@router.get("/solicitudes/eventos", status_code=status.HTTP_200_OK)
+async def get_request_events(
+    request_ids: Optional[List[str]] = Query(None, alias="id"),
+    statuses: Optional[List[str]] = Query(None, alias="status"),
+    last_event_id: Optional[str] = Header(None),
+    resume_from: Optional[str] = Query(None, alias="last_event_id"),
+):
+    """
+    Server-sent events of the writes to the requests, optionally only those of some ids or statuses.
+
+    A reconnecting EventSource sends Last-Event-ID and gets the events it missed.
+    """
+    event_filters(request_ids, statuses)
+    subscription = change_feed.subscribe(last_event_id or resume_from, request_ids, statuses)
+    return StreamingResponse(
+        sse_stream(subscription, settings.change_feed_heartbeat),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.websocket("/solicitudes/eventos/ws")
+async def request_events_websocket(
+    websocket: WebSocket,
+    request_ids: Optional[List[str]] = Query(None, alias="id"),
+    statuses: Optional[List[str]] = Query(None, alias="status"),
+    last_event_id: Optional[str] = Query(None),
+):
+    """
+    The change feed of GET /solicitudes/eventos over a WebSocket, one JSON message per event
+    """
+    try:
+        event_filters(request_ids, statuses)
+    except HTTPException:
+        # Policy violation, the handshake is refused
+        await websocket.close(code=1008)
+        return
+
+    await websocket.accept()
+    subscription = change_feed.subscribe(last_event_id, request_ids, statuses)
+    sender = asyncio.create_task(forward_events(websocket, subscription))
+    try:
+        # Clients don't send anything, receiving only tells when they leave
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+    finally:
+        sender.cancel()
+        change_feed.unsubscribe(subscription)
+
+
+@router.get("/solicitud/{uuid}", status_code=status.HTTP_200_OK, response_model=RequestDetailEnvelope)
+async def get_request(db: async_db_dependency, uuid: str, http_request: HTTPRequest, response: Response):
     """
     Get a request by id
     """
-    existing_request = request_exists(db, uuid)
+    if has_conditional_headers(http_request.headers):
+        version = await get_object_version(db, uuid)
+        if version is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Request not found")
+        etag = make_etag(uuid, version.updated_at)
+        if is_not_modified(http_request.headers, etag, version.updated_at):
+            return not_modified_response(etag, version.updated_at)
+
+    request = await get_cached_object(db, uuid)
 
-    if not existing_request:
+    if request is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Request not found")
 
+    set_validators(response, make_etag(uuid, request["updated_at"]), request["updated_at"])
     return {
         "message": "Request retrieved successfully",
-        "data": get_object(db, uuid)
+        "data": request
     }
 
 
-@router.post("/solicitud", status_code=status.HTTP_200_OK)
-async def create_request(db: db_dependency, request_data: RequestCreate):
+@router.post("/solicitud", status_code=status.HTTP_200_OK, response_model=RequestEnvelope)
+async def create_request(
+    db: async_db_dependency,
+    request_data: RequestCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, min_length=1, max_length=255),
+):
     """
-    Create a new request
+    Create a new request, a retry with the same Idempotency-Key returns the first response
     """
     request_data = request_data.model_dump()
-    response = create_obj(db, request_data)
+    if idempotency_key is not None:
+        response_data, replayed = await create_obj_idempotent(db, request_data, idempotency_key)
+        if replayed:
+            response.headers["Idempotent-Replayed"] = "true"
+        return {
+            "message": "Request created successfully",
+            "data": response_data
+        }
+
+    if settings.write_batching:
+        response = await create_batcher.submit(request_data)
+    else:
+        response = await create_obj(db, request_data)
     return {
         "message": "Request created successfully",
         "data": response
     }
 
 
+@router.post("/solicitudes/bulk", status_code=status.HTTP_200_OK)
+async def create_requests_bulk(
+    db: async_db_dependency, request: HTTPRequest, chunk_size: int = Query(BULK_CHUNK_SIZE, ge=1, le=10000)
+):
+    """
+    Create many requests from a JSON array, NDJSON or CSV body
+    """
+    content_type = request.headers.get("content-type", JSON_CONTENT_TYPE).split(";")[0].strip()
+    if content_type not in SUPPORTED_CONTENT_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail=f"Unsupported content type: {content_type}"
+        )
+
+    try:
+        records = parse_bulk_payload(await request.body(), content_type)
+    except ValueError as error:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(error)) from error
+
+    results = await create_objs(db, records, chunk_size=chunk_size)
+    created = sum(1 for result in results if result["result"] == "created")
+    return {
+        "message": "Requests processed successfully",
+        "created": created,
+        "rejected": len(results) - created,
+        "data": results
+    }
+
+
+@router.post("/solicitudes/archivar", status_code=status.HTTP_202_ACCEPTED)
+async def archive_requests():
+    """
+    Queue the archival of the rejected and aged out requests
+    """
+    job = await run_in_threadpool(job_queue.enqueue, ARCHIVE_JOB, {})
+    return {
+        "message": "Archival queued",
+        "job_id": job.id
+    }
+
+
 @router.put("/solicitud/{uuid}", status_code=status.HTTP_204_NO_CONTENT)
-async def update_request(db: db_dependency, request_data: RequestUpdate, uuid: str):
+async def update_request(db: async_db_dependency, request_data: RequestUpdate, uuid: str):
     """
     Get a request by id
     """
-    existing_request = request_exists(db, uuid)
-
-    if not existing_request:
+    updated = await update_object(db, uuid, request_data.model_dump())
+    if not updated:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Request not found")
-    request_data = request_data.model_dump()
-    update_object(db, uuid, request_data)
     return {
         "message": "Request updated successfully"
     }
 
 
 @router.patch("/solicitud/{uuid}/estatus", status_code=status.HTTP_200_OK)
-async def update_request_status(db: db_dependency, uuid: str, new_status: RequestUpdateStatus):
+async def update_request_status(db: async_db_dependency, uuid: str, new_status: RequestUpdateStatus):
     """
     Update the status of a request
     """
-    existing_request = request_exists(db, uuid)
-
-    if not existing_request:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Request not found")
-
     new_status = new_status.model_dump().get("status")
     is_valid_status = status_exists(new_status)
     if not is_valid_status:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid status")
 
-    update_status(db, new_status, uuid)
+    job = None
+    if not settings.async_assignment:
+        updated = await update_status(db, new_status, uuid)
+    else:
+        updated = await update_status_deferred(db, new_status, uuid)
+        if updated and RequestStatus(new_status) == RequestStatus.APPROVED:
+            # The database job store commits the job, off the event loop
+            job = await run_in_threadpool(job_queue.enqueue, ASSIGN_GRIMORIO_JOB, {"request_id": uuid})
+    if not updated:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Request not found")
+    if job is None:
+        return {
+            "message": "Request status updated successfully"
+        }
     return {
-        "message": "Request status updated successfully"
+        "message": "Request status updated successfully, the grimorio is being assigned",
+        "job_id": job.id
+    }
+
+
+def selection_filters(selection):
+    """
+    Validate the filters of a bulk selection, None when the selection is by ids
+    """
+    if selection.filters is None:
+        return None
+
+    filters = selection.filters
+    if filters.status is not None and not status_exists(filters.status):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid status")
+    if filters.affinity is not None and not valid_affinity(filters.affinity):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid affinity: {filters.affinity}")
+    return {"request_status": filters.status, "affinity": filters.affinity, "grimorio_id": filters.grimorio_id}
+
+
+@router.patch("/solicitudes/estatus", status_code=status.HTTP_200_OK)
+async def update_requests_status(db: async_db_dependency, selection: RequestBulkUpdateStatus):
+    """
+    Update the status of many requests, selected by ids or by filters
+    """
+    if not status_exists(selection.status):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid status")
+
+    filters = selection_filters(selection)
+    updated, missing = await update_statuses(db, selection.status, ids=selection.ids, filters=filters)
+    return {
+        "message": "Requests status updated successfully",
+        "updated": updated,
+        "missing": missing
+    }
+
+
+@router.delete("/solicitudes", status_code=status.HTTP_200_OK)
+async def delete_requests(db: async_db_dependency, selection: RequestBulkSelection):
+    """
+    Delete many requests, selected by ids or by filters
+    """
+    filters = selection_filters(selection)
+    deleted, missing = await delete_objects(db, ids=selection.ids, filters=filters)
+    return {
+        "message": "Requests deleted successfully",
+        "deleted": deleted,
+        "missing": missing
     }
 
 
 @router.delete("/solicitud/{uuid}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_request(db: db_dependency, uuid: str):
+async def delete_request(db: async_db_dependency, uuid: str):
     """
     Delete a request by id
     """
-    existing_request = request_exists(db, uuid)
-
-    if not existing_request:
+    deleted = await delete_object(db, uuid)
+    if not deleted:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Request not found")
-    delete_object(db, uuid)
 
 
-@router.get("/asignaciones", status_code=status.HTTP_200_OK)
-async def get_all_assignments(db: db_dependency):
+@router.get("/asignaciones", status_code=status.HTTP_200_OK, response_model=AssignmentsEnvelope)
+async def get_all_assignments(
+    db: db_dependency, response_format: str = Query("json", alias="format", pattern="^(json|ndjson)$")
+):
     """
-    Get all requests
+    Get all requests, format=ndjson streams one assignment per line
     """
-    objects = get_grimoire_assignments(db)
+    if response_format == "ndjson":
+        lines = (orjson.dumps(row) + b"\n" for row in iter_grimoire_assignments(db))
+        return StreamingResponse(lines, media_type="application/x-ndjson")
+
+    objects = await run_in_threadpool(get_grimoire_assignments, db)
     return {
         "message": "Assignments retrieved successfully",
         "data": objects
-    }
\ No newline at end of file
+    }
+
+
+@router.get("/asignaciones/estadisticas", status_code=status.HTTP_200_OK)
+async def get_assignments_stats(db: async_db_dependency):
+    """
+    Get the assignment counts per grimorio, tipo_trebol, affinity and status
+    """
+    return {
+        "message": "Assignment stats retrieved successfully",
+        "data": await get_assignment_stats(db)
+    }
+
+
+@router.get("/cache/estadisticas", status_code=status.HTTP_200_OK)
+async def get_cache_stats():
+    """
+    Get the hit and miss counters of the request cache
+    """
+    return {
+        "message": "Cache stats retrieved successfully",
+        "data": request_cache.stats()
+    }
+
+
+@router.get("/trabajos/{job_id}", status_code=status.HTTP_200_OK)
+async def get_job(job_id: str):
+    """
+    Get the status, attempts and last error of a background job
+    """
+    job = await run_in_threadpool(job_queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return {
+        "message": "Job retrieved successfully",
+        "data": job.to_dict()
+    }
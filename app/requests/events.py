@@ -0,0 +1,226 @@
+"""
+Change feed of the requests, pushed to the clients of GET /solicitudes/eventos.
+
+The views publish an event after every committed write. Each subscriber gets the
+events through an asyncio queue of its own event loop, the views run in the
+threadpool so the events cross threads with call_soon_threadsafe.
+
+The last events are kept so a client that reconnects with the id of the last event
+it saw gets what it missed. Ids are "<epoch>-<sequence>", the epoch changes with
+every process, so an id from before a restart, or one that fell out of the history,
+is answered with a reset event: the client has to reload what it shows.
+
+The feed lives in the process, with several workers a client only sees the
+writes made by the worker serving its connection.
+"""
+import asyncio
+import secrets
+import threading
+from collections import deque
+from dataclasses import asdict
+from dataclasses import dataclass
+from typing import Optional
+
+import orjson
+
+from app.helpers.metrics import metrics_registry
+from app.settings import settings
+
+
+CREATED = "created"
+UPDATED = "updated"
+STATUS_CHANGED = "status"
+GRIMORIO_ASSIGNED = "assigned"
+ARCHIVED = "archived"
+DELETED = "deleted"
+RESET = "reset"
+# Milliseconds an EventSource waits before reconnecting
+SSE_RETRY_MS = 3000
+
+
+@dataclass(slots=True)
+class ChangeEvent:
+    """
+    A committed write to a request, status and grimorio_id are the ones after the
+    write, or the last ones for a deletion
+    """
+    id: str
+    type: str
+    request_id: Optional[str] = None
+    status: Optional[str] = None
+    grimorio_id: Optional[str] = None
+
+    def to_dict(self):
+        return asdict(self)
+
+
+class Subscription:
+    """
+    Events for one client, optionally only those of some request ids and/or statuses
+    """
+
+    def __init__(self, feed, request_ids=None, statuses=None, max_queued=1000):
+        self.feed = feed
+        self.request_ids = set(request_ids) if request_ids else None
+        self.statuses = set(statuses) if statuses else None
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(max_queued)
+        self.closed = False
+
+    def matches(self, event):
+        if event.type == RESET:
+            return True
+        if self.request_ids is not None and event.request_id not in self.request_ids:
+            return False
+        return self.statuses is None or event.status in self.statuses
+
+    def push(self, event):
+        """
+        Queue an event from any thread
+        """
+        if not self.matches(event):
+            return
+        try:
+            self.loop.call_soon_threadsafe(self.put, event)
+        except RuntimeError:
+            # The event loop of the client is closed
+            self.feed.unsubscribe(self)
+
+    def put(self, event):
+        if self.closed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # A client that can't keep up is disconnected, it resumes from its last event id
+            self.close()
+
+    def close(self):
+        self.closed = True
+        self.feed.unsubscribe(self)
+        if not self.queue.full():
+            # Wakes up a consumer waiting on the empty queue
+            self.queue.put_nowait(None)
+
+    async def get(self, timeout=None):
+        """
+        Wait for the next event, None on timeout or once the subscription is closed
+        """
+        if self.closed and self.queue.empty():
+            return None
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class ChangeFeed:
+    """
+    In-process publisher of ChangeEvents with a bounded history
+    """
+
+    def __init__(self, history=1000, max_queued=1000):
+        self.epoch = secrets.token_hex(4)
+        self.sequence = 0
+        self.history = deque(maxlen=history)
+        self.max_queued = max_queued
+        self.subscribers = set()
+        self.lock = threading.Lock()
+
+    def publish(self, event_type, request_id, status=None, grimorio_id=None):
+        self.publish_many([(event_type, request_id, status, grimorio_id)])
+
+    def publish_many(self, changes):
+        """
+        Publish (type, request_id, status, grimorio_id) changes, in order
+        """
+        events = []
+        with self.lock:
+            for event_type, request_id, status, grimorio_id in changes:
+                self.sequence += 1
+                event = ChangeEvent(f"{self.epoch}-{self.sequence}", event_type, request_id, status, grimorio_id)
+                self.history.append(event)
+                events.append(event)
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            for event in events:
+                subscriber.push(event)
+
+    def parse_event_id(self, event_id):
+        """
+        Sequence of an event id of this process, None if it isn't one
+        """
+        epoch, _, sequence = (event_id or "").partition("-")
+        if epoch != self.epoch or not sequence.isdigit():
+            return None
+        return int(sequence)
+
+    def subscribe(self, last_event_id=None, request_ids=None, statuses=None):
+        """
+        Start receiving events, first the ones after last_event_id that are still kept.
+
+        Must be called from the event loop that will consume the events.
+        """
+        subscription = Subscription(self, request_ids, statuses, self.max_queued)
+        with self.lock:
+            if last_event_id:
+                sequence = self.parse_event_id(last_event_id)
+                oldest = self.sequence - len(self.history) + 1
+                if sequence is None or sequence < oldest - 1 or sequence > self.sequence:
+                    missed = [ChangeEvent(f"{self.epoch}-{self.sequence}", RESET)]
+                else:
+                    missed = list(self.history)[sequence - oldest + 1:]
+                missed = [event for event in missed if subscription.matches(event)]
+                if len(missed) >= self.max_queued:
+                    missed = [ChangeEvent(f"{self.epoch}-{self.sequence}", RESET)]
+                for event in missed:
+                    subscription.queue.put_nowait(event)
+            self.subscribers.add(subscription)
+            count = len(self.subscribers)
+        metrics_registry.set_gauge("change_feed_subscribers", "Clients connected to the change feed.", count)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscribers.discard(subscription)
+            count = len(self.subscribers)
+        metrics_registry.set_gauge("change_feed_subscribers", "Clients connected to the change feed.", count)
+
+
+change_feed = ChangeFeed(history=settings.change_feed_history, max_queued=settings.change_feed_max_queued)
+
+
+def format_sse(event):
+    return f"id: {event.id}\nevent: {event.type}\ndata: {orjson.dumps(event.to_dict()).decode()}\n\n"
+
+
+async def sse_stream(subscription, heartbeat):
+    """
+    Write a subscription in the text/event-stream format, with a comment every
+    heartbeat seconds without events so proxies keep the connection open
+    """
+    try:
+        yield f"retry: {SSE_RETRY_MS}\n\n"
+        while True:
+            event = await subscription.get(heartbeat)
+            if event is not None:
+                yield format_sse(event)
+            elif subscription.closed:
+                return
+            else:
+                yield ": keep-alive\n\n"
+    finally:
+        subscription.feed.unsubscribe(subscription)
+
+
+async def forward_events(websocket, subscription):
+    """
+    Send the events of a subscription as JSON messages until it is closed
+    """
+    while True:
+        event = await subscription.get()
+        if event is None:
+            # Try again later, the client resumes from the last id it received
+            await websocket.close(code=1013)
+            return
+        await websocket.send_text(orjson.dumps(event.to_dict()).decode())
@@ -0,0 +1,76 @@
+"""
+Idempotency keys of POST /solicitud.
+
+The response of a creation made with an Idempotency-Key header is stored with the
+key, in the same transaction as the request. A retry with the same key reads that
+response back by primary key and never touches the requests table. Keys expire
+after the idempotency_ttl setting.
+"""
+import hashlib
+from datetime import datetime
+from datetime import timedelta
+
+import orjson
+from fastapi import HTTPException
+from sqlalchemy import Column
+from sqlalchemy import DateTime
+from sqlalchemy import String
+from sqlalchemy import Table
+from sqlalchemy import Text
+from sqlalchemy import delete
+from sqlalchemy import insert
+from sqlalchemy import select
+from starlette import status
+
+from app.databases.database import Base
+
+
+idempotency_keys = Table(
+    'idempotency_keys',
+    Base.metadata,
+    Column('key', String, primary_key=True),
+    Column('fingerprint', String, nullable=False),
+    Column('response', Text, nullable=False),
+    Column('expires_at', DateTime, nullable=False, index=True),
+)
+
+
+def request_fingerprint(request_data):
+    """
+    Hash of a request payload, a key can only be replayed with the payload it was created with
+    """
+    return hashlib.sha256(orjson.dumps(request_data, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+
+def get_stored_response(db, key, fingerprint):
+    """
+    Get the response stored with a key, None if the key is unknown or expired.
+
+    Raises:
+        HTTPException: If the key was used with a different payload.
+    """
+    row = db.execute(
+        select(idempotency_keys.c.fingerprint, idempotency_keys.c.response)
+        .where(idempotency_keys.c.key == key, idempotency_keys.c.expires_at > datetime.now())
+    ).first()
+    if row is None:
+        return None
+    if row.fingerprint != fingerprint:
+        raise HTTPException(
+            status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Idempotency-Key already used with a different request"
+        )
+    return orjson.loads(row.response)
+
+
+def store_response(db, key, fingerprint, response, ttl):
+    """
+    Add the response of a key to the current transaction, dropping the expired keys first
+    """
+    now = datetime.now()
+    db.execute(delete(idempotency_keys).where(idempotency_keys.c.expires_at <= now))
+    db.execute(insert(idempotency_keys).values(
+        key=key,
+        fingerprint=fingerprint,
+        response=orjson.dumps(response).decode(),
+        expires_at=now + timedelta(seconds=ttl),
+    ))
@@ -2,9 +2,10 @@ from enum import Enum
 import uuid
 from datetime import datetime
 
-from sqlalchemy import Column, String, DateTime, ForeignKey, Integer
+from sqlalchemy import Column, String, DateTime, ForeignKey, Index, Integer
 from sqlalchemy.orm import relationship
 from app.databases.database import Base
+from app.helpers.text import normalize_text
 
 
 class Affinity(str, Enum):
@@ -22,6 +23,15 @@ class RequestStatus(str, Enum):
     REJECTED = "Rechazado"
 
 
+def normalized_default(column_name):
+    """
+    Column default folding the value inserted in column_name, also applied row by row to executemany INSERTs
+    """
+    def default(context):
+        return normalize_text(context.get_current_parameters().get(column_name))
+    return default
+
+
 class Grimorio(Base):
     __tablename__ = 'grimorios'
 
@@ -38,6 +48,18 @@ class Grimorio(Base):
 
 class Request(Base):
     __tablename__ = 'requests'
+    __table_args__ = (
+        # Keyset pagination of GET /solicitudes walks these indexes, the filtered ones
+        # also serve the bulk endpoints and the grimorio_id foreign key
+        Index('ix_requests_created_at_id', 'created_at', 'id'),
+        Index('ix_requests_status_created_at', 'status', 'created_at', 'id'),
+        Index('ix_requests_grimorio_id_created_at', 'grimorio_id', 'created_at', 'id'),
+        Index('ix_requests_affinity_created_at', 'affinity', 'created_at', 'id'),
+        # Prefix search of GET /solicitudes/buscar, walked in (value, id) order
+        Index('ix_requests_identification_id', 'identification', 'id'),
+        Index('ix_requests_name_normalized', 'name_normalized', 'id'),
+        Index('ix_requests_last_name_normalized', 'last_name_normalized', 'id'),
+    )
 
     id = Column(String, primary_key=True)
     name = Column(String, nullable=False)
@@ -48,6 +70,9 @@ class Request(Base):
     status = Column(String, nullable=False, default=RequestStatus.PENDING)
     created_at = Column(DateTime, default=datetime.now)
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+    # Accent and case folded copies of the names, update_object keeps them in sync
+    name_normalized = Column(String, default=normalized_default('name'))
+    last_name_normalized = Column(String, default=normalized_default('last_name'))
 
     grimorio_id = Column(String, ForeignKey('grimorios.id'))
     grimorio = relationship("Grimorio", back_populates="requests")
@@ -56,3 +81,32 @@ class Request(Base):
         if 'id' not in kwargs:
             kwargs['id'] = str(uuid.uuid4())
         super().__init__(**kwargs)
+
+
+class ArchivedRequest(Base):
+    """
+    Requests moved out of the requests table by app.requests.archive, read only
+    """
+    __tablename__ = 'requests_archive'
+    __table_args__ = (
+        Index('ix_requests_archive_created_at_id', 'created_at', 'id'),
+        Index('ix_requests_archive_status_created_at', 'status', 'created_at', 'id'),
+        Index('ix_requests_archive_grimorio_id_created_at', 'grimorio_id', 'created_at', 'id'),
+        Index('ix_requests_archive_affinity_created_at', 'affinity', 'created_at', 'id'),
+    )
+
+    id = Column(String, primary_key=True)
+    name = Column(String, nullable=False)
+    last_name = Column(String, nullable=False)
+    identification = Column(String, nullable=False)
+    age = Column(Integer, nullable=False)
+    affinity = Column(String, nullable=False)
+    status = Column(String, nullable=False)
+    created_at = Column(DateTime)
+    updated_at = Column(DateTime)
+    name_normalized = Column(String)
+    last_name_normalized = Column(String)
+    grimorio_id = Column(String, ForeignKey('grimorios.id'))
+    archived_at = Column(DateTime, nullable=False)
+
+    grimorio = relationship("Grimorio", viewonly=True)
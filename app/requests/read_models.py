@@ -0,0 +1,87 @@
+"""
+Read-only rows of the listing endpoints.
+
+Listings select only the columns they return with Core select() and map the rows into
+these slotted dataclasses. This skips the identity map, the instance state and the
+relationship bookkeeping of ORM objects. The response models read them like ORM objects
+through from_attributes.
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List
+from typing import Optional
+
+from app.requests.models import ArchivedRequest
+from app.requests.models import Grimorio
+from app.requests.models import Request
+
+
+REQUEST_COLUMNS = (
+    Request.id,
+    Request.name,
+    Request.last_name,
+    Request.identification,
+    Request.age,
+    Request.affinity,
+    Request.status,
+    Request.created_at,
+    Request.updated_at,
+    Request.grimorio_id,
+)
+
+# The same columns from the archive, in the same order
+ARCHIVED_REQUEST_COLUMNS = tuple(getattr(ArchivedRequest, column.key) for column in REQUEST_COLUMNS)
+
+GRIMORIO_COLUMNS = (
+    Grimorio.id.label("grimorio__id"),
+    Grimorio.tipo_trebol.label("grimorio__tipo_trebol"),
+    Grimorio.ponderacion.label("grimorio__ponderacion"),
+    Grimorio.name.label("grimorio__name"),
+)
+
+
+@dataclass(slots=True, frozen=True)
+class GrimorioRow:
+    id: str
+    tipo_trebol: int
+    ponderacion: int
+    name: str
+
+
+@dataclass(slots=True)
+class RequestRow:
+    id: str
+    name: str
+    last_name: str
+    identification: str
+    age: int
+    affinity: str
+    status: str
+    created_at: Optional[datetime]
+    updated_at: Optional[datetime]
+    grimorio_id: Optional[str]
+    grimorio: Optional[GrimorioRow] = None
+
+
+@dataclass(slots=True)
+class AssignmentRow:
+    id: str
+    tipo_trebol: int
+    ponderacion: int
+    name: str
+    requests: List[RequestRow]
+
+
+def to_request_row(row, grimorios=None):
+    """
+    Map a row of REQUEST_COLUMNS, optionally followed by GRIMORIO_COLUMNS, into a RequestRow.
+
+    Grimorios are shared through the grimorios dict, a page holds at most one GrimorioRow per grimorio.
+    """
+    request = RequestRow(*row[:len(REQUEST_COLUMNS)])
+    if grimorios is not None and request.grimorio_id is not None:
+        grimorio = grimorios.get(request.grimorio_id)
+        if grimorio is None:
+            grimorio = grimorios[request.grimorio_id] = GrimorioRow(*row[len(REQUEST_COLUMNS):])
+        request.grimorio = grimorio
+    return request
@@ -0,0 +1,86 @@
+import random
+import threading
+import weakref
+from bisect import bisect_right
+from itertools import accumulate
+
+from app.requests.models import Grimorio
+
+
+class GrimorioSampler:
+    """
+    Draw grimorio ids proportionally to their ponderacion.
+
+    Weights are integers, so draws use an integer cumulative array and bisect: a draw can
+    never fall past the last bucket because of float rounding.
+    """
+
+    def __init__(self, weighted_ids, seed=None):
+        weighted_ids = [(grimorio_id, weight) for grimorio_id, weight in weighted_ids if weight > 0]
+        if not weighted_ids:
+            raise LookupError("No grimorios with a positive ponderacion")
+
+        self.grimorio_ids = [grimorio_id for grimorio_id, _ in weighted_ids]
+        self.cumulative_weights = list(accumulate(weight for _, weight in weighted_ids))
+        self.total_weight = self.cumulative_weights[-1]
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_db(cls, db, seed=None):
+        rows = db.query(Grimorio.id, Grimorio.ponderacion).order_by(Grimorio.tipo_trebol, Grimorio.id).all()
+        return cls(rows, seed=seed)
+
+    def draw(self):
+        """
+        Draw a single grimorio id
+        """
+        with self.lock:
+            point = self.random.randrange(self.total_weight)
+        return self.grimorio_ids[bisect_right(self.cumulative_weights, point)]
+
+    def draw_many(self, count):
+        """
+        Draw count grimorio ids at once
+        """
+        with self.lock:
+            points = [self.random.randrange(self.total_weight) for _ in range(count)]
+        return [self.grimorio_ids[bisect_right(self.cumulative_weights, point)] for point in points]
+
+
+# One sampler per engine, built on first use and dropped when the grimorios change
+_samplers = weakref.WeakKeyDictionary()
+_samplers_lock = threading.Lock()
+_sampler_seed = None
+
+
+def get_grimorio_sampler(db):
+    """
+    Get the cached sampler of the database bound to db, building it if needed
+    """
+    bind = db.get_bind()
+    sampler = _samplers.get(bind)
+    if sampler is None:
+        with _samplers_lock:
+            sampler = _samplers.get(bind)
+            if sampler is None:
+                sampler = GrimorioSampler.from_db(db, seed=_sampler_seed)
+                _samplers[bind] = sampler
+    return sampler
+
+
+def invalidate_grimorio_sampler():
+    """
+    Drop the cached samplers, call it whenever the grimorios table changes
+    """
+    with _samplers_lock:
+        _samplers.clear()
+
+
+def set_grimorio_sampler_seed(seed):
+    """
+    Seed the samplers built from now on, used for reproducible tests
+    """
+    global _sampler_seed
+    _sampler_seed = seed
+    invalidate_grimorio_sampler()
@@ -1,7 +1,14 @@
+from datetime import datetime
 from pydantic import BaseModel
+from pydantic import ConfigDict
+from pydantic import model_validator
 from pydantic.fields import Field
+from typing import List
 from typing import Optional
 
+# Maximum number of ids accepted by the bulk endpoints
+MAX_BULK_IDS = 10000
+
 
 class GrimorioSchema(BaseModel):
     name: str
@@ -38,3 +45,91 @@ class RequestUpdate(BaseModel):
 
 class RequestUpdateStatus(BaseModel):
     status: str = Field(..., title="Status", description="Status of the request", min_length=1, max_length=50)
+
+
+class RequestFilter(BaseModel):
+    status: Optional[str] = Field(None, title="Status", description="Status of the requests")
+    affinity: Optional[str] = Field(None, title="Affinity", description="Affinity of the requests")
+    grimorio_id: Optional[str] = Field(None, title="Grimorio", description="Grimorio assigned to the requests")
+
+    @model_validator(mode="after")
+    def check_not_empty(self):
+        if self.status is None and self.affinity is None and self.grimorio_id is None:
+            raise ValueError("At least one filter is required")
+        return self
+
+
+class RequestBulkSelection(BaseModel):
+    ids: Optional[List[str]] = Field(
+        None, title="Ids", description="Ids of the requests", min_length=1, max_length=MAX_BULK_IDS
+    )
+    filters: Optional[RequestFilter] = Field(None, title="Filters", description="Select the requests by filter")
+
+    @model_validator(mode="after")
+    def check_selection(self):
+        if (self.ids is None) == (self.filters is None):
+            raise ValueError("Send either ids or filters")
+        return self
+
+
+class RequestBulkUpdateStatus(RequestBulkSelection):
+    status: str = Field(..., title="Status", description="Status of the requests", min_length=1, max_length=50)
+
+
+class GrimorioResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: str
+    tipo_trebol: int
+    ponderacion: int
+    name: str
+
+
+class RequestResponse(BaseModel):
+    """
+    A request without its grimorio, reading it from an ORM object never triggers a lazy load
+    """
+    model_config = ConfigDict(from_attributes=True)
+
+    id: str
+    name: str
+    last_name: str
+    identification: str
+    age: int
+    affinity: str
+    status: str
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    grimorio_id: Optional[str] = None
+
+
+class RequestDetailResponse(RequestResponse):
+    """
+    A request with its grimorio, the relationship must be eagerly loaded
+    """
+    grimorio: Optional[GrimorioResponse] = None
+
+
+class AssignmentResponse(GrimorioResponse):
+    requests: List[RequestResponse]
+
+
+class RequestEnvelope(BaseModel):
+    message: str
+    data: RequestResponse
+
+
+class RequestDetailEnvelope(BaseModel):
+    message: str
+    data: RequestDetailResponse
+
+
+class RequestPageEnvelope(BaseModel):
+    message: str
+    data: List[RequestDetailResponse]
+    next_cursor: Optional[str] = None
+
+
+class AssignmentsEnvelope(BaseModel):
+    message: str
+    data: List[AssignmentResponse]
@@ -0,0 +1,84 @@
+import re
+from typing import NamedTuple
+
+from app.requests.models import Affinity
+from app.requests.models import RequestStatus
+
+
+NAME_PATTERN = re.compile(r'^[a-zA-ZáéíóúÁÉÍÓÚüÜñÑ]{1,20}$')
+LAST_NAME_PATTERN = re.compile(r'^[a-zA-ZáéíóúÁÉÍÓÚüÜñÑ]{1,20}$')
+
+# str enums hash by member name, so both the members and their values are kept for O(1) lookups
+AFFINITY_VALUES = frozenset(Affinity) | frozenset(affinity.value for affinity in Affinity)
+STATUS_VALUES = frozenset(RequestStatus) | frozenset(request_status.value for request_status in RequestStatus)
+
+
+class RequestValidation(NamedTuple):
+    valid_names: bool
+    valid_affinity: bool
+
+
+def validate_field(value, regex_pattern):
+    """
+    Validate a field against a regex pattern.
+
+    Args:
+        value (str): The value to validate.
+        regex_pattern (re.Pattern | str): The regex pattern to match against.
+
+    Returns:
+        bool: True if the value matches the pattern, False otherwise.
+    """
+    if not isinstance(value, str):
+        return False
+    if isinstance(regex_pattern, str):
+        regex_pattern = re.compile(regex_pattern)
+    return regex_pattern.match(value) is not None
+
+
+def validate_request(request_data):
+    """
+    Validate the name and last_name of a request
+    """
+    return (
+        validate_field(request_data.get("name"), NAME_PATTERN)
+        and validate_field(request_data.get("last_name"), LAST_NAME_PATTERN)
+    )
+
+
+def valid_affinity(affinity_value):
+    """
+    Validate the affinity value
+    """
+    return affinity_value in AFFINITY_VALUES
+
+
+def status_exists(status):
+    """
+    Validate the status value
+    """
+    return status in STATUS_VALUES
+
+
+def validate_requests(records):
+    """
+    Validate a batch of requests in a single call.
+
+    Args:
+        records (list): Request dicts with at least name, last_name and affinity.
+
+    Returns:
+        list: One RequestValidation per record, in the same order.
+    """
+    name_match = NAME_PATTERN.match
+    last_name_match = LAST_NAME_PATTERN.match
+    results = []
+    for record in records:
+        name = record.get("name")
+        last_name = record.get("last_name")
+        valid_names = (
+            isinstance(name, str) and isinstance(last_name, str)
+            and name_match(name) is not None and last_name_match(last_name) is not None
+        )
+        results.append(RequestValidation(valid_names, record.get("affinity") in AFFINITY_VALUES))
+    return results
@@ -1,69 +1,338 @@
-import random
-import re
+import heapq
+import uuid
+from datetime import datetime
 
 from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy import delete
+from sqlalchemy import and_
+from sqlalchemy import func
+from sqlalchemy import insert
+from sqlalchemy import not_
+from sqlalchemy import or_
+from sqlalchemy import select
+from sqlalchemy import text
+from sqlalchemy import tuple_
+from sqlalchemy import update
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
 from sqlalchemy.sql import exists
 from starlette import status
 
+from app.helpers.cache import ReadThroughCache
+from app.helpers.cache import build_cache_backend
+from app.helpers.pagination import DEFAULT_PAGE_SIZE
+from app.helpers.pagination import decode_cursor
+from app.helpers.pagination import decode_key_cursor
+from app.helpers.pagination import encode_cursor
+from app.helpers.jobs import job_queue
+from app.helpers.pagination import encode_key_cursor
+from app.helpers.text import normalize_text
+from app.requests.constraints import forget_unique_identification
+from app.requests.constraints import is_identification_conflict
+from app.requests.constraints import unique_identification_enabled
+from app.requests.counters import SELECT_COUNTS
+from app.requests.counters import counters_enabled
+from app.requests.counters import forget_request_counters
+from app.requests.events import CREATED
+from app.requests.events import DELETED
+from app.requests.events import GRIMORIO_ASSIGNED
+from app.requests.events import STATUS_CHANGED
+from app.requests.events import UPDATED
+from app.requests.events import change_feed
+from app.requests.idempotency import get_stored_response
+from app.requests.idempotency import request_fingerprint
+from app.requests.idempotency import store_response
 from app.requests.models import Affinity
+from app.requests.models import ArchivedRequest
 from app.requests.models import Request
 from app.requests.models import RequestStatus
 from app.requests.models import Grimorio
+from app.requests.read_models import GRIMORIO_COLUMNS
+from app.requests.read_models import ARCHIVED_REQUEST_COLUMNS
+from app.requests.read_models import REQUEST_COLUMNS
+from app.requests.read_models import AssignmentRow
+from app.requests.read_models import to_request_row
+from app.requests.sampler import get_grimorio_sampler
+from app.requests.schemas import RequestCreate
+from app.requests.schemas import RequestResponse
+from app.requests.validators import status_exists
+from app.requests.validators import valid_affinity
+from app.requests.validators import validate_field
+from app.requests.validators import validate_request
+from app.requests.validators import validate_requests
+from app.settings import settings
 from sqlalchemy.orm import joinedload
 
+ASSIGNMENTS_BATCH_SIZE = 1000
+BULK_CHUNK_SIZE = 1000
+# Ids per IN (...) clause, kept well below the bound parameter limit of SQLite
+IDS_CHUNK_SIZE = 500
+DUPLICATE_IDENTIFICATION = "Duplicate identification"
+ASSIGN_GRIMORIO_JOB = "assign_grimorio"
+# Sorts after any text, value >= prefix AND value < prefix + PREFIX_UPPER_BOUND is a prefix match on a B-tree index
+PREFIX_UPPER_BOUND = "\U0010ffff"
+
+# Read-through cache of GET /solicitud/{uuid}, every write to a request must invalidate it
+request_cache = ReadThroughCache(build_cache_backend(
+    settings.request_cache_backend,
+    ttl=settings.request_cache_ttl,
+    maxsize=settings.request_cache_maxsize,
+    redis_url=settings.redis_url,
+    prefix="request_cache:",
+))
+
+
+def filter_conditions(request_status=None, affinity=None, grimorio_id=None, model=Request):
+    """
+    Build the WHERE conditions shared by the list and bulk endpoints, model is Request or ArchivedRequest
+    """
+    conditions = []
+    if request_status is not None:
+        conditions.append(model.status == request_status)
+    if affinity is not None:
+        conditions.append(model.affinity == affinity)
+    if grimorio_id is not None:
+        conditions.append(model.grimorio_id == grimorio_id)
+    return conditions
+
 
-def get_all_objects(db):
+def chunks(values, size=IDS_CHUNK_SIZE):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def page_conditions(cursor=None, request_status=None, affinity=None, grimorio_id=None, model=Request):
     """
-    Get all requests
+    Build the WHERE conditions of a page of GET /solicitudes
     """
-    return db.query(Request).options(joinedload(Request.grimorio)).all()
+    conditions = filter_conditions(request_status, affinity, grimorio_id, model)
+    if cursor is not None:
+        try:
+            created_at, last_id = decode_cursor(cursor)
+        except ValueError as error:
+            raise HTTPException(status.HTTP_400_BAD_REQUEST, detail=str(error)) from error
+        conditions.append(tuple_(model.created_at, model.id) > tuple_(created_at, last_id))
+    return conditions
 
 
-def get_object(db, uuid):
+def split_page(rows, limit):
     """
-    Get a request by id
+    Split the limit + 1 rows of a page into the page and the cursor of the next one
     """
-    return db.query(Request).options(joinedload(Request.grimorio)).filter(Request.id == uuid).first()
+    # The extra row tells if there is a next page without a COUNT query
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].created_at, rows[-1].id)
 
 
-def validate_field(value, regex_pattern):
+def get_all_objects(
+    db, limit=DEFAULT_PAGE_SIZE, cursor=None, request_status=None, affinity=None, grimorio_id=None, archived=False
+):
     """
-    Validate a field against a regex pattern.
+    Get a page of requests ordered by (created_at, id).
 
     Args:
-        value (str): The value to validate.
-        regex_pattern (str): The regex pattern to match against.
+        limit (int): Maximum number of requests in the page.
+        cursor (str): Opaque cursor returned with the previous page.
+        request_status (str): Only return requests with this status.
+        affinity (str): Only return requests with this affinity.
+        grimorio_id (str): Only return requests assigned to this grimorio.
+        archived (bool): Read the archived requests instead of the live ones.
 
     Returns:
-        bool: True if the value matches the pattern, False otherwise.
+        tuple: The RequestRow of the page and the cursor of the next one, None on the last page.
+    """
+    model, columns = (ArchivedRequest, ARCHIVED_REQUEST_COLUMNS) if archived else (Request, REQUEST_COLUMNS)
+    result = db.execute(
+        select(*columns, *GRIMORIO_COLUMNS)
+        .outerjoin(Grimorio, model.grimorio_id == Grimorio.id)
+        .where(*page_conditions(cursor, request_status, affinity, grimorio_id, model))
+        .order_by(model.created_at, model.id)
+        .limit(limit + 1)
+    )
+    # Rows are mapped as they are fetched, the Row objects are never held all at once
+    grimorios = {}
+    return split_page([to_request_row(row, grimorios) for row in result], limit)
+
+
+def get_page_version(
+    db, limit=DEFAULT_PAGE_SIZE, cursor=None, request_status=None, affinity=None, grimorio_id=None, archived=False
+):
     """
-    return bool(re.match(regex_pattern, value))
+    Get what identifies a page of requests without loading them.
 
+    Returns:
+        tuple: The (id, updated_at) pairs of the page and the cursor of the next one.
+    """
+    model = ArchivedRequest if archived else Request
+    rows = db.execute(
+        select(model.id, model.created_at, model.updated_at)
+        .where(*page_conditions(cursor, request_status, affinity, grimorio_id, model))
+        .order_by(model.created_at, model.id)
+        .limit(limit + 1)
+    ).all()
+    rows, next_cursor = split_page(rows, limit)
+    return [(row.id, row.updated_at) for row in rows], next_cursor
+
+
+def prefix_match(column, prefix):
+    """
+    Match the values of column starting with prefix, as an index range scan
+    """
+    return and_(column >= prefix, column < prefix + PREFIX_UPPER_BOUND)
 
-def validate_request(request_data):
-    name, last_name, identification, age, affinity = request_data.values()
-    name_pattern = r'^[a-zA-ZáéíóúÁÉÍÓÚüÜñÑ]{1,20}$'
-    last_name_pattern = r'^[a-zA-ZáéíóúÁÉÍÓÚüÜñÑ]{1,20}$'
 
-    if not validate_field(name, name_pattern):
-        return False
+def search_branches(query):
+    """
+    The index walks of a search: (column, prefix, key of a RequestRow, extra conditions) each
+    """
+    identification = query.strip()
+    identification_branch = (Request.identification, identification, lambda row: row.identification, [])
+    if identification.isdigit():
+        # Names have no digits
+        return [identification_branch]
+
+    terms = normalize_text(query).split()
+    first_term = terms[0]
+    # Every other word must prefix the name or the last name too, and requests already
+    # found by their identification are left out of the name walks
+    other_terms = [
+        not_(prefix_match(Request.identification, identification)),
+        *[
+            or_(prefix_match(Request.name_normalized, term), prefix_match(Request.last_name_normalized, term))
+            for term in terms[1:]
+        ],
+    ]
+    return [
+        identification_branch,
+        (Request.name_normalized, first_term, lambda row: normalize_text(row.name), other_terms),
+        # Requests already found by their name are left out of the last name walk
+        (
+            Request.last_name_normalized,
+            first_term,
+            lambda row: normalize_text(row.last_name),
+            [*other_terms, not_(prefix_match(Request.name_normalized, first_term))],
+        ),
+    ]
+
+
+def search_objects(db, query, limit=DEFAULT_PAGE_SIZE, cursor=None):
+    """
+    Search requests by identification or by name and last name.
 
-    if not validate_field(last_name, last_name_pattern):
-        return False
+    The identifications equal to the query or starting with it always match. Unless
+    the query is all digits, the requests whose name or last name is prefixed by the
+    first word, and by every other word one of them too, match as well, ignoring case
+    and accents.
 
-    return True
+    Each column is walked in the order of its (column, id) index and the walks are
+    merged, so a page reads at most limit + 1 rows per column however many match.
+
+    Args:
+        query (str): The searched text.
+        limit (int): Maximum number of requests in the page.
+        cursor (str): Opaque cursor returned with the previous page.
+
+    Returns:
+        tuple: The RequestRow of the page, ordered by the matched value, and the cursor of the next one.
+    """
+    if not normalize_text(query):
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, detail="Empty search query")
+
+    branches = search_branches(query)
+    positions = [None] * len(branches)
+    if cursor is not None:
+        try:
+            positions = decode_key_cursor(cursor, len(branches))
+        except ValueError as error:
+            raise HTTPException(status.HTTP_400_BAD_REQUEST, detail=str(error)) from error
+
+    grimorios = {}
+    walks = []
+    for index, ((column, prefix, key, conditions), position) in enumerate(zip(branches, positions)):
+        if position is not None:
+            conditions = [*conditions, tuple_(column, Request.id) > tuple_(*position)]
+        result = db.execute(
+            select(*REQUEST_COLUMNS, *GRIMORIO_COLUMNS)
+            .outerjoin(Grimorio, Request.grimorio_id == Grimorio.id)
+            .where(prefix_match(column, prefix), *conditions)
+            .order_by(column, Request.id)
+            .limit(limit + 1)
+        )
+        rows = [to_request_row(row, grimorios) for row in result]
+        walks.append([((key(row), row.id), index, row) for row in rows])
+
+    merged = list(heapq.merge(*walks, key=lambda item: item[0]))
+    if len(merged) <= limit:
+        return [row for _, _, row in merged], None
+
+    for position, index, _ in merged[:limit]:
+        positions[index] = position
+    return [row for _, _, row in merged[:limit]], encode_key_cursor(positions)
 
 
-def valid_affinity(affinity_value):
+def get_object(db, uuid):
     """
-    Validate the affinity value
+    Get a request by id, looking in the archive when it isn't live and archive_reads is on
     """
-    return affinity_value in Affinity.__members__.values()
+    request = db.query(Request).options(joinedload(Request.grimorio)).filter(Request.id == uuid).first()
+    if request is None and settings.archive_reads:
+        request = db.query(ArchivedRequest).options(joinedload(ArchivedRequest.grimorio)).filter(
+            ArchivedRequest.id == uuid
+        ).first()
+    return request
 
 
-def create_obj(db, request_data):
+def get_object_version(db, uuid):
     """
-    Create a new request
+    Get the updated_at of a request without loading it.
+
+    Returns:
+        tuple: A one element row with updated_at, None if the request doesn't exist.
+    """
+    version = db.execute(select(Request.updated_at).where(Request.id == uuid)).first()
+    if version is None and settings.archive_reads:
+        version = db.execute(select(ArchivedRequest.updated_at).where(ArchivedRequest.id == uuid)).first()
+    return version
+
+
+def request_to_dict(request):
+    """
+    Convert a request and its grimorio into a plain dict that can be cached
+    """
+    data = {column.key: getattr(request, column.key) for column in Request.__table__.columns}
+    grimorio = request.grimorio
+    data["grimorio"] = None if grimorio is None else {
+        column.key: getattr(grimorio, column.key) for column in Grimorio.__table__.columns
+    }
+    return data
+
+
+def load_cached_object(db, uuid):
+    """
+    Load a request by id as the dict kept by the request cache, None if it doesn't exist
+    """
+    request = get_object(db, uuid)
+    return None if request is None else request_to_dict(request)
+
+
+def get_cached_object(db, uuid):
+    """
+    Get a request by id as a dict, through the request cache.
+
+    Returns:
+        dict: The request, None if it doesn't exist.
+    """
+    return request_cache.get_or_load(uuid, lambda: load_cached_object(db, uuid))
+
+
+def new_request(request_data):
+    """
+    Build a new request applying the creation rules
     """
     is_valid = validate_request(request_data)
     affinity_value = request_data.get("affinity")
@@ -77,12 +346,228 @@ def create_obj(db, request_data):
     if not is_valid:
         # Invalid validations for name or last_name
         request.status = RequestStatus.REJECTED.value
+    return request
+
+
+def duplicate_identification_error(identification):
+    return HTTPException(status.HTTP_409_CONFLICT, detail=f"{DUPLICATE_IDENTIFICATION}: {identification}")
+
+
+def create_obj(db, request_data):
+    """
+    Create a new request
+    """
+    request = new_request(request_data)
     db.add(request)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError as error:
+        db.rollback()
+        if not is_identification_conflict(error):
+            raise
+        raise duplicate_identification_error(request_data.get("identification")) from error
     db.refresh(request)
+    change_feed.publish(CREATED, request.id, request.status)
     return request
 
 
+def create_obj_idempotent(db, request_data, idempotency_key):
+    """
+    Create a new request once per Idempotency-Key.
+
+    The response is stored with the key in the same transaction as the request, a
+    retry reads it back without touching the requests table.
+
+    Returns:
+        tuple: The response data and whether it was replayed from a previous call.
+    """
+    fingerprint = request_fingerprint(request_data)
+    stored = get_stored_response(db, idempotency_key, fingerprint)
+    if stored is not None:
+        return stored, True
+
+    request = new_request(request_data)
+    db.add(request)
+    db.flush()
+    response = RequestResponse.model_validate(request).model_dump(mode="json")
+    store_response(db, idempotency_key, fingerprint, response, settings.idempotency_ttl)
+    try:
+        db.commit()
+    except IntegrityError as error:
+        db.rollback()
+        # A concurrent call with the same key won the race, unless the identification is repeated
+        stored = get_stored_response(db, idempotency_key, fingerprint)
+        if stored is not None:
+            return stored, True
+        if not is_identification_conflict(error):
+            raise
+        raise duplicate_identification_error(request_data.get("identification")) from error
+    change_feed.publish(CREATED, response["id"], response["status"])
+    return response, False
+
+
+def reject_repeated_identifications(db, results, rows):
+    """
+    With the unique identification constraint, reject the rows whose identification
+    already exists or appears earlier in the same batch.
+
+    Returns:
+        list: The rows left to insert.
+    """
+    if not rows or not unique_identification_enabled(db.get_bind()):
+        return rows
+
+    seen = set()
+    for chunk in chunks([row["identification"] for row in rows]):
+        seen.update(db.scalars(select(Request.identification).where(Request.identification.in_(chunk))))
+
+    indexes = {result["id"]: result["index"] for result in results if result["result"] == "created"}
+    kept = []
+    for row in rows:
+        identification = row["identification"]
+        if identification in seen:
+            index = indexes[row["id"]]
+            reason = f"{DUPLICATE_IDENTIFICATION}: {identification}"
+            results[index] = {"index": index, "result": "rejected", "reason": reason}
+            continue
+        seen.add(identification)
+        kept.append(row)
+    return kept
+
+
+def prepare_request_rows(records):
+    """
+    Apply the creation rules of create_obj to many raw records.
+
+    Invalid data or affinity rejects the record, invalid names create it with the
+    rejected status.
+
+    Args:
+        records (list): Raw request dicts.
+
+    Returns:
+        tuple: One result per record, in order, and the rows to insert.
+    """
+    results = [None] * len(records)
+    valid_records = []
+    for index, record in enumerate(records):
+        try:
+            valid_records.append((index, RequestCreate.model_validate(record).model_dump()))
+        except ValidationError as error:
+            first_error = error.errors()[0]
+            location = ".".join(str(part) for part in first_error["loc"])
+            reason = f"{location}: {first_error['msg']}" if location else first_error["msg"]
+            results[index] = {"index": index, "result": "rejected", "reason": reason}
+
+    validations = validate_requests([request_data for _, request_data in valid_records])
+    rows = []
+    for (index, request_data), validation in zip(valid_records, validations):
+        affinity_value = request_data.get("affinity")
+        if not validation.valid_affinity:
+            results[index] = {"index": index, "result": "rejected", "reason": f"Invalid affinity: {affinity_value}"}
+            continue
+
+        request_status = RequestStatus.PENDING if validation.valid_names else RequestStatus.REJECTED
+        row = {
+            **request_data,
+            "id": str(uuid.uuid4()),
+            "affinity": Affinity(affinity_value).value,
+            "status": request_status.value,
+        }
+        rows.append(row)
+        results[index] = {"index": index, "result": "created", "id": row["id"], "status": row["status"]}
+    return results, rows
+
+
+def insert_rows(db, rows, chunk_size):
+    for start in range(0, len(rows), chunk_size):
+        db.execute(insert(Request), rows[start:start + chunk_size])
+    db.commit()
+
+
+def create_objs(db, records, chunk_size=BULK_CHUNK_SIZE):
+    """
+    Create many requests in a single transaction.
+
+    Args:
+        records (list): Raw request dicts, as uploaded.
+        chunk_size (int): Number of rows sent in each executemany INSERT.
+
+    Returns:
+        list: One result per record, in upload order.
+    """
+    results, rows = prepare_request_rows(records)
+    rows = reject_repeated_identifications(db, results, rows)
+    try:
+        insert_rows(db, rows, chunk_size)
+    except IntegrityError as error:
+        db.rollback()
+        if not is_identification_conflict(error):
+            raise
+        # The constraint was enabled by another process after this one checked
+        forget_unique_identification(db.get_bind())
+        rows = reject_repeated_identifications(db, results, rows)
+        insert_rows(db, rows, chunk_size)
+    change_feed.publish_many([(CREATED, row["id"], row["status"], None) for row in rows])
+    return results
+
+
+def create_batch(db, records):
+    """
+    Create the requests queued by the write batcher in a single transaction.
+
+    If the transaction fails every row is retried in its own transaction, so one
+    bad row only fails its own caller.
+
+    Args:
+        records (list): Request dicts, already validated by RequestCreate.
+
+    Returns:
+        list: The created request dict, or the exception to raise, for each record.
+    """
+    results, rows = prepare_request_rows(records)
+    rows = reject_repeated_identifications(db, results, rows)
+    for row in rows:
+        row["created_at"] = row["updated_at"] = datetime.now()
+        row["grimorio_id"] = None
+
+    failures = {}
+    try:
+        if rows:
+            db.execute(insert(Request), rows)
+            db.commit()
+    except SQLAlchemyError:
+        db.rollback()
+        for row in rows:
+            try:
+                db.execute(insert(Request), [row])
+                db.commit()
+            except IntegrityError as error:
+                db.rollback()
+                if is_identification_conflict(error):
+                    # Rejected up front from the next batch on, if this process thought the constraint disabled
+                    forget_unique_identification(db.get_bind())
+                    failures[row["id"]] = duplicate_identification_error(row["identification"])
+                else:
+                    failures[row["id"]] = error
+            except SQLAlchemyError as error:
+                db.rollback()
+                failures[row["id"]] = error
+    change_feed.publish_many([(CREATED, row["id"], row["status"], None) for row in rows if row["id"] not in failures])
+
+    rows_by_id = {row["id"]: row for row in rows}
+    outcomes = []
+    for result in results:
+        if result["result"] == "rejected":
+            reason = result["reason"]
+            conflict = reason.startswith(DUPLICATE_IDENTIFICATION)
+            status_code = status.HTTP_409_CONFLICT if conflict else status.HTTP_400_BAD_REQUEST
+            outcomes.append(HTTPException(status_code, detail=reason))
+        else:
+            outcomes.append(failures.get(result["id"], rows_by_id[result["id"]]))
+    return outcomes
+
+
 def request_exists(db, uuid):
     """
     Get a request by id
@@ -92,8 +577,16 @@ def request_exists(db, uuid):
 
 def update_object(db, request_uuid, request_data):
     """
-    Update a request by uuid
+    Update a request by uuid, the returned row tells whether the request exists.
+
+    Returns:
+        bool: False if there is no request with that id.
     """
+    # A PUT replaces the whole request, every column of it is NOT NULL
+    missing = [field for field, value in request_data.items() if value is None]
+    if missing:
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"Missing fields: {', '.join(missing)}")
+
     is_valid = validate_request(request_data)
     if not is_valid:
         raise HTTPException(status.HTTP_400_BAD_REQUEST, detail="Invalid request data")
@@ -104,59 +597,362 @@ def update_object(db, request_uuid, request_data):
     if not is_valid_affinity:
         raise HTTPException(status.HTTP_400_BAD_REQUEST, detail=f"Invalid affinity: {affinity_value}")
 
-    db.query(Request).filter(Request.id == request_uuid).update(request_data)
-    db.commit()
-    return None
+    values = {
+        **request_data,
+        "name_normalized": normalize_text(request_data.get("name")),
+        "last_name_normalized": normalize_text(request_data.get("last_name")),
+    }
+    try:
+        updated = db.execute(
+            update(Request).where(Request.id == request_uuid).values(values)
+            .returning(Request.status, Request.grimorio_id)
+        ).first()
+        db.commit()
+    except IntegrityError as error:
+        db.rollback()
+        if not is_identification_conflict(error):
+            raise
+        raise duplicate_identification_error(request_data.get("identification")) from error
+    request_cache.invalidate(request_uuid)
+    if updated is None:
+        return False
+    change_feed.publish(UPDATED, request_uuid, updated.status, updated.grimorio_id)
+    return True
 
 
-def status_exists(status):
+def update_status(db, status, uuid):
     """
-    Validate the status value
+    Update the status of a request, assigning a grimorio on approval.
+
+    The status and the grimorio are written by a single UPDATE in one transaction,
+    the returned row tells whether the request exists.
+
+    Returns:
+        bool: False if there is no request with that id.
     """
-    return status in RequestStatus.__members__.values()
+    get_status = RequestStatus(status)
+    values = {"status": get_status.value}
+    if get_status == RequestStatus.APPROVED:
+        values["grimorio_id"] = assign_grimorio(db)
+    return write_status(db, uuid, values)
 
 
-def update_status(db, status, uuid):
+def update_status_deferred(db, status, uuid):
     """
-    Update the status of a request
+    Update the status of a request leaving the grimorio of an approval undrawn, the
+    caller queues ASSIGN_GRIMORIO_JOB once the status is committed.
+
+    Returns:
+        bool: False if there is no request with that id.
     """
     get_status = RequestStatus(status)
-    db.query(Request).filter(Request.id == uuid).update({"status": get_status})
+    if get_status != RequestStatus.APPROVED:
+        return update_status(db, status, uuid)
+    return write_status(db, uuid, {"status": get_status.value, "grimorio_id": None})
+
+
+def write_status(db, uuid, values):
+    updated = db.execute(
+        update(Request).where(Request.id == uuid).values(values).returning(Request.grimorio_id)
+    ).first()
     db.commit()
-    if get_status == RequestStatus.APPROVED:
-        grimorio = assign_grimorio(db)
-        db.query(Request).filter(Request.id == uuid).update({"grimorio_id": grimorio.id})
-        db.commit()
-    return None
+    request_cache.invalidate(uuid)
+    if updated is None:
+        return False
+    change_feed.publish(STATUS_CHANGED, uuid, values["status"], updated.grimorio_id)
+    return True
+
+
+def assign_pending_grimorio(db, request_id):
+    """
+    Job of a deferred approval, draw the grimorio if the request is still approved without one
+    """
+    grimorio_id = assign_grimorio(db)
+    assigned = db.execute(
+        update(Request)
+        .where(
+            Request.id == request_id,
+            Request.status == RequestStatus.APPROVED.value,
+            Request.grimorio_id.is_(None),
+        )
+        .values(grimorio_id=grimorio_id)
+        .returning(Request.id)
+    ).first()
+    db.commit()
+    if assigned is not None:
+        request_cache.invalidate(request_id)
+        change_feed.publish(GRIMORIO_ASSIGNED, request_id, RequestStatus.APPROVED.value, grimorio_id)
+
+
+job_queue.register(ASSIGN_GRIMORIO_JOB, assign_pending_grimorio)
+
+
+def enqueue_missing_assignments(db):
+    """
+    Queue the assignment of the approved requests left without grimorio, such as
+    the ones whose job was lost in a restart of the memory queue.
+
+    Returns:
+        int: The number of jobs queued.
+    """
+    request_ids = db.scalars(
+        select(Request.id).where(Request.status == RequestStatus.APPROVED.value, Request.grimorio_id.is_(None))
+    ).all()
+    for request_id in request_ids:
+        job_queue.enqueue(ASSIGN_GRIMORIO_JOB, {"request_id": request_id})
+    return len(request_ids)
 
 
 def delete_object(db, uuid):
     """
-    Delete a request by id
+    Delete a request by id, the returned row tells whether the request exists.
+
+    Returns:
+        bool: False if there is no request with that id.
     """
-    db.query(Request).filter(Request.id == uuid).delete()
+    deleted = db.execute(
+        delete(Request).where(Request.id == uuid).returning(Request.status, Request.grimorio_id)
+    ).first()
     db.commit()
-    return None
+    request_cache.invalidate(uuid)
+    if deleted is None:
+        return False
+    change_feed.publish(DELETED, uuid, deleted.status, deleted.grimorio_id)
+    return True
 
 
-def assign_grimorio(db):
-    grimorios = db.query(Grimorio).all()
-    total_ponderacion = sum(grimorio.ponderacion for grimorio in grimorios)
-    random_num = random.uniform(0, total_ponderacion)
-    cumulative_sum = 0
-    selected_grimorio = None
+def select_existing_ids(db, ids=None, filters=None):
+    """
+    Resolve a bulk selection into the ids that exist.
 
-    for grimorio in grimorios:
-        cumulative_sum += grimorio.ponderacion
-        if random_num < cumulative_sum:
-            selected_grimorio = grimorio
-            break
+    Args:
+        ids (list): Explicit request ids, duplicates are ignored.
+        filters (dict): request_status, affinity and/or grimorio_id, used when ids is None.
+
+    Returns:
+        tuple: The existing ids and the requested ids that don't exist.
+    """
+    if ids is None:
+        conditions = filter_conditions(**filters)
+        return db.execute(select(Request.id).where(*conditions)).scalars().all(), []
+
+    ids = list(dict.fromkeys(ids))
+    existing = set()
+    for ids_chunk in chunks(ids):
+        existing.update(db.execute(select(Request.id).where(Request.id.in_(ids_chunk))).scalars())
+    return [request_id for request_id in ids if request_id in existing], [
+        request_id for request_id in ids if request_id not in existing
+    ]
 
-    return selected_grimorio
+
+def unwritten_ids(existing_ids, missing_ids, written):
+    """
+    The requested ids that don't exist, including those deleted between
+    select_existing_ids and the write, which returned no row for them
+    """
+    written_ids = {row.id for row in written}
+    return missing_ids + [request_id for request_id in existing_ids if request_id not in written_ids]
+
+
+def update_statuses(db, status, ids=None, filters=None):
+    """
+    Update the status of many requests in a single transaction.
+
+    On approval the grimorios of the whole batch are drawn at once and the rows are
+    updated with one UPDATE ... WHERE id IN (...) per grimorio.
+
+    Returns:
+        tuple: The number of updated requests and the requested ids that don't exist.
+    """
+    get_status = RequestStatus(status)
+    if ids is None and get_status != RequestStatus.APPROVED:
+        # Nothing to draw per row, the filter is applied by the UPDATE itself
+        updated = db.execute(
+            update(Request).where(*filter_conditions(**filters)).values(status=get_status.value)
+            .returning(Request.id, Request.grimorio_id).execution_options(synchronize_session=False)
+        ).all()
+        db.commit()
+        request_cache.invalidate_all()
+        change_feed.publish_many([(STATUS_CHANGED, row.id, get_status.value, row.grimorio_id) for row in updated])
+        return len(updated), []
+
+    existing_ids, missing_ids = select_existing_ids(db, ids, filters)
+    if get_status == RequestStatus.APPROVED and existing_ids:
+        try:
+            grimorio_ids = get_grimorio_sampler(db).draw_many(len(existing_ids))
+        except LookupError as error:
+            raise HTTPException(status.HTTP_409_CONFLICT, detail="No grimorios available") from error
+        ids_by_grimorio = {}
+        for request_id, grimorio_id in zip(existing_ids, grimorio_ids):
+            ids_by_grimorio.setdefault(grimorio_id, []).append(request_id)
+    else:
+        ids_by_grimorio = {None: existing_ids}
+
+    updated = []
+    for grimorio_id, request_ids in ids_by_grimorio.items():
+        values = {"status": get_status.value}
+        if grimorio_id is not None:
+            values["grimorio_id"] = grimorio_id
+        for ids_chunk in chunks(request_ids):
+            updated.extend(db.execute(
+                update(Request).where(Request.id.in_(ids_chunk)).values(values)
+                .returning(Request.id, Request.grimorio_id).execution_options(synchronize_session=False)
+            ))
+    db.commit()
+    request_cache.invalidate(*existing_ids)
+    change_feed.publish_many([(STATUS_CHANGED, row.id, get_status.value, row.grimorio_id) for row in updated])
+    return len(updated), unwritten_ids(existing_ids, missing_ids, updated)
+
+
+def delete_objects(db, ids=None, filters=None):
+    """
+    Delete many requests in a single transaction.
+
+    Returns:
+        tuple: The number of deleted requests and the requested ids that don't exist.
+    """
+    if ids is None:
+        deleted = db.execute(
+            delete(Request).where(*filter_conditions(**filters))
+            .returning(Request.id, Request.status, Request.grimorio_id).execution_options(synchronize_session=False)
+        ).all()
+        db.commit()
+        request_cache.invalidate_all()
+        publish_deletions(deleted)
+        return len(deleted), []
+
+    existing_ids, missing_ids = select_existing_ids(db, ids)
+    deleted = []
+    for ids_chunk in chunks(existing_ids):
+        deleted.extend(db.execute(
+            delete(Request).where(Request.id.in_(ids_chunk))
+            .returning(Request.id, Request.status, Request.grimorio_id).execution_options(synchronize_session=False)
+        ))
+    db.commit()
+    request_cache.invalidate(*existing_ids)
+    publish_deletions(deleted)
+    return len(deleted), unwritten_ids(existing_ids, missing_ids, deleted)
+
+
+def publish_deletions(deleted):
+    change_feed.publish_many([(DELETED, row.id, row.status, row.grimorio_id) for row in deleted])
+
+
+def assign_grimorio(db):
+    """
+    Draw a grimorio id weighted by ponderacion from the cached sampler
+    """
+    try:
+        return get_grimorio_sampler(db).draw()
+    except LookupError as error:
+        raise HTTPException(status.HTTP_409_CONFLICT, detail="No grimorios available") from error
 
 
 def get_grimoire_assignments(db):
     """
-    Get all requests
+    Get every grimorio as an AssignmentRow with the requests assigned to it
     """
-    return db.query(Grimorio).options(joinedload(Grimorio.requests)).all()
+    assignments = {
+        row.id: AssignmentRow(row.id, row.tipo_trebol, row.ponderacion, row.name, [])
+        for row in db.execute(
+            select(Grimorio.id, Grimorio.tipo_trebol, Grimorio.ponderacion, Grimorio.name)
+        )
+    }
+    rows = db.execute(select(*REQUEST_COLUMNS).where(Request.grimorio_id.is_not(None)))
+    for row in rows:
+        assignment = assignments.get(row.grimorio_id)
+        if assignment is not None:
+            assignment.requests.append(to_request_row(row))
+    return list(assignments.values())
+
+
+def iter_grimoire_assignments(db, batch_size=ASSIGNMENTS_BATCH_SIZE):
+    """
+    Yield every assigned request with its grimorio, fetching rows in batches.
+
+    The rows are read through a server-side cursor on a session of their own, the request
+    session is already closed by the time a streaming response is consumed.
+
+    Args:
+        batch_size (int): Number of rows fetched from the database at a time.
+
+    Yields:
+        dict: One assignment per request.
+    """
+    query = (
+        select(
+            *REQUEST_COLUMNS,
+            Grimorio.name.label("grimorio_name"),
+            Grimorio.tipo_trebol,
+        )
+        .join(Grimorio, Request.grimorio_id == Grimorio.id)
+        .execution_options(yield_per=batch_size)
+    )
+    with Session(db.get_bind()) as stream_db:
+        for row in stream_db.execute(query).mappings():
+            yield dict(row)
+
+
+def get_assignment_stats(db):
+    """
+    Get the number of requests per grimorio, tipo_trebol, affinity and status.
+
+    All breakdowns come from one GROUP BY (grimorio_id, status, affinity), read from the
+    request_counts rows when the counters are enabled, so the work done in Python is
+    bounded by the number of groups and not by the number of requests.
+    """
+    groups = None
+    engine = db.get_bind()
+    if counters_enabled(engine):
+        try:
+            groups = db.execute(text(SELECT_COUNTS)).all()
+        except DBAPIError:
+            # The counters were disabled by another process
+            db.rollback()
+            forget_request_counters(engine)
+    if groups is None:
+        groups = db.execute(
+            select(Request.grimorio_id, Request.status, Request.affinity, func.count().label("total"))
+            .group_by(Request.grimorio_id, Request.status, Request.affinity)
+        ).all()
+
+    grimorios = db.execute(
+        select(Grimorio.id, Grimorio.name, Grimorio.tipo_trebol, Grimorio.ponderacion).order_by(Grimorio.tipo_trebol)
+    ).all()
+
+    by_grimorio = {}
+    by_status = {}
+    by_affinity = {}
+    total_requests = 0
+    for group in groups:
+        total_requests += group.total
+        by_status[group.status] = by_status.get(group.status, 0) + group.total
+        by_affinity[group.affinity] = by_affinity.get(group.affinity, 0) + group.total
+        if group.grimorio_id is not None:
+            by_grimorio[group.grimorio_id] = by_grimorio.get(group.grimorio_id, 0) + group.total
+
+    total_assigned = sum(by_grimorio.values())
+    total_ponderacion = sum(grimorio.ponderacion for grimorio in grimorios)
+    grimorio_stats = []
+    by_tipo_trebol = {}
+    for grimorio in grimorios:
+        assigned = by_grimorio.get(grimorio.id, 0)
+        by_tipo_trebol[grimorio.tipo_trebol] = by_tipo_trebol.get(grimorio.tipo_trebol, 0) + assigned
+        grimorio_stats.append({
+            "id": grimorio.id,
+            "name": grimorio.name,
+            "tipo_trebol": grimorio.tipo_trebol,
+            "ponderacion": grimorio.ponderacion,
+            "assigned": assigned,
+            "observed_share": assigned / total_assigned if total_assigned else 0.0,
+            "expected_share": grimorio.ponderacion / total_ponderacion if total_ponderacion else 0.0,
+        })
+
+    return {
+        "total_requests": total_requests,
+        "total_assigned": total_assigned,
+        "grimorios": grimorio_stats,
+        "tipo_trebol": by_tipo_trebol,
+        "affinity": by_affinity,
+        "status": by_status,
+    }
@@ -0,0 +1,100 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+from app.helpers.db_dependency import get_async_db
+from app.requests.async_views import create_batch
+from app.settings import settings
+
+
+class CreateBatcher:
+    """
+    Group commit of POST /solicitud.
+
+    Concurrent creations are queued and written in a single transaction once
+    max_batch_size requests are waiting or max_delay seconds after the first one,
+    whichever comes first. Every caller gets back its own request or error.
+
+    The batcher is driven from the event loop only, so the queue needs no lock.
+    """
+
+    def __init__(self, max_batch_size=100, max_delay=0.005, session_factory=None):
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.session_factory = session_factory or asynccontextmanager(get_async_db)
+        self.pending = []
+        self.timer = None
+        self.flush_tasks = set()
+        self.flushes = 0
+
+    async def submit(self, request_data):
+        """
+        Queue a request for creation and wait for its batch to be committed.
+
+        Args:
+            request_data (dict): Request validated by RequestCreate.
+
+        Returns:
+            dict: The created request.
+
+        Raises:
+            HTTPException: If the request is rejected, as create_obj does.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((request_data, future))
+        if len(self.pending) >= self.max_batch_size:
+            # A task of its own, a caller that goes away can't cancel the batch of the others
+            task = loop.create_task(self.write(self.take_batch()))
+            self.flush_tasks.add(task)
+            task.add_done_callback(self.flush_tasks.discard)
+        elif self.timer is None:
+            self.timer = loop.create_task(self.flush_later())
+        return await future
+
+    async def flush_later(self):
+        await asyncio.sleep(self.max_delay)
+        self.timer = None
+        await self.flush()
+
+    def take_batch(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.pending = self.pending, []
+        return batch
+
+    async def flush(self):
+        """
+        Write every queued request in a single transaction
+        """
+        await self.write(self.take_batch())
+
+    async def write(self, batch):
+        if not batch:
+            return
+
+        self.flushes += 1
+        outcomes = []
+        try:
+            async with self.session_factory() as db:
+                outcomes = await create_batch(db, [request_data for request_data, _ in batch])
+        except Exception as error:
+            outcomes = [error] * len(batch)
+        finally:
+            for index, (_, future) in enumerate(batch):
+                if future.done():
+                    # The caller went away, its request is created anyway
+                    continue
+                if index >= len(outcomes):
+                    # The flush itself was cancelled, no caller is left waiting
+                    future.cancel()
+                elif isinstance(outcomes[index], Exception):
+                    future.set_exception(outcomes[index])
+                else:
+                    future.set_result(outcomes[index])
+
+
+create_batcher = CreateBatcher(
+    max_batch_size=settings.write_batch_size,
+    max_delay=settings.write_batch_delay_ms / 1000,
+)
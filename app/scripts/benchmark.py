@@ -0,0 +1,308 @@
+"""
+Load test of the request endpoints.
+
+Seeds a database through the API and drives every endpoint with concurrent clients,
+reporting the throughput and the p50/p95/p99 latencies of each one. By default the
+app runs in process against a temporary SQLite database, --url targets a running
+server instead.
+
+    python -m app.scripts.benchmark --scale 10000 --output benchmark.json
+    python -m app.scripts.benchmark --baseline benchmark.json
+
+With --baseline the run fails if any endpoint is slower than the baseline by more
+than --tolerance.
+"""
+import argparse
+import asyncio
+import math
+import random
+import sys
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+import httpx
+import orjson
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+
+from app.databases.database import build_async_engine
+from app.databases.database import build_engine
+from app.databases.migrations import run_migrations
+from app.helpers.db_dependency import ThreadedSession
+from app.helpers.db_dependency import get_async_db
+from app.helpers.db_dependency import get_db
+from app.requests.models import Affinity
+from app.requests.schemas import MAX_BULK_IDS
+from app.settings import settings
+
+SEED_CHUNK_SIZE = 1000
+APPROVED_SHARE = 0.2
+NAMES = ["Juan", "Maria", "Asta", "Yuno", "Noelle", "Mimosa", "Luck", "Finral"]
+LAST_NAMES = ["Perez", "Silva", "Vermillion", "Staria", "Voltia", "Grinberryall"]
+
+
+def percentile(ordered, percent):
+    """
+    Nearest-rank percentile of an ordered list
+    """
+    if not ordered:
+        return 0.0
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+
+def summarize(latencies, errors, duration):
+    """
+    Summarize the latencies, in seconds, of one scenario
+    """
+    ordered = sorted(latencies)
+    return {
+        "requests": len(ordered),
+        "errors": errors,
+        "duration_s": round(duration, 4),
+        "throughput": round(len(ordered) / duration, 2) if duration else 0.0,
+        "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+    }
+
+
+def compare_to_baseline(results, baseline, tolerance=0.2):
+    """
+    Compare a run against a baseline run.
+
+    Args:
+        results (dict): Output of run_benchmark.
+        baseline (dict): A previous output of run_benchmark.
+        tolerance (float): Allowed relative slowdown, 0.2 is 20%.
+
+    Returns:
+        list: One message per regression, empty if there is none.
+    """
+    regressions = []
+    for name, result in results["scenarios"].items():
+        reference = baseline["scenarios"].get(name)
+        if reference is None:
+            continue
+        if result["throughput"] < reference["throughput"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: throughput {result['throughput']:.1f} req/s, baseline {reference['throughput']:.1f} req/s"
+            )
+        if result["p95_ms"] > reference["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {result['p95_ms']:.2f} ms, baseline {reference['p95_ms']:.2f} ms")
+        if result["errors"] > reference["errors"]:
+            regressions.append(f"{name}: {result['errors']} errors, baseline {reference['errors']}")
+    return regressions
+
+
+def request_record(rng, index):
+    return {
+        "name": rng.choice(NAMES),
+        "last_name": rng.choice(LAST_NAMES),
+        "identification": f"{index:010d}",
+        "age": rng.randint(15, 80),
+        "affinity": rng.choice(list(Affinity)).value,
+    }
+
+
+async def seed(client, scale, extra, rng):
+    """
+    Create the grimorios and scale + extra requests through the API, approving a share of them.
+
+    Returns:
+        tuple: The ids of the first scale requests and of the extra ones, kept apart for deletion.
+    """
+    response = await client.get("/create-grimorios-fixtures")
+    response.raise_for_status()
+
+    ids = []
+    total = scale + extra
+    for start in range(0, total, SEED_CHUNK_SIZE):
+        records = [request_record(rng, index) for index in range(start, min(start + SEED_CHUNK_SIZE, total))]
+        response = await client.post("/solicitudes/bulk", content=orjson.dumps(records))
+        response.raise_for_status()
+        ids.extend(result["id"] for result in response.json()["data"] if result["result"] == "created")
+
+    approved = rng.sample(ids[:scale], int(scale * APPROVED_SHARE))
+    for start in range(0, len(approved), MAX_BULK_IDS):
+        response = await client.patch(
+            "/solicitudes/estatus", json={"status": "Aprobado", "ids": approved[start:start + MAX_BULK_IDS]}
+        )
+        response.raise_for_status()
+    return ids[:scale], ids[scale:]
+
+
+def build_scenarios(ids, delete_ids, rng):
+    """
+    The request of each scenario, as a function of the request index
+    """
+    return {
+        "list": lambda index: ("GET", "/solicitudes?limit=50", None),
+        "get": lambda index: ("GET", f"/solicitud/{rng.choice(ids)}", None),
+        "create": lambda index: ("POST", "/solicitud", request_record(rng, len(ids) + len(delete_ids) + index)),
+        "update": lambda index: ("PUT", f"/solicitud/{rng.choice(ids)}", request_record(rng, index)),
+        "status": lambda index: ("PATCH", f"/solicitud/{rng.choice(ids)}/estatus", {"status": "Aprobado"}),
+        "assignments": lambda index: ("GET", "/asignaciones", None),
+        "assignments_stats": lambda index: ("GET", "/asignaciones/estadisticas", None),
+        "delete": lambda index: ("DELETE", f"/solicitud/{delete_ids[index]}", None),
+    }
+
+
+async def run_scenario(client, build_request, requests, concurrency):
+    latencies = []
+    errors = 0
+    indexes = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for index in indexes:
+            method, path, body = build_request(index)
+            started = time.perf_counter()
+            response = await client.request(method, path, json=body)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+@asynccontextmanager
+async def in_process_database(app, database_url):
+    """
+    Point the database dependencies of app to database_url
+    """
+    engine = build_engine(database_url, settings)
+    run_migrations(engine)
+    session_local = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    async_engine = None
+    async_session_local = None
+    if settings.database_async:
+        async_engine = build_async_engine(database_url, settings)
+        async_session_local = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+    def override_get_db():
+        db = session_local()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    async def override_get_async_db():
+        if async_engine is None:
+            db = session_local()
+            try:
+                yield ThreadedSession(db)
+            finally:
+                db.close()
+            return
+
+        async with async_session_local() as db:
+            yield db
+
+    previous_overrides = dict(app.dependency_overrides)
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    try:
+        yield
+    finally:
+        app.dependency_overrides.clear()
+        app.dependency_overrides.update(previous_overrides)
+        engine.dispose()
+        if async_engine is not None:
+            await async_engine.dispose()
+
+
+async def drive(client, scale, requests, concurrency, seed_value):
+    rng = random.Random(seed_value)
+    started = time.perf_counter()
+    ids, delete_ids = await seed(client, scale, requests, rng)
+    seed_duration = time.perf_counter() - started
+
+    scenarios = {}
+    for name, build_request in build_scenarios(ids, delete_ids, rng).items():
+        scenarios[name] = await run_scenario(client, build_request, requests, concurrency)
+    return {
+        "config": {
+            "scale": scale,
+            "requests": requests,
+            "concurrency": concurrency,
+            "seed": seed_value,
+            "seed_duration_s": round(seed_duration, 4),
+        },
+        "scenarios": scenarios,
+    }
+
+
+def run_benchmark(scale=10000, requests=500, concurrency=16, seed_value=0, url=None, database_url=None):
+    """
+    Seed a database and load test every endpoint.
+
+    Args:
+        scale (int): Number of requests seeded before the run.
+        requests (int): Number of requests sent to each endpoint.
+        concurrency (int): Number of concurrent clients.
+        seed_value (int): Seed of the random data and request order.
+        url (str): Base url of a running server, the app runs in process when None.
+        database_url (str): Database of the in-process app, a temporary SQLite file when None.
+
+    Returns:
+        dict: The configuration of the run and the summary of each scenario.
+    """
+    async def against(transport, base_url):
+        async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=60) as client:
+            return await drive(client, scale, requests, concurrency, seed_value)
+
+    if url is not None:
+        return asyncio.run(against(None, url))
+
+    from app.main import app
+
+    async def in_process(directory):
+        async with in_process_database(app, database_url or f"sqlite:///{Path(directory) / 'benchmark.db'}"):
+            return await against(httpx.ASGITransport(app=app), "http://benchmark")
+
+    with tempfile.TemporaryDirectory() as directory:
+        return asyncio.run(in_process(directory))
+
+
+def print_results(results):
+    print(f"{'scenario':<20}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for name, result in results["scenarios"].items():
+        print(
+            f"{name:<20}{result['throughput']:>10.1f}{result['p50_ms']:>10.2f}"
+            f"{result['p95_ms']:>10.2f}{result['p99_ms']:>10.2f}{result['errors']:>8}"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the request endpoints")
+    parser.add_argument("--scale", type=int, default=10000, help="requests seeded before the run")
+    parser.add_argument("--requests", type=int, default=500, help="requests sent to each endpoint")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent clients")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random data")
+    parser.add_argument("--url", help="base url of a running server, the app runs in process by default")
+    parser.add_argument("--database-url", help="database of the in-process app, a temporary SQLite file by default")
+    parser.add_argument("--output", help="save the results as JSON to this file")
+    parser.add_argument("--baseline", help="fail if the run is slower than the results in this file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown against the baseline")
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(args.scale, args.requests, args.concurrency, args.seed, args.url, args.database_url)
+    print_results(results)
+    if args.output:
+        Path(args.output).write_bytes(orjson.dumps(results, option=orjson.OPT_INDENT_2))
+
+    if args.baseline:
+        regressions = compare_to_baseline(results, orjson.loads(Path(args.baseline).read_bytes()), args.tolerance)
+        if regressions:
+            print("\n".join(["Regressions against the baseline:", *regressions]))
+            return 1
+        print("No regressions against the baseline")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,13 +1,12 @@
 import uuid
 
 from app.requests.models import Grimorio
+from app.requests.sampler import invalidate_grimorio_sampler
 
 
 def create_grimorio_fixtures(db):
 
-    exist_objects = db.query(Grimorio).all()
-    print(exist_objects)
-    if exist_objects:
+    if db.query(Grimorio.id).first() is not None:
         return
 
     grimorios_data = [
@@ -18,13 +17,15 @@ def create_grimorio_fixtures(db):
         {"tipo_trebol": 5, "ponderacion": 1, "name": "Grimorio de cinco tréboles"},
     ]
 
-    for grimorio_data in grimorios_data:
-        grimorio = Grimorio(
+    db.add_all([
+        Grimorio(
             id=str(uuid.uuid4()),  # Genera un UUID para cada grimorio
             tipo_trebol=grimorio_data["tipo_trebol"],
             ponderacion=grimorio_data["ponderacion"],
             name=grimorio_data["name"]
         )
-        db.add(grimorio)
+        for grimorio_data in grimorios_data
+    ])
 
     db.commit()
+    invalidate_grimorio_sampler()
@@ -0,0 +1,176 @@
+"""
+Generate a synthetic dataset of requests for load and query plan testing.
+
+    python -m app.scripts.generate_dataset 1000000 --seed 42 --end 2024-06-01
+
+Rows are drawn from realistic distributions: skewed affinities, a share of names
+that fail validate_request (and are rejected, as create_obj does), created_at
+spread over --days with more recent traffic, and approvals assigned to grimorios
+according to their ponderacion. The same seed, count and end date always produce
+the same rows for the same grimorios.
+"""
+import argparse
+import random
+import sys
+import time
+import uuid
+from datetime import datetime
+from datetime import timedelta
+from itertools import islice
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.requests.models import Affinity
+from app.requests.models import Request
+from app.requests.models import RequestStatus
+from app.requests.sampler import GrimorioSampler
+from app.requests.validators import validate_requests
+from app.scripts.create_grimorio_fixtures import create_grimorio_fixtures
+
+DATASET_CHUNK_SIZE = 10000
+AFFINITY_WEIGHTS = {
+    Affinity.FUEGO: 22,
+    Affinity.AGUA: 20,
+    Affinity.VIENTO: 18,
+    Affinity.TIERRA: 18,
+    Affinity.LUZ: 12,
+    Affinity.OSCURIDAD: 10,
+}
+# Status of the requests whose names are valid, invalid names are always rejected
+STATUS_WEIGHTS = {
+    RequestStatus.APPROVED: 55,
+    RequestStatus.PENDING: 30,
+    RequestStatus.REJECTED: 15,
+}
+INVALID_NAME_SHARE = 0.04
+NAMES = [
+    "Juan", "María", "José", "Lucía", "Asta", "Yuno", "Noelle", "Mimosa", "Luck", "Finral",
+    "Sofía", "Martín", "Valentina", "Mateo", "Camila", "Nicolás", "Ángel", "Ximena", "Iñaki", "Zoé",
+]
+LAST_NAMES = [
+    "Pérez", "Gómez", "Rodríguez", "Fernández", "López", "Martínez", "Silva", "Vermillion",
+    "Staria", "Voltia", "Núñez", "Muñoz", "Ibáñez", "Grinberryall", "Castillo", "Peña",
+]
+
+
+def invalid_name(rng, name):
+    """
+    A name that fails NAME_PATTERN: digits, punctuation, spaces or more than 20 letters
+    """
+    return rng.choice([
+        f"{name}{rng.randint(1, 99)}",
+        f"{name}-{rng.choice(NAMES)}",
+        f"{name} {rng.choice(NAMES)}",
+        name * (21 // len(name) + 1),
+    ])
+
+
+def generate_requests(count, sampler, seed=0, days=365, end=None):
+    """
+    Yield count request rows, ready for an executemany INSERT.
+
+    Args:
+        count (int): Number of rows.
+        sampler (GrimorioSampler): Draws the grimorio of each approved request.
+        seed (int): Seed of every random choice except the grimorio draws.
+        days (int): created_at is spread over the days before end.
+        end (datetime): Latest created_at, today at midnight when None.
+    """
+    rng = random.Random(seed)
+    end = end or datetime.combine(datetime.now().date(), datetime.min.time())
+    span = days * 86400
+    affinities = [affinity.value for affinity in AFFINITY_WEIGHTS]
+    affinity_weights = list(AFFINITY_WEIGHTS.values())
+    statuses = [request_status.value for request_status in STATUS_WEIGHTS]
+    status_weights = list(STATUS_WEIGHTS.values())
+
+    for _ in range(count):
+        name = rng.choice(NAMES)
+        last_name = rng.choice(LAST_NAMES)
+        if rng.random() < INVALID_NAME_SHARE:
+            if rng.random() < 0.5:
+                name = invalid_name(rng, name)
+            else:
+                last_name = invalid_name(rng, last_name)
+        row = {
+            "id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            "name": name,
+            "last_name": last_name,
+            "identification": str(rng.randint(10_000_000, 9_999_999_999)),
+            "age": rng.randint(15, 90),
+            "affinity": rng.choices(affinities, affinity_weights)[0],
+            "grimorio_id": None,
+        }
+        # Traffic grows over time: the triangular mode at the end makes recent days busier
+        row["created_at"] = end - timedelta(seconds=span - rng.triangular(0, span, span))
+
+        valid_names = validate_requests([row])[0].valid_names
+        row["status"] = rng.choices(statuses, status_weights)[0] if valid_names else RequestStatus.REJECTED.value
+        if row["status"] == RequestStatus.PENDING.value:
+            row["updated_at"] = row["created_at"]
+        else:
+            row["updated_at"] = min(end, row["created_at"] + timedelta(seconds=rng.randint(60, 7 * 86400)))
+        if row["status"] == RequestStatus.APPROVED.value:
+            row["grimorio_id"] = sampler.draw()
+        yield row
+
+
+def print_progress(inserted, total, started):
+    elapsed = time.perf_counter() - started
+    rate = inserted / elapsed if elapsed else 0.0
+    print(f"\rInserted {inserted:,}/{total:,} requests ({inserted / total:.0%}), {rate:,.0f} rows/s",
+          end="", file=sys.stderr, flush=True)
+
+
+def generate_dataset(engine, count, seed=0, chunk_size=DATASET_CHUNK_SIZE, days=365, end=None, progress=None):
+    """
+    Insert count synthetic requests, creating the grimorios if needed.
+
+    Every chunk is inserted with one executemany INSERT in its own transaction.
+
+    Args:
+        progress (callable): Called with (inserted, count) after every chunk.
+
+    Returns:
+        int: The number of inserted requests.
+    """
+    with Session(engine) as db:
+        create_grimorio_fixtures(db)
+        sampler = GrimorioSampler.from_db(db, seed=seed)
+
+    rows = generate_requests(count, sampler, seed=seed, days=days, end=end)
+    inserted = 0
+    while chunk := list(islice(rows, chunk_size)):
+        with engine.begin() as connection:
+            connection.execute(insert(Request), chunk)
+        inserted += len(chunk)
+        if progress is not None:
+            progress(inserted, count)
+    return inserted
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic dataset of requests")
+    parser.add_argument("count", type=int, help="number of requests to generate")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random data")
+    parser.add_argument("--chunk-size", type=int, default=DATASET_CHUNK_SIZE, help="rows per INSERT")
+    parser.add_argument("--days", type=int, default=365, help="days covered by created_at")
+    parser.add_argument("--end", type=datetime.fromisoformat, help="latest created_at, today by default")
+    args = parser.parse_args(argv)
+
+    from app.databases.database import engine
+    from app.databases.migrations import run_migrations
+
+    run_migrations(engine)
+    started = time.perf_counter()
+    inserted = generate_dataset(
+        engine, args.count, seed=args.seed, chunk_size=args.chunk_size, days=args.days, end=args.end,
+        progress=lambda done, total: print_progress(done, total, started),
+    )
+    print(f"\nGenerated {inserted:,} requests in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
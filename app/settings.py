@@ -0,0 +1,87 @@
+from typing import Literal
+from typing import Optional
+
+from pydantic_settings import BaseSettings
+from pydantic_settings import SettingsConfigDict
+
+
+class Settings(BaseSettings):
+    """
+    Deployment settings, read from the environment or the .env file
+    """
+    model_config = SettingsConfigDict(env_file='.env', extra='ignore')
+
+    # Database, DATABASE_URL wins over the POSTGRES_* variables
+    database_url: Optional[str] = None
+    postgres_user: Optional[str] = None
+    postgres_password: Optional[str] = None
+    postgres_host: Optional[str] = None
+    postgres_database: Optional[str] = None
+    database_async: bool = True
+
+    # Connection pool
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: int = 30
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
+
+    # SQLite pragmas, applied to every new connection
+    sqlite_journal_mode: Literal['WAL', 'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'OFF'] = 'WAL'
+    sqlite_synchronous: Literal['OFF', 'NORMAL', 'FULL', 'EXTRA'] = 'NORMAL'
+    sqlite_busy_timeout: int = 5000
+    sqlite_mmap_size: int = 256 * 1024 * 1024
+    # Negative values are KiB, -65536 is a 64MB page cache per connection
+    sqlite_cache_size: int = -65536
+
+    # Read-through cache of GET /solicitud/{uuid}
+    request_cache_backend: Literal['memory', 'redis', 'none'] = 'memory'
+    request_cache_ttl: int = 60
+    request_cache_maxsize: int = 10000
+    redis_url: str = 'redis://localhost:6379/0'
+
+    # Group commit of POST /solicitud, off by default
+    write_batching: bool = False
+    write_batch_size: int = 100
+    write_batch_delay_ms: int = 5
+
+    # Stored responses of POST /solicitud with an Idempotency-Key header, in seconds
+    idempotency_ttl: int = 86400
+
+    # Change feed of GET /solicitudes/eventos: events kept for resuming, events queued per
+    # client before a slow client is disconnected and seconds between keep-alive comments
+    change_feed_history: int = 10000
+    change_feed_max_queued: int = 1000
+    change_feed_heartbeat: float = 15.0
+
+    # Background jobs. With async_assignment the grimorio of an approval is drawn by a job
+    # after PATCH /solicitud/{uuid}/estatus returns, the database backend keeps the jobs
+    # across restarts
+    async_assignment: bool = False
+    job_queue_backend: Literal['memory', 'database'] = 'memory'
+    job_workers: int = 2
+    job_max_attempts: int = 5
+    job_retry_delay: float = 1.0
+    job_poll_interval: float = 1.0
+    job_retention: int = 86400
+
+    # Archival of the requests, in days since created_at. archive_interval is the seconds
+    # between two scheduled archivals, 0 only archives on demand
+    archive_reads: bool = True
+    archive_rejected_after_days: int = 30
+    archive_after_days: int = 365
+    archive_batch_size: int = 1000
+    archive_interval: int = 0
+
+    def get_database_url(self):
+        if self.database_url:
+            return self.database_url
+        if self.postgres_host:
+            return (
+                f'postgresql://{self.postgres_user}:{self.postgres_password}'
+                f'@{self.postgres_host}/{self.postgres_database}'
+            )
+        return 'sqlite:///./requests.db'
+
+
+settings = Settings()
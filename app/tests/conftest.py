@@ -0,0 +1,24 @@
+from contextlib import contextmanager
+
+import pytest
+
+from app.helpers.metrics import count_queries
+
+
+@pytest.fixture
+def assert_max_queries():
+    """
+    Fail the test if a block runs more than max_queries SQL statements.
+
+        with assert_max_queries(2):
+            client.get("/solicitudes")
+    """
+    @contextmanager
+    def assert_max_queries(max_queries):
+        with count_queries() as statements:
+            yield statements
+        assert len(statements) <= max_queries, (
+            f"{len(statements)} queries executed, expected at most {max_queries}:\n" + "\n".join(statements)
+        )
+
+    return assert_max_queries
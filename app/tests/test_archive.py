@@ -0,0 +1,97 @@
+from datetime import datetime
+from datetime import timedelta
+
+from fastapi import status
+from sqlalchemy import create_engine
+from sqlalchemy import func
+from sqlalchemy import insert
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from app.databases.database import Base
+from app.helpers.jobs import JOB_SUCCEEDED
+from app.helpers.jobs import job_queue
+from app.helpers.metrics import count_queries
+from app.requests import views
+from app.requests.archive import archive_requests
+from app.requests.models import ArchivedRequest
+from app.requests.models import Request
+from app.tests.test_requests import TestingSessionLocal
+from app.tests.test_requests import client
+
+NOW = datetime(2024, 6, 1)
+
+
+def request_row(index, request_status, days_old):
+    created_at = NOW - timedelta(days=days_old)
+    return {
+        "id": f"{index:04d}",
+        "name": "Juan",
+        "last_name": "Perez",
+        "identification": str(index),
+        "age": 25,
+        "affinity": "Agua",
+        "status": request_status,
+        "created_at": created_at,
+        "updated_at": created_at,
+    }
+
+
+def test_archive_requests_in_batches():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    rows = [
+        *[request_row(index, "Rechazado", 40) for index in range(5)],
+        request_row(5, "Rechazado", 10),
+        request_row(6, "Pendiente", 40),
+        *[request_row(index, "Aprobado", 400) for index in range(7, 10)],
+        *[request_row(index, "Pendiente", 400) for index in range(10, 13)],
+    ]
+    with Session(engine) as db:
+        db.execute(insert(Request), rows)
+        db.commit()
+
+        with count_queries() as statements:
+            archived = archive_requests(db, rejected_after_days=30, after_days=365, batch_size=2, now=NOW)
+        assert archived == 8
+        # Batches of 2: 3 for the 5 rejected requests, 2 for the 3 aged out ones, a SELECT, INSERT and DELETE each
+        assert sum(statement.startswith("SELECT") for statement in statements) == 5
+
+        # Approved requests keep their grimorio assignment, whatever their age
+        assert db.scalars(select(Request.id).order_by(Request.id)).all() == ["0005", "0006", "0007", "0008", "0009"]
+        assert db.scalar(select(func.count()).select_from(ArchivedRequest)) == 8
+        archived_row = db.get(ArchivedRequest, "0010")
+        assert (archived_row.status, archived_row.archived_at) == ("Pendiente", NOW)
+
+        # Reads fall back to the archive
+        assert views.get_object(db, "0000").status == "Rechazado"
+        assert views.get_object_version(db, "0000").updated_at == NOW - timedelta(days=40)
+        page, _ = views.get_all_objects(db, archived=True, request_status="Pendiente")
+        assert [row.id for row in page] == ["0010", "0011", "0012"]
+
+        assert archive_requests(db, rejected_after_days=30, after_days=365, now=NOW) == 0
+
+
+def test_archive_requests_endpoint(monkeypatch):
+    monkeypatch.setattr(job_queue, "session_factory", TestingSessionLocal)
+    old = request_row(0, "Rechazado", 60)
+    old["id"] = "archived-request"
+    old["created_at"] = old["updated_at"] = datetime.now() - timedelta(days=60)
+    with TestingSessionLocal() as db:
+        db.execute(insert(Request), [old])
+        db.commit()
+    assert client.get("/solicitud/archived-request").status_code == status.HTTP_200_OK
+
+    response = client.post("/solicitudes/archivar")
+    assert response.status_code == status.HTTP_202_ACCEPTED
+    job_queue.run_pending()
+    assert client.get(f"/trabajos/{response.json()['job_id']}").json()["data"]["status"] == JOB_SUCCEEDED
+
+    ids = [row["id"] for row in client.get("/solicitudes?limit=100").json()["data"]]
+    assert "archived-request" not in ids
+    archived_ids = [row["id"] for row in client.get("/solicitudes?archived=true").json()["data"]]
+    assert archived_ids == ["archived-request"]
+    response = client.get("/solicitud/archived-request")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["data"]["status"] == "Rechazado"
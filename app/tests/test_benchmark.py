@@ -0,0 +1,56 @@
+import orjson
+
+from app.main import app
+from app.scripts.benchmark import compare_to_baseline
+from app.scripts.benchmark import main
+from app.scripts.benchmark import percentile
+from app.scripts.benchmark import run_benchmark
+from app.scripts.benchmark import summarize
+
+
+def test_percentile():
+    ordered = [float(value) for value in range(1, 101)]
+
+    assert percentile(ordered, 50) == 50.0
+    assert percentile(ordered, 95) == 95.0
+    assert percentile(ordered, 99) == 99.0
+    assert percentile([], 99) == 0.0
+
+
+def test_compare_to_baseline():
+    baseline = {"scenarios": {"get": summarize([0.010] * 100, 0, 1.0)}}
+    faster = {"scenarios": {"get": summarize([0.008] * 100, 0, 0.8)}}
+    slower = {"scenarios": {"get": summarize([0.020] * 100, 3, 2.0)}}
+
+    assert compare_to_baseline(faster, baseline) == []
+    regressions = compare_to_baseline(slower, baseline)
+    assert len(regressions) == 3
+    assert all(regression.startswith("get:") for regression in regressions)
+
+
+def test_run_benchmark_covers_every_endpoint():
+    overrides = dict(app.dependency_overrides)
+
+    results = run_benchmark(scale=40, requests=10, concurrency=4)
+
+    assert set(results["scenarios"]) == {
+        "list", "get", "create", "update", "status", "assignments", "assignments_stats", "delete"
+    }
+    for result in results["scenarios"].values():
+        assert result["requests"] == 10
+        assert result["errors"] == 0
+        assert result["p50_ms"] <= result["p95_ms"] <= result["p99_ms"]
+    assert app.dependency_overrides == overrides
+
+
+def test_main_fails_on_regression(tmp_path, monkeypatch):
+    output = tmp_path / "results.json"
+    baseline = tmp_path / "baseline.json"
+    baseline.write_bytes(orjson.dumps({"scenarios": {"list": summarize([0.000001], 0, 0.000001)}}))
+    monkeypatch.setattr(
+        "app.scripts.benchmark.run_benchmark",
+        lambda *args: {"config": {}, "scenarios": {"list": summarize([0.01], 0, 0.01)}},
+    )
+
+    assert main(["--output", str(output), "--baseline", str(baseline)]) == 1
+    assert orjson.loads(output.read_bytes())["scenarios"]["list"]["requests"] == 1
@@ -0,0 +1,86 @@
+import asyncio
+
+from app.helpers.cache import MISSING
+from app.helpers.cache import MemoryCache
+from app.helpers.cache import ReadThroughCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_memory_cache_evicts_least_recently_used():
+    cache = MemoryCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    assert cache.get("b") is MISSING
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_memory_cache_expires_entries():
+    clock = FakeClock()
+    cache = MemoryCache(maxsize=10, ttl=5, clock=clock)
+    cache.set("a", 1)
+    clock.now = 4.9
+    assert cache.get("a") == 1
+    clock.now = 5
+    assert cache.get("a") is MISSING
+    assert len(cache) == 0
+
+
+def test_read_through_cache_counts_hits_and_misses():
+    cache = ReadThroughCache(MemoryCache())
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return {"id": "a"}
+
+    assert cache.get_or_load("a", loader) == {"id": "a"}
+    assert cache.get_or_load("a", loader) == {"id": "a"}
+    assert len(loads) == 1
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+    cache.invalidate("a")
+    cache.get_or_load("a", loader)
+    assert len(loads) == 2
+
+
+def test_read_through_cache_skips_values_loaded_during_invalidation():
+    cache = ReadThroughCache(MemoryCache())
+
+    def stale_loader():
+        # A write commits and invalidates while the old row is being read
+        cache.invalidate("a")
+        return {"status": "Pendiente"}
+
+    assert cache.get_or_load("a", stale_loader) == {"status": "Pendiente"}
+    assert cache.get_or_load("a", lambda: {"status": "Aprobado"}) == {"status": "Aprobado"}
+
+
+def test_read_through_cache_does_not_cache_missing_values():
+    cache = ReadThroughCache(MemoryCache())
+    assert cache.get_or_load("a", lambda: None) is None
+    assert cache.get_or_load("a", lambda: {"id": "a"}) == {"id": "a"}
+
+
+def test_read_through_cache_defers_invalidations():
+    cache = ReadThroughCache(MemoryCache())
+    cache.get_or_load("a", lambda: {"status": "Pendiente"})
+
+    with cache.defer_invalidations() as invalidations:
+        cache.invalidate("a")
+        assert cache.get_or_load("a", lambda: {"status": "Aprobado"}) == {"status": "Pendiente"}
+    assert invalidations == ["a"]
+
+    asyncio.run(cache.apply_invalidations(invalidations))
+    assert cache.get_or_load("a", lambda: {"status": "Aprobado"}) == {"status": "Aprobado"}
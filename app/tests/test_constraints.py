@@ -0,0 +1,90 @@
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from app.databases.database import Base
+from app.requests import views
+from app.requests.constraints import UNIQUE_IDENTIFICATION_INDEX
+from app.requests.constraints import disable_unique_identification
+from app.requests.constraints import enable_unique_identification
+from app.requests.constraints import unique_identification_enabled
+
+
+def request_data(identification):
+    return {
+        "name": "Juan",
+        "last_name": "Perez",
+        "identification": identification,
+        "age": 25,
+        "affinity": "Agua",
+    }
+
+
+def make_engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    return engine
+
+
+def test_enable_unique_identification_with_duplicates():
+    engine = make_engine()
+    with Session(engine) as db:
+        views.create_obj(db, request_data("1"))
+        views.create_obj(db, request_data("1"))
+
+    with pytest.raises(ValueError):
+        enable_unique_identification(engine)
+    assert not unique_identification_enabled(engine)
+
+
+def test_unique_identification_on_every_write_path():
+    engine = make_engine()
+    enable_unique_identification(engine)
+    assert unique_identification_enabled(engine)
+
+    with Session(engine) as db:
+        views.create_obj(db, request_data("1"))
+        with pytest.raises(HTTPException) as error:
+            views.create_obj(db, request_data("1"))
+        assert error.value.status_code == 409
+
+        results = views.create_objs(db, [request_data("1"), request_data("2"), request_data("2")])
+        assert [result["result"] for result in results] == ["rejected", "created", "rejected"]
+        assert results[0]["reason"] == "Duplicate identification: 1"
+
+        outcomes = views.create_batch(db, [request_data("3"), request_data("3")])
+        assert outcomes[0]["identification"] == "3"
+        assert outcomes[1].status_code == 409
+
+        other = views.create_obj(db, request_data("4"))
+        with pytest.raises(HTTPException) as error:
+            views.update_object(db, other.id, request_data("1"))
+        assert error.value.status_code == 409
+        views.update_object(db, other.id, {**request_data("4"), "age": 30})
+
+        # Other constraints are not reported as a repeated identification
+        with pytest.raises(IntegrityError):
+            views.create_obj(db, {**request_data("5"), "age": None})
+
+    disable_unique_identification(engine)
+    assert not unique_identification_enabled(engine)
+    with Session(engine) as db:
+        views.create_obj(db, request_data("1"))
+
+
+def test_unique_identification_enabled_by_another_process():
+    engine = make_engine()
+    assert not unique_identification_enabled(engine)
+    # The cached answer of this process is not updated
+    with engine.begin() as connection:
+        connection.execute(text(f"CREATE UNIQUE INDEX {UNIQUE_IDENTIFICATION_INDEX} ON requests (identification)"))
+
+    with Session(engine) as db:
+        views.create_obj(db, request_data("1"))
+        results = views.create_objs(db, [request_data("1"), request_data("2")])
+        assert [result["result"] for result in results] == ["rejected", "created"]
+    assert unique_identification_enabled(engine)
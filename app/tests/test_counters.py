@@ -0,0 +1,74 @@
+from sqlalchemy import create_engine
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.databases.migrations import run_migrations
+from app.requests.counters import DROP_STATEMENTS
+from app.requests.counters import counters_enabled
+from app.requests.counters import disable_request_counters
+from app.requests.counters import enable_request_counters
+from app.requests.views import create_obj
+from app.requests.views import create_objs
+from app.requests.views import delete_object
+from app.requests.views import get_assignment_stats
+from app.requests.views import update_object
+from app.requests.views import update_status
+from app.requests.views import update_statuses
+from app.scripts.create_grimorio_fixtures import create_grimorio_fixtures
+
+
+def test_request_counters_match_group_by():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    run_migrations(engine)
+    db = sessionmaker(bind=engine)()
+    create_grimorio_fixtures(db)
+    request_data = {
+        "name": "Juan",
+        "last_name": "Perez",
+        "identification": "12345678",
+        "age": 25,
+        "affinity": "Agua",
+    }
+    # Requests created before the counters are enabled are backfilled
+    before = create_obj(db, dict(request_data))
+    update_status(db, "Aprobado", before.id)
+
+    enable_request_counters(engine)
+    assert counters_enabled(engine)
+
+    created = [create_obj(db, dict(request_data)) for _ in range(4)]
+    create_objs(db, [{**request_data, "affinity": "Luz"}, {**request_data, "name": "Juan Carlos"}])
+    update_status(db, "Aprobado", created[0].id)
+    update_status(db, "Aprobado", created[0].id)
+    update_statuses(db, "Aprobado", ids=[created[1].id, created[2].id])
+    update_statuses(db, "Rechazado", filters={"request_status": "Pendiente", "affinity": "Luz"})
+    update_object(db, created[3].id, {**request_data, "affinity": "Fuego"})
+    delete_object(db, created[2].id)
+
+    counted_stats = get_assignment_stats(db)
+    disable_request_counters(engine)
+    assert not counters_enabled(engine)
+    grouped_stats = get_assignment_stats(db)
+
+    assert counted_stats == grouped_stats
+    assert grouped_stats['total_requests'] == 6
+    assert grouped_stats['total_assigned'] == 3
+    assert grouped_stats['affinity'] == {"Agua": 4, "Luz": 1, "Fuego": 1}
+    db.close()
+
+
+def test_request_counters_dropped_by_another_process():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    run_migrations(engine)
+    db = sessionmaker(bind=engine)()
+    create_obj(db, {"name": "Juan", "last_name": "Perez", "identification": "1", "age": 25, "affinity": "Agua"})
+    enable_request_counters(engine)
+    # The cached answer of this process is not updated
+    with engine.begin() as connection:
+        for statement in DROP_STATEMENTS["sqlite"]:
+            connection.execute(text(statement))
+
+    assert get_assignment_stats(db)['total_requests'] == 1
+    assert not counters_enabled(engine)
+    db.close()
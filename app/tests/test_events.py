@@ -0,0 +1,121 @@
+import asyncio
+import threading
+
+from fastapi import status
+
+from app.requests.events import CREATED
+from app.requests.events import DELETED
+from app.requests.events import RESET
+from app.requests.events import STATUS_CHANGED
+from app.requests.events import ChangeFeed
+from app.requests.events import sse_stream
+from app.tests.test_requests import client
+
+
+def request_data(identification):
+    return {
+        "name": "Juan",
+        "last_name": "Perez",
+        "identification": identification,
+        "age": 25,
+        "affinity": "Agua",
+    }
+
+
+def test_change_feed_filters_events_from_other_threads():
+    async def scenario():
+        feed = ChangeFeed()
+        subscription = feed.subscribe(statuses=["Aprobado"])
+        by_id = feed.subscribe(request_ids=["b"])
+
+        publisher = threading.Thread(target=feed.publish_many, args=([
+            (CREATED, "a", "Pendiente", None),
+            (STATUS_CHANGED, "a", "Aprobado", "g1"),
+            (STATUS_CHANGED, "b", "Rechazado", None),
+        ],))
+        publisher.start()
+        publisher.join()
+
+        event = await subscription.get(1)
+        assert (event.type, event.request_id, event.grimorio_id) == (STATUS_CHANGED, "a", "g1")
+        assert (await by_id.get(1)).request_id == "b"
+        assert await subscription.get(0.01) is None
+        assert len(feed.subscribers) == 2
+
+    asyncio.run(scenario())
+
+
+def test_change_feed_resumes_from_last_event_id():
+    async def scenario():
+        feed = ChangeFeed(history=3)
+        feed.publish_many([(CREATED, str(index), "Pendiente", None) for index in range(5)])
+
+        resumed = feed.subscribe(last_event_id=f"{feed.epoch}-3")
+        assert [(await resumed.get(1)).request_id for _ in range(2)] == ["3", "4"]
+        assert resumed.queue.empty()
+
+        # Event 1 fell out of the history, as did any id of another process
+        for last_event_id in (f"{feed.epoch}-1", "deadbeef-4", "garbage"):
+            event = await feed.subscribe(last_event_id=last_event_id).get(1)
+            assert (event.type, event.id) == (RESET, f"{feed.epoch}-5")
+
+    asyncio.run(scenario())
+
+
+def test_change_feed_disconnects_slow_clients():
+    async def scenario():
+        feed = ChangeFeed(max_queued=2)
+        subscription = feed.subscribe()
+        feed.publish_many([(CREATED, str(index), "Pendiente", None) for index in range(3)])
+        await asyncio.sleep(0)
+
+        assert subscription.closed
+        assert not feed.subscribers
+        assert [(await subscription.get()).request_id for _ in range(2)] == ["0", "1"]
+        assert await subscription.get() is None
+
+    asyncio.run(scenario())
+
+
+def test_sse_stream():
+    async def scenario():
+        feed = ChangeFeed()
+        subscription = feed.subscribe()
+        stream = sse_stream(subscription, heartbeat=0.01)
+
+        assert await anext(stream) == "retry: 3000\n\n"
+        assert await anext(stream) == ": keep-alive\n\n"
+        feed.publish(DELETED, "a", "Pendiente")
+        assert await anext(stream) == (
+            f'id: {feed.epoch}-1\nevent: deleted\ndata: {{"id":"{feed.epoch}-1","type":"deleted",'
+            '"request_id":"a","status":"Pendiente","grimorio_id":null}\n\n'
+        )
+        await stream.aclose()
+        assert not feed.subscribers
+
+    asyncio.run(scenario())
+
+
+def test_request_events_websocket():
+    with client.websocket_connect("/solicitudes/eventos/ws?status=Aprobado") as approved, \
+            client.websocket_connect("/solicitudes/eventos/ws") as everything:
+        uuid_created = client.post("/solicitud", json=request_data("55555555")).json()["data"]["id"]
+        client.put(f"/solicitud/{uuid_created}", json=request_data("55555556"))
+        client.patch(f"/solicitud/{uuid_created}/estatus", json={"status": "Aprobado"})
+        client.delete(f"/solicitud/{uuid_created}")
+
+        events = [everything.receive_json() for _ in range(4)]
+        assert [event["type"] for event in events] == ["created", "updated", "status", "deleted"]
+        assert {event["request_id"] for event in events} == {uuid_created}
+        assert events[2]["grimorio_id"] is not None
+        assert events[3]["status"] == "Aprobado"
+
+        # The deletion of the approved request also matches the status filter
+        assert [approved.receive_json()["type"] for _ in range(2)] == ["status", "deleted"]
+
+    with client.websocket_connect(f"/solicitudes/eventos/ws?id={uuid_created}&last_event_id={events[0]['id']}") as ws:
+        assert [ws.receive_json()["id"] for _ in range(3)] == [event["id"] for event in events[1:]]
+
+
+def test_request_events_invalid_filters():
+    assert client.get("/solicitudes/eventos?status=Nope").status_code == status.HTTP_400_BAD_REQUEST
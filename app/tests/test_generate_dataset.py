@@ -0,0 +1,72 @@
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import create_engine
+from sqlalchemy import func
+from sqlalchemy import select
+from sqlalchemy.pool import StaticPool
+
+from app.databases.database import Base
+from app.requests.models import Grimorio
+from app.requests.models import Request
+from app.requests.sampler import GrimorioSampler
+from app.requests.validators import validate_requests
+from app.scripts.generate_dataset import generate_dataset
+from app.scripts.generate_dataset import generate_requests
+
+END = datetime(2024, 6, 1)
+
+
+def sampler():
+    return GrimorioSampler([("uno", 60), ("dos", 25), ("tres", 10), ("cuatro", 4), ("cinco", 1)], seed=7)
+
+
+def test_generate_requests_is_deterministic():
+    first = list(generate_requests(500, sampler(), seed=7, end=END))
+    second = list(generate_requests(500, sampler(), seed=7, end=END))
+    other = list(generate_requests(500, sampler(), seed=8, end=END))
+
+    assert first == second
+    assert first != other
+    assert len({row["id"] for row in first}) == 500
+
+
+def test_generate_requests_follows_the_creation_rules():
+    rows = list(generate_requests(20000, sampler(), seed=1, days=30, end=END))
+
+    for row, validation in zip(rows, validate_requests(rows)):
+        assert validation.valid_affinity
+        if not validation.valid_names:
+            assert row["status"] == "Rechazado"
+        assert (row["grimorio_id"] is not None) == (row["status"] == "Aprobado")
+        assert (END - row["created_at"]).days < 30
+        assert row["created_at"] <= row["updated_at"] <= END
+
+    invalid_names = sum(1 for validation in validate_requests(rows) if not validation.valid_names)
+    assert 0.02 < invalid_names / len(rows) < 0.06
+
+    grimorios = Counter(row["grimorio_id"] for row in rows if row["grimorio_id"] is not None)
+    approved = sum(grimorios.values())
+    assert abs(grimorios["uno"] / approved - 0.60) < 0.03
+    assert abs(grimorios["cinco"] / approved - 0.01) < 0.01
+
+
+def test_generate_dataset_inserts_in_chunks():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    progress = []
+
+    inserted = generate_dataset(
+        engine, 2500, seed=3, chunk_size=1000, end=END, progress=lambda *args: progress.append(args)
+    )
+
+    assert inserted == 2500
+    assert progress == [(1000, 2500), (2000, 2500), (2500, 2500)]
+    with engine.connect() as connection:
+        assert connection.scalar(select(func.count()).select_from(Request)) == 2500
+        assert connection.scalar(select(func.count()).select_from(Grimorio)) == 5
+        orphans = connection.scalar(
+            select(func.count()).select_from(Request)
+            .where(Request.grimorio_id.isnot(None), Request.grimorio_id.not_in(select(Grimorio.id)))
+        )
+        assert orphans == 0
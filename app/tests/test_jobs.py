@@ -0,0 +1,156 @@
+import time
+
+import pytest
+from fastapi import status
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.databases.database import Base
+from app.helpers.jobs import JOB_FAILED
+from app.helpers.jobs import JOB_PENDING
+from app.helpers.jobs import JOB_RUNNING
+from app.helpers.jobs import JOB_SUCCEEDED
+from app.helpers.jobs import DatabaseJobStore
+from app.helpers.jobs import JobQueue
+from app.helpers.jobs import MemoryJobStore
+from app.helpers.jobs import job_queue
+from app.settings import settings
+from app.tests.test_requests import TestingSessionLocal
+from app.tests.test_requests import client
+
+
+def flaky(failures):
+    calls = []
+
+    def handler(db, value):
+        calls.append(value)
+        if len(calls) <= failures:
+            raise RuntimeError(f"attempt {len(calls)}")
+
+    return handler, calls
+
+
+def database_store():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    return DatabaseJobStore(sessionmaker(bind=engine))
+
+
+@pytest.mark.parametrize("make_store", [MemoryJobStore, database_store])
+def test_job_queue_retries_until_max_attempts(make_store):
+    queue = JobQueue(make_store(), TestingSessionLocal, max_attempts=3, retry_delay=0)
+    handler, calls = flaky(failures=2)
+    queue.register("flaky", handler)
+    queue.register("broken", flaky(failures=10)[0])
+
+    succeeded = queue.enqueue("flaky", {"value": 1})
+    failed = queue.enqueue("broken", {"value": 2})
+    assert queue.store.depth()[JOB_PENDING] == 2
+
+    assert queue.run_pending() == 6
+    assert calls == [1, 1, 1]
+    job = queue.get(succeeded.id)
+    assert (job.status, job.attempts, job.last_error) == (JOB_SUCCEEDED, 3, None)
+    job = queue.get(failed.id)
+    assert (job.status, job.attempts, job.last_error) == (JOB_FAILED, 3, "RuntimeError: attempt 3")
+    assert queue.store.depth() == {JOB_PENDING: 0, JOB_RUNNING: 0, JOB_SUCCEEDED: 1, JOB_FAILED: 1}
+
+    with pytest.raises(ValueError):
+        queue.enqueue("unknown", {})
+
+
+def test_job_queue_backoff():
+    queue = JobQueue(MemoryJobStore(), TestingSessionLocal, retry_delay=60)
+    queue.register("flaky", flaky(failures=1)[0])
+    job = queue.enqueue("flaky", {"value": 1})
+
+    assert queue.run_pending() == 1
+    retried = queue.get(job.id)
+    assert retried.status == JOB_PENDING
+    assert (retried.run_at - retried.updated_at).total_seconds() > 59
+
+
+def test_database_job_store_lease_expiry():
+    store = database_store()
+    queue = JobQueue(store, TestingSessionLocal)
+    queue.register("noop", lambda db: None)
+    job = queue.enqueue("noop", {})
+
+    # A worker claims the job and dies with it, once the lease expires it is claimed again
+    assert store.claim(lease=0).id == job.id
+    time.sleep(0.01)
+    reclaimed = store.claim(lease=300)
+    assert (reclaimed.id, reclaimed.attempts) == (job.id, 2)
+    assert store.claim(lease=300) is None
+
+
+def test_job_queue_workers():
+    queue = JobQueue(MemoryJobStore(), TestingSessionLocal, poll_interval=0.05)
+    handler, calls = flaky(failures=0)
+    queue.register("job", handler)
+    queue.start(2)
+    try:
+        jobs = [queue.enqueue("job", {"value": value}) for value in range(10)]
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline and any(queue.get(job.id).status != JOB_SUCCEEDED for job in jobs):
+            time.sleep(0.01)
+    finally:
+        queue.stop()
+
+    assert sorted(calls) == list(range(10))
+    assert not queue.workers
+
+
+class CountingStore(MemoryJobStore):
+    def __init__(self):
+        super().__init__()
+        self.depth_calls = 0
+
+    def depth(self):
+        self.depth_calls += 1
+        return super().depth()
+
+
+def test_job_queue_workers_throttle_depth_report():
+    store = CountingStore()
+    queue = JobQueue(store, TestingSessionLocal, poll_interval=0.01)
+    queue.register("job", flaky(failures=0)[0])
+    queue.start(1)
+    try:
+        jobs = [queue.enqueue("job", {"value": value}) for value in range(20)]
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline and any(queue.get(job.id).status != JOB_SUCCEEDED for job in jobs):
+            time.sleep(0.01)
+    finally:
+        queue.stop()
+
+    # Once when the worker starts, not after every job and idle poll
+    assert store.depth_calls == 1
+
+
+def test_update_request_status_deferred_assignment(monkeypatch):
+    monkeypatch.setattr(settings, "async_assignment", True)
+    monkeypatch.setattr(job_queue, "session_factory", TestingSessionLocal)
+    request_data = {
+        "name": "Juan",
+        "last_name": "Perez",
+        "identification": "24242424",
+        "age": 25,
+        "affinity": "Agua",
+    }
+    uuid_created = client.post("/solicitud", json=request_data).json()["data"]["id"]
+
+    response = client.patch(f"/solicitud/{uuid_created}/estatus", json={"status": "Aprobado"})
+    assert response.status_code == status.HTTP_200_OK
+    job_id = response.json()["job_id"]
+    assert client.get(f"/solicitud/{uuid_created}").json()["data"]["grimorio"] is None
+    assert client.get(f"/trabajos/{job_id}").json()["data"]["status"] == JOB_PENDING
+
+    job_queue.run_pending()
+    assert client.get(f"/trabajos/{job_id}").json()["data"]["status"] == JOB_SUCCEEDED
+    assert client.get(f"/solicitud/{uuid_created}").json()["data"]["grimorio"] is not None
+
+    response = client.patch(f"/solicitud/{uuid_created}/estatus", json={"status": "Rechazado"})
+    assert "job_id" not in response.json()
+    assert client.get("/trabajos/unknown").status_code == status.HTTP_404_NOT_FOUND
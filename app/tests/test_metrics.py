@@ -0,0 +1,71 @@
+import pytest
+from fastapi import status
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from app.helpers.metrics import MetricsRegistry
+from app.helpers.metrics import QueryStats
+from app.helpers.metrics import current_query_stats
+from app.helpers.metrics import metrics_registry
+from app.tests.test_requests import TestingSessionLocal
+from app.tests.test_requests import client
+
+
+def test_registry_renders_prometheus_histogram():
+    registry = MetricsRegistry(buckets=(0.01, 0.1))
+    registry.observe("GET", "/solicitud/{uuid}", 200, 0.005, QueryStats(statements=1, duration=0.001))
+    registry.observe("GET", "/solicitud/{uuid}", 404, 0.05, QueryStats(statements=1, duration=0.002))
+    registry.observe("PATCH", "/solicitud/{uuid}/estatus", 200, 0.5, QueryStats(statements=2, rows=1))
+
+    lines = registry.render().splitlines()
+
+    assert "# TYPE http_request_duration_seconds histogram" in lines
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/solicitud/{uuid}",le="0.01"} 1' in lines
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/solicitud/{uuid}",le="0.1"} 2' in lines
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/solicitud/{uuid}",le="+Inf"} 2' in lines
+    assert 'http_request_duration_seconds_count{method="GET",route="/solicitud/{uuid}"} 2' in lines
+    assert 'http_requests_total{method="GET",route="/solicitud/{uuid}",status="404"} 1' in lines
+    assert 'db_statements_total{method="GET",route="/solicitud/{uuid}"} 2' in lines
+    assert 'db_rows_total{method="PATCH",route="/solicitud/{uuid}/estatus"} 1' in lines
+
+
+def test_metrics_endpoint_reports_routes_and_queries():
+    metrics_registry.reset()
+    request_data = {"name": "Juan", "last_name": "Perez", "identification": "1", "age": 20, "affinity": "Agua"}
+    uuid_created = client.post("/solicitud", json=request_data).json()["data"]["id"]
+    client.get(f"/solicitud/{uuid_created}")
+    client.get("/ruta-inexistente")
+
+    response = client.get("/metrics")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    lines = response.text.splitlines()
+    assert 'http_requests_total{method="POST",route="/solicitud",status="200"} 1' in lines
+    assert 'http_requests_total{method="GET",route="/solicitud/{uuid}",status="200"} 1' in lines
+    assert 'http_requests_total{method="GET",route="<unmatched>",status="404"} 1' in lines
+    assert 'db_statements_total{method="POST",route="/solicitud"} 2' in lines
+    assert 'db_rows_total{method="POST",route="/solicitud"} 1' in lines
+
+
+def test_query_stats_count_returned_rows():
+    values = "SELECT 1 AS value UNION ALL SELECT 2 UNION ALL SELECT 3"
+    stats = QueryStats()
+    token = current_query_stats.set(stats)
+    try:
+        with Session(TestingSessionLocal.kw["bind"]) as db:
+            assert db.execute(text(values)).scalars().all() == [1, 2, 3]
+            # Rows are counted as they are fetched, the result isn't buffered
+            streamed = db.execute(text(values).execution_options(yield_per=1)).mappings()
+            assert (next(streamed)["value"], stats.rows) == (1, 4)
+            assert [row["value"] for row in streamed] == [2, 3]
+            db.execute(text("UPDATE requests SET age = age"))
+            db.rollback()
+        # A failed statement is not counted, and doesn't break the next ones
+        with pytest.raises(OperationalError), Session(TestingSessionLocal.kw["bind"]) as db:
+            db.execute(text("SELECT * FROM missing_table"))
+    finally:
+        current_query_stats.reset(token)
+
+    assert (stats.statements, stats.rows) == (3, 6)
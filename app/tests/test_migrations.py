@@ -0,0 +1,113 @@
+from sqlalchemy import create_engine
+from sqlalchemy import event
+from sqlalchemy import inspect
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.databases.migrations import LATEST_VERSION
+from app.databases.migrations import get_schema_version
+from app.databases.migrations import run_migrations
+from app.requests.views import get_all_objects
+from app.requests.views import request_exists
+from app.requests.views import search_objects
+from app.requests.views import select_existing_ids
+
+
+def create_memory_engine():
+    return create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+
+
+def test_run_migrations_on_existing_database():
+    engine = create_memory_engine()
+    with engine.begin() as connection:
+        # Schema created by create_all before the indexes were declared
+        connection.execute(text(
+            "CREATE TABLE grimorios (id VARCHAR PRIMARY KEY, tipo_trebol INTEGER NOT NULL, "
+            "ponderacion INTEGER NOT NULL, name VARCHAR NOT NULL)"
+        ))
+        connection.execute(text(
+            "CREATE TABLE requests (id VARCHAR PRIMARY KEY, name VARCHAR NOT NULL, last_name VARCHAR NOT NULL, "
+            "identification VARCHAR NOT NULL, age INTEGER NOT NULL, affinity VARCHAR NOT NULL, "
+            "status VARCHAR NOT NULL, created_at DATETIME, updated_at DATETIME, "
+            "grimorio_id VARCHAR REFERENCES grimorios (id))"
+        ))
+        connection.execute(text(
+            "INSERT INTO requests VALUES ('1', 'José', 'Núñez', '123', 20, 'Agua', 'Pendiente', "
+            "'2024-01-01 00:00:00', '2024-01-02 00:00:00', NULL)"
+        ))
+
+    assert run_migrations(engine) == [1, 2, 3, 4, 5]
+    assert run_migrations(engine) == []
+
+    index_names = {index["name"] for index in inspect(engine).get_indexes("requests")}
+    assert {
+        "ix_requests_status_created_at", "ix_requests_grimorio_id_created_at", "ix_requests_name_normalized"
+    }.issubset(index_names)
+    with engine.connect() as connection:
+        assert get_schema_version(connection) == LATEST_VERSION
+        # Existing requests are backfilled without touching updated_at
+        row = connection.execute(text(
+            "SELECT name_normalized, last_name_normalized, updated_at FROM requests WHERE id = '1'"
+        )).one()
+        assert tuple(row) == ("jose", "nunez", "2024-01-02 00:00:00")
+
+
+def explain_query_plans(engine, fn, *args, **kwargs):
+    """
+    Run fn and return the EXPLAIN QUERY PLAN of every SELECT it executed
+    """
+    statements = []
+
+    def record_statement(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    db = sessionmaker(bind=engine)()
+    event.listen(engine, "before_cursor_execute", record_statement)
+    try:
+        fn(db, *args, **kwargs)
+    finally:
+        event.remove(engine, "before_cursor_execute", record_statement)
+        db.close()
+
+    plans = []
+    with engine.connect() as connection:
+        for statement, parameters in statements:
+            rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+            plans.append(" | ".join(row[-1] for row in rows))
+    return plans
+
+
+def test_hot_queries_use_indexes():
+    engine = create_memory_engine()
+    run_migrations(engine)
+
+    plans = explain_query_plans(engine, get_all_objects, limit=10, request_status="Pendiente")
+    assert "USING INDEX ix_requests_status_created_at" in plans[0]
+
+    plans = explain_query_plans(engine, get_all_objects, limit=10, grimorio_id="grimorio")
+    assert "USING INDEX ix_requests_grimorio_id_created_at" in plans[0]
+
+    plans = explain_query_plans(engine, get_all_objects, limit=10, affinity="Agua")
+    assert "USING INDEX ix_requests_affinity_created_at" in plans[0]
+
+    plans = explain_query_plans(engine, get_all_objects, limit=10)
+    assert "USING INDEX ix_requests_created_at_id" in plans[0]
+    assert "TEMP B-TREE" not in plans[0]
+
+    plans = explain_query_plans(engine, select_existing_ids, filters={"grimorio_id": "grimorio"})
+    assert "USING COVERING INDEX ix_requests_grimorio_id_created_at" in plans[0]
+
+    plans = explain_query_plans(engine, search_objects, "jose per", limit=10)
+    assert "USING INDEX ix_requests_identification_id" in plans[0]
+    assert "USING INDEX ix_requests_name_normalized" in plans[1]
+    assert "USING INDEX ix_requests_last_name_normalized" in plans[2]
+    assert all("TEMP B-TREE" not in plan for plan in plans)
+
+    plans = explain_query_plans(engine, search_objects, "1234", limit=10)
+    assert "USING INDEX ix_requests_identification_id" in plans[0]
+    assert "TEMP B-TREE" not in plans[0]
+
+    plans = explain_query_plans(engine, request_exists, "uuid")
+    assert "USING INDEX sqlite_autoindex_requests_1" in plans[0]
@@ -0,0 +1,92 @@
+import time
+import tracemalloc
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.databases.migrations import run_migrations
+from app.requests.models import Grimorio
+from app.requests.models import Request
+from app.requests.read_models import RequestRow
+from app.requests.views import create_objs
+from app.requests.views import get_all_objects
+from app.requests.views import get_grimoire_assignments
+from app.requests.views import update_statuses
+from app.scripts.create_grimorio_fixtures import create_grimorio_fixtures
+
+ROWS = 5000
+
+
+def create_session():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    run_migrations(engine)
+    db = sessionmaker(bind=engine)()
+    create_grimorio_fixtures(db)
+    request_data = {
+        "name": "Juan",
+        "last_name": "Perez",
+        "identification": "12345678",
+        "age": 25,
+        "affinity": "Agua",
+    }
+    create_objs(db, [request_data] * ROWS)
+    update_statuses(db, "Aprobado", filters={"affinity": "Agua"})
+    return db
+
+
+def measure(db, fn):
+    """
+    Return the result of fn, the memory it retains, its peak allocated memory and its duration
+    """
+    db.expunge_all()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    duration = time.perf_counter() - start
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, retained, peak, duration
+
+
+def test_read_models_match_orm():
+    db = create_session()
+    objects, _ = get_all_objects(db, limit=10)
+    assert all(isinstance(obj, RequestRow) for obj in objects)
+    orm_object = db.get(Request, objects[0].id)
+    assert objects[0].grimorio.name == orm_object.grimorio.name
+    assert objects[0].updated_at == orm_object.updated_at
+
+    assignments = get_grimoire_assignments(db)
+    assert len(assignments) == 5
+    assert sum(len(assignment.requests) for assignment in assignments) == ROWS
+    db.close()
+
+
+def test_read_models_memory_benchmark():
+    db = create_session()
+
+    def orm_page():
+        return db.query(Request).options(joinedload(Request.grimorio)).order_by(Request.created_at).all()
+
+    def rows_page():
+        return get_all_objects(db, limit=ROWS)[0]
+
+    orm_objects, orm_retained, orm_peak, orm_time = measure(db, orm_page)
+    rows, rows_retained, rows_peak, rows_time = measure(db, rows_page)
+
+    assert len(orm_objects) == len(rows) == ROWS
+    print(f"\nlisting {ROWS} rows: ORM {orm_retained / ROWS:.0f}B/row (peak {orm_peak / ROWS:.0f}B/row) "
+          f"{orm_time * 1000:.1f}ms, rows {rows_retained / ROWS:.0f}B/row (peak {rows_peak / ROWS:.0f}B/row) "
+          f"{rows_time * 1000:.1f}ms")
+    assert rows_retained < orm_retained / 2
+    assert rows_peak < orm_peak
+
+    def orm_assignments():
+        return db.query(Grimorio).options(joinedload(Grimorio.requests)).all()
+
+    _, orm_retained, _, _ = measure(db, orm_assignments)
+    _, rows_retained, _, _ = measure(db, lambda: get_grimoire_assignments(db))
+    assert rows_retained < orm_retained / 2
+    db.close()
@@ -1,12 +1,19 @@
+import json
+
 from fastapi import status
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
+from sqlalchemy import event
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 
 from app.databases.database import Base
+from app.helpers.db_dependency import ThreadedSession
+from app.helpers.db_dependency import get_async_db
 from app.helpers.db_dependency import get_db
+from app.helpers.metrics import count_queries
 from app.main import app
+from app.requests import views
 
 from app.scripts.create_grimorio_fixtures import create_grimorio_fixtures
 
@@ -30,7 +37,16 @@ def override_get_db():
         db.close()
 
 
+async def override_get_async_db():
+    db = TestingSessionLocal()
+    try:
+        yield ThreadedSession(db)
+    finally:
+        db.close()
+
+
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_async_db] = override_get_async_db
 
 client = TestClient(app)
 
@@ -191,6 +207,23 @@ def test_update_request_with_invalid_data():
     assert response.status_code != status.HTTP_204_NO_CONTENT
 
 
+def test_update_request_with_missing_fields():
+    request_data = {
+        "name": "Juan",
+        "last_name": "Perez",
+        "identification": "12345678",
+        "age": 25,
+        "affinity": "Agua",
+    }
+    uuid_created = client.post("/solicitud", json=request_data).json()['data']['id']
+
+    partial_data = {"name": "Juan", "last_name": "Perez", "affinity": "Agua"}
+    response = client.put(f"/solicitud/{uuid_created}", json=partial_data)
+
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    assert response.json()['detail'] == "Missing fields: identification, age"
+
+
 def test_update_request_invalid_affinity():
     request_data = {
         "name": "Juan",
@@ -327,3 +360,527 @@ def test_assign_grimorio():
     grimorio_assigned = get_object_created.json()['data']['grimorio']
 
     assert grimorio_assigned is not None
+
+
+def test_get_all_requests_paginated():
+    request_data = {
+        "name": "Pagina",
+        "last_name": "Perez",
+        "identification": "12345678",
+        "age": 25,
+        "affinity": "Viento",
+    }
+    created_ids = {client.post("/solicitud", json=request_data).json()['data']['id'] for _ in range(5)}
+
+    seen_ids = []
+    cursor = None
+    while True:
+        params = {"limit": 2, "affinity": "Viento"}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/solicitudes", params=params)
+        assert response.status_code == status.HTTP_200_OK
+        response = response.json()
+        assert len(response['data']) <= 2
+        seen_ids.extend(item['id'] for item in response['data'])
+        cursor = response['next_cursor']
+        if cursor is None:
+            break
+
+    assert len(seen_ids) == len(set(seen_ids))
+    assert created_ids.issubset(seen_ids)
+
+
+def test_get_all_requests_filter_by_status():
+    response = client.get("/solicitudes", params={"status": "Rechazado"})
+    assert response.status_code == status.HTTP_200_OK
+    assert all(item['status'] == 'Rechazado' for item in response.json()['data'])
+
+
+def test_get_all_requests_invalid_filters():
+    response = client.get("/solicitudes", params={"status": "INVALID_STATUS"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.json()['detail'] == 'Invalid status'
+
+    response = client.get("/solicitudes", params={"affinity": "BEER"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.json()['detail'] == 'Invalid affinity: BEER'
+
+
+def test_get_all_requests_invalid_cursor():
+    response = client.get("/solicitudes", params={"cursor": "not-a-cursor"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_get_all_assignments_ndjson():
+    request_data = {
+        "name": "Juan",
+        "last_name": "Perez",
+        "identification": "12345678",
+        "age": 25,
+        "affinity": "Fuego",
+    }
+    response = client.post("/solicitud", json=request_data)
+    uuid_created = response.json()['data']['id']
+    client.patch(f"/solicitud/{uuid_created}/estatus", json={"status": "Aprobado"})
+
+    response = client.get("/asignaciones", params={"format": "ndjson"})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers['content-type'] == 'application/x-ndjson'
+    assignments = [json.loads(line) for line in response.text.splitlines()]
+    assignment = next(item for item in assignments if item['id'] == uuid_created)
+    assert assignment['status'] == 'Aprobado'
+    assert assignment['grimorio_name'].startswith('Grimorio')
+
+
+def test_get_all_assignments_invalid_format():
+    response = client.get("/asignaciones", params={"format": "xml"})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+def test_create_requests_bulk_json():
+    records = [
+        {"name": "Juan", "last_name": "Perez", "identification": "1", "age": 25, "affinity": "Agua"},
+        {"name": "Juan Carlos", "last_name": "Perez", "identification": "2", "age": 25, "affinity": "Agua"},
+        {"name": "Juan", "last_name": "Perez", "identification": "3", "age": 25, "affinity": "BEER"},
+        {"name": "Juan", "last_name": "Perez", "identification": "4", "affinity": "Agua"},
+    ]
+    response = client.post("/solicitudes/bulk", params={"chunk_size": 1}, json=records)
+
+    assert response.status_code == status.HTTP_200_OK
+    response = response.json()
+    assert response['created'] == 2
+    assert response['rejected'] == 2
+    results = response['data']
+    assert results[0]['result'] == 'created'
+    assert results[0]['status'] == 'Pendiente'
+    assert results[1]['status'] == 'Rechazado'
+    assert results[2] == {"index": 2, "result": "rejected", "reason": "Invalid affinity: BEER"}
+    assert results[3]['result'] == 'rejected'
+    assert results[3]['reason'].startswith('age')
+
+    get_object_created = client.get(f"/solicitud/{results[0]['id']}")
+    assert get_object_created.json()['data']['identification'] == '1'
+    assert get_object_created.json()['data']['created_at'] is not None
+
+
+def test_create_requests_bulk_ndjson_and_csv():
+    ndjson_body = (
+        '{"name": "Ana", "last_name": "Lopez", "identification": "5", "age": 30, "affinity": "Luz"}\n'
+        '\n'
+        '{"name": "Eva", "last_name": "Lopez", "identification": "6", "age": 31, "affinity": "Fuego"}\n'
+    )
+    response = client.post(
+        "/solicitudes/bulk", content=ndjson_body, headers={"Content-Type": "application/x-ndjson"}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()['created'] == 2
+
+    csv_body = "name,last_name,identification,age,affinity\nAna,Lopez,7,30,Tierra\nEva,Lopez,8,abc,Tierra\n"
+    response = client.post("/solicitudes/bulk", content=csv_body, headers={"Content-Type": "text/csv"})
+    assert response.status_code == status.HTTP_200_OK
+    response = response.json()
+    assert response['created'] == 1
+    assert response['data'][1]['result'] == 'rejected'
+
+
+def test_create_requests_bulk_invalid_payload():
+    response = client.post("/solicitudes/bulk", json={"name": "Juan"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    response = client.post("/solicitudes/bulk", content="<xml/>", headers={"Content-Type": "application/xml"})
+    assert response.status_code == status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+
+
+def test_update_request_status_not_found():
+    response = client.patch("/solicitud/12345678/estatus", json={"status": "Aprobado"})
+
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert response.json()['detail'] == 'Request not found'
+
+
+def test_update_request_status_single_statement():
+    request_data = {
+        "name": "Juan",
+        "last_name": "Perez",
+        "identification": "12345678",
+        "age": 25,
+        "affinity": "Agua",
+    }
+    uuid_created = client.post("/solicitud", json=request_data).json()['data']['id']
+    # Warm up the grimorio sampler so only the status transition is measured
+    client.patch(f"/solicitud/{uuid_created}/estatus", json={"status": "Pendiente"})
+    client.patch(f"/solicitud/{uuid_created}/estatus", json={"status": "Aprobado"})
+
+    statements = []
+
+    def record_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record_statement)
+    try:
+        response = client.patch(f"/solicitud/{uuid_created}/estatus", json={"status": "Aprobado"})
+    finally:
+        event.remove(engine, "before_cursor_execute", record_statement)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert len(statements) == 1
+    assert statements[0].startswith("UPDATE requests SET")
+    assert client.get(f"/solicitud/{uuid_created}").json()['data']['grimorio'] is not None
+
+
+def test_update_requests_status_bulk():
+    request_data = {
+        "name": "Juan",
+        "last_name": "Perez",
+        "identification": "12345678",
+        "age": 25,
+        "affinity": "Agua",
+    }
+    uuids = [client.post("/solicitud", json=request_data).json()['data']['id'] for _ in range(4)]
+
+    response = client.patch("/solicitudes/estatus", json={"ids": uuids + ["missing-id"], "status": "Aprobado"})
+
+    assert response.status_code == status.HTTP_200_OK
+    response = response.json()
+    assert response['updated'] == 4
+    assert response['missing'] == ['missing-id']
+    for uuid_created in uuids:
+        data = client.get(f"/solicitud/{uuid_created}").json()['data']
+        assert data['status'] == 'Aprobado'
+        assert data['grimorio'] is not None
+
+
+def test_update_requests_status_bulk_by_filter():
+    request_data = {
+        "name": "Juan",
+        "last_name": "Perez",
+        "identification": "12345678",
+        "age": 25,
+        "affinity": "Oscuridad",
+    }
+    client.post("/solicitud", json=request_data)
+
+    response = client.patch(
+        "/solicitudes/estatus",
+        json={"filters": {"affinity": "Oscuridad", "status": "Pendiente"}, "status": "Rechazado"},
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()['updated'] >= 1
+    remaining = client.get("/solicitudes", params={"affinity": "Oscuridad", "status": "Pendiente"}).json()['data']
+    assert remaining == []
+
+
+def test_update_requests_status_bulk_invalid():
+    response = client.patch("/solicitudes/estatus", json={"ids": ["a"], "status": "INVALID_STATUS"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    response = client.patch("/solicitudes/estatus", json={"status": "Aprobado"})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    response = client.patch("/solicitudes/estatus", json={"filters": {}, "status": "Aprobado"})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+def test_delete_requests_bulk():
+    request_data = {
+        "name": "Juan",
+        "last_name": "Perez",
+        "identification": "12345678",
+        "age": 25,
+        "affinity": "Agua",
+    }
+    uuids = [client.post("/solicitud", json=request_data).json()['data']['id'] for _ in range(3)]
+
+    response = client.request("DELETE", "/solicitudes", json={"ids": uuids + ["missing-id"]})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()['deleted'] == 3
+    assert response.json()['missing'] == ['missing-id']
+    for uuid_created in uuids:
+        assert client.get(f"/solicitud/{uuid_created}").status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_bulk_writes_report_requests_deleted_meanwhile(monkeypatch):
+    request_data = {
+        "name": "Juan",
+        "last_name": "Perez",
+        "identification": "12345678",
+        "age": 25,
+        "affinity": "Agua",
+    }
+    uuid_created = client.post("/solicitud", json=request_data).json()['data']['id']
+    select_existing_ids = views.select_existing_ids
+
+    def select_with_vanished(db, ids=None, filters=None):
+        # A request deleted by another transaction after it was selected
+        existing_ids, missing_ids = select_existing_ids(db, ids, filters)
+        return existing_ids + ["vanished-id"], missing_ids
+
+    monkeypatch.setattr(views, "select_existing_ids", select_with_vanished)
+
+    response = client.patch("/solicitudes/estatus", json={"ids": [uuid_created], "status": "Rechazado"}).json()
+    assert (response['updated'], response['missing']) == (1, ["vanished-id"])
+    response = client.request("DELETE", "/solicitudes", json={"ids": [uuid_created]}).json()
+    assert (response['deleted'], response['missing']) == (1, ["vanished-id"])
+
+
+def test_get_request_cache_invalidated_on_writes():
+    request_data = {
+        "name": "Juan",
+        "last_name": "Perez",
+        "identification": "12345678",
+        "age": 25,
+        "affinity": "Agua",
+    }
+    uuid_created = client.post("/solicitud", json=request_data).json()['data']['id']
+
+    first_response = client.get(f"/solicitud/{uuid_created}").json()
+    hits = client.get("/cache/estadisticas").json()['data']['hits']
+    second_response = client.get(f"/solicitud/{uuid_created}").json()
+    assert first_response == second_response
+    assert client.get("/cache/estadisticas").json()['data']['hits'] == hits + 1
+
+    client.patch(f"/solicitud/{uuid_created}/estatus", json={"status": "Rechazado"})
+    assert client.get(f"/solicitud/{uuid_created}").json()['data']['status'] == 'Rechazado'
+
+    client.put(f"/solicitud/{uuid_created}", json={**request_data, "name": "Maria"})
+    assert client.get(f"/solicitud/{uuid_created}").json()['data']['name'] == 'Maria'
+
+    client.patch("/solicitudes/estatus", json={"ids": [uuid_created], "status": "Pendiente"})
+    assert client.get(f"/solicitud/{uuid_created}").json()['data']['status'] == 'Pendiente'
+
+    client.delete(f"/solicitud/{uuid_created}")
+    assert client.get(f"/solicitud/{uuid_created}").status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_get_request_conditional():
+    request_data = {
+        "name": "Juan",
+        "last_name": "Perez",
+        "identification": "12345678",
+        "age": 25,
+        "affinity": "Agua",
+    }
+    uuid_created = client.post("/solicitud", json=request_data).json()['data']['id']
+
+    response = client.get(f"/solicitud/{uuid_created}")
+    etag = response.headers['etag']
+    last_modified = response.headers['last-modified']
+    assert etag.startswith('"')
+
+    response = client.get(f"/solicitud/{uuid_created}", headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response.headers['etag'] == etag
+    assert response.content == b''
+
+    response = client.get(f"/solicitud/{uuid_created}", headers={"If-Modified-Since": last_modified})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    client.patch(f"/solicitud/{uuid_created}/estatus", json={"status": "Rechazado"})
+    response = client.get(f"/solicitud/{uuid_created}", headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers['etag'] != etag
+
+    response = client.get("/solicitud/missing-id", headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_get_all_requests_conditional():
+    request_data = {
+        "name": "Juan",
+        "last_name": "Perez",
+        "identification": "12345678",
+        "age": 25,
+        "affinity": "Tierra",
+    }
+    uuid_created = client.post("/solicitud", json=request_data).json()['data']['id']
+    params = {"affinity": "Tierra", "limit": 500}
+
+    etag = client.get("/solicitudes", params=params).headers['etag']
+    response = client.get("/solicitudes", params=params, headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    client.put(f"/solicitud/{uuid_created}", json={**request_data, "name": "Maria"})
+    response = client.get("/solicitudes", params=params, headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_200_OK
+    etag = response.headers['etag']
+
+    client.delete(f"/solicitud/{uuid_created}")
+    response = client.get("/solicitudes", params=params, headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_200_OK
+
+
+def test_get_assignments_stats():
+    request_data = {
+        "name": "Juan",
+        "last_name": "Perez",
+        "identification": "12345678",
+        "age": 25,
+        "affinity": "Agua",
+    }
+    uuid_created = client.post("/solicitud", json=request_data).json()['data']['id']
+    client.patch(f"/solicitud/{uuid_created}/estatus", json={"status": "Aprobado"})
+
+    response = client.get("/asignaciones/estadisticas")
+
+    assert response.status_code == status.HTTP_200_OK
+    stats = response.json()['data']
+    assert len(stats['grimorios']) == 5
+    assert stats['total_assigned'] == sum(grimorio['assigned'] for grimorio in stats['grimorios'])
+    assert stats['total_assigned'] == sum(stats['tipo_trebol'].values())
+    assert stats['total_requests'] == sum(stats['status'].values()) == sum(stats['affinity'].values())
+    assert stats['status']['Aprobado'] >= 1
+    assert abs(sum(grimorio['expected_share'] for grimorio in stats['grimorios']) - 1) < 1e-9
+    assert abs(sum(grimorio['observed_share'] for grimorio in stats['grimorios']) - 1) < 1e-9
+
+
+def test_query_budgets(assert_max_queries):
+    request_data = {
+        "name": "Juan",
+        "last_name": "Perez",
+        "identification": "12345678",
+        "age": 25,
+        "affinity": "Agua",
+    }
+
+    with assert_max_queries(2):
+        uuid_created = client.post("/solicitud", json=request_data).json()["data"]["id"]
+    with assert_max_queries(1):
+        client.get("/solicitudes")
+    with assert_max_queries(1):
+        client.get(f"/solicitud/{uuid_created}")
+    with assert_max_queries(2):
+        client.patch(f"/solicitud/{uuid_created}/estatus", json={"status": "Aprobado"})
+    with assert_max_queries(2):
+        client.get("/asignaciones")
+    with assert_max_queries(1):
+        client.put(f"/solicitud/{uuid_created}", json={**request_data, "age": 26})
+    with assert_max_queries(1):
+        client.delete(f"/solicitud/{uuid_created}")
+
+
+def test_search_requests():
+    people = [
+        ("Zacarías", "Quíntero", "5550001"),
+        ("Zacarias", "Olmedo", "5550002"),
+        ("Ulises", "Zacatecas", "55500031"),
+        ("Zoraida", "Zacarías", "5550004"),
+    ]
+    for name, last_name, identification in people:
+        client.post("/solicitud", json={
+            "name": name, "last_name": last_name, "identification": identification, "age": 30, "affinity": "Luz"
+        })
+
+    response = client.get("/solicitudes/buscar", params={"q": "ZACA"})
+    assert response.status_code == status.HTTP_200_OK
+    found = [(request["name"], request["last_name"]) for request in response.json()["data"]]
+    # Ordered by the matched value, name or last name, accents and case ignored, then by id
+    assert set(found[:3]) == {("Zacarias", "Olmedo"), ("Zacarías", "Quíntero"), ("Zoraida", "Zacarías")}
+    assert found[3] == ("Ulises", "Zacatecas")
+
+    response = client.get("/solicitudes/buscar", params={"q": "zacarias quin"})
+    assert [request["identification"] for request in response.json()["data"]] == ["5550001"]
+
+    response = client.get("/solicitudes/buscar", params={"q": "5550003"})
+    assert [request["identification"] for request in response.json()["data"]] == ["55500031"]
+
+    response = client.get("/solicitudes/buscar", params={"q": "5550002"})
+    assert [request["identification"] for request in response.json()["data"]] == ["5550002"]
+
+
+def test_search_requests_by_free_form_identification():
+    client.post("/solicitud", json={
+        "name": "Xiomara", "last_name": "Abarca", "identification": "AB-123", "age": 30, "affinity": "Luz"
+    })
+
+    response = client.get("/solicitudes/buscar", params={"q": "AB-123"})
+    assert [request["identification"] for request in response.json()["data"]] == ["AB-123"]
+    # Found by the identification walk and by the last name one, listed once
+    response = client.get("/solicitudes/buscar", params={"q": "AB"})
+    assert [request["identification"] for request in response.json()["data"]] == ["AB-123"]
+
+
+def test_search_requests_pages_and_updates():
+    uuids = []
+    for last_name in ["Yrigoyen", "Yrurtia", "Ybarra", "Yriarte", "Ynsaurralde"]:
+        response = client.post("/solicitud", json={
+            "name": "Yrene", "last_name": last_name, "identification": "1", "age": 30, "affinity": "Luz"
+        })
+        uuids.append(response.json()["data"]["id"])
+
+    found = []
+    cursor = None
+    while True:
+        params = {"q": "yr", "limit": 2, **({"cursor": cursor} if cursor else {})}
+        page = client.get("/solicitudes/buscar", params=params).json()
+        found.extend(request["id"] for request in page["data"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert sorted(found) == sorted(uuids)
+
+    client.put(f"/solicitud/{uuids[0]}", json={
+        "name": "Ángela", "last_name": "Yrigoyen", "identification": "1", "age": 30, "affinity": "Luz"
+    })
+    response = client.get("/solicitudes/buscar", params={"q": "angela yri"})
+    assert [request["id"] for request in response.json()["data"]] == [uuids[0]]
+
+    client.delete(f"/solicitud/{uuids[0]}")
+    response = client.get("/solicitudes/buscar", params={"q": "angela"})
+    assert response.json()["data"] == []
+
+
+def test_search_requests_invalid_query():
+    assert client.get("/solicitudes/buscar", params={"q": " "}).status_code == status.HTTP_400_BAD_REQUEST
+    response = client.get("/solicitudes/buscar", params={"q": "juan", "cursor": "invalid"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert client.get("/solicitudes/buscar").status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+def test_create_request_idempotent():
+    request_data = {
+        "name": "Juan",
+        "last_name": "Perez",
+        "identification": "87654321",
+        "age": 25,
+        "affinity": "Agua",
+    }
+    headers = {"Idempotency-Key": "create-juan-perez"}
+
+    first = client.post("/solicitud", json=request_data, headers=headers)
+    assert first.status_code == status.HTTP_200_OK
+    assert "Idempotent-Replayed" not in first.headers
+
+    with count_queries() as statements:
+        retry = client.post("/solicitud", json=request_data, headers=headers)
+    assert retry.status_code == status.HTTP_200_OK
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.json()["data"] == first.json()["data"]
+    assert not any("requests" in statement for statement in statements)
+
+    uuid_created = first.json()["data"]["id"]
+    assert client.get(f"/solicitud/{uuid_created}").status_code == status.HTTP_200_OK
+    other = client.post("/solicitud", json=request_data, headers={"Idempotency-Key": "create-juan-perez-2"})
+    assert other.json()["data"]["id"] != uuid_created
+
+
+def test_create_request_idempotency_key_reused():
+    request_data = {
+        "name": "Juan",
+        "last_name": "Perez",
+        "identification": "87654322",
+        "age": 25,
+        "affinity": "Agua",
+    }
+    headers = {"Idempotency-Key": "create-reused"}
+    assert client.post("/solicitud", json=request_data, headers=headers).status_code == status.HTTP_200_OK
+
+    response = client.post("/solicitud", json={**request_data, "age": 26}, headers=headers)
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    assert response.json()["detail"] == "Idempotency-Key already used with a different request"
+
+    response = client.post("/solicitud", json=request_data, headers={"Idempotency-Key": ""})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
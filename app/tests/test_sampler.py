@@ -0,0 +1,55 @@
+from collections import Counter
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.databases.database import Base
+from app.requests.models import Grimorio
+from app.requests.sampler import GrimorioSampler
+from app.requests.sampler import get_grimorio_sampler
+from app.requests.sampler import set_grimorio_sampler_seed
+from app.scripts.create_grimorio_fixtures import create_grimorio_fixtures
+
+
+def test_sampler_follows_ponderacion():
+    sampler = GrimorioSampler([("a", 60), ("b", 25), ("c", 10), ("d", 4), ("e", 1), ("never", 0)], seed=1)
+    draws = Counter(sampler.draw_many(100000))
+
+    assert "never" not in draws
+    assert None not in draws
+    assert abs(draws["a"] / 100000 - 0.60) < 0.01
+    assert abs(draws["e"] / 100000 - 0.01) < 0.005
+
+
+def test_sampler_is_reproducible_with_seed():
+    weights = [("a", 60), ("b", 25), ("c", 15)]
+    assert GrimorioSampler(weights, seed=7).draw_many(50) == GrimorioSampler(weights, seed=7).draw_many(50)
+
+
+def test_sampler_without_weights():
+    with pytest.raises(LookupError):
+        GrimorioSampler([("a", 0)])
+
+
+def test_get_grimorio_sampler_is_cached_and_invalidated():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+
+    with pytest.raises(LookupError):
+        get_grimorio_sampler(db)
+
+    create_grimorio_fixtures(db)
+    sampler = get_grimorio_sampler(db)
+    assert get_grimorio_sampler(db) is sampler
+    assert set(sampler.grimorio_ids) == {grimorio.id for grimorio in db.query(Grimorio).all()}
+
+    set_grimorio_sampler_seed(3)
+    first_draws = get_grimorio_sampler(db).draw_many(20)
+    set_grimorio_sampler_seed(3)
+    assert get_grimorio_sampler(db) is not sampler
+    assert get_grimorio_sampler(db).draw_many(20) == first_draws
+    set_grimorio_sampler_seed(None)
+    db.close()
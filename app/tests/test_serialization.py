@@ -0,0 +1,57 @@
+import json
+import time
+from datetime import datetime
+from typing import List
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.requests.models import Grimorio
+from app.requests.models import Request
+from app.requests.schemas import RequestDetailResponse
+
+
+def build_requests(count):
+    grimorio = Grimorio(id="grimorio", tipo_trebol=1, ponderacion=60, name="Grimorio de un trébol")
+    now = datetime.now()
+    requests = []
+    for index in range(count):
+        request = Request(
+            id=f"request-{index}", name="Juan", last_name="Perez", identification="12345678", age=25,
+            affinity="Agua", status="Aprobado", created_at=now, updated_at=now, grimorio_id=grimorio.id,
+        )
+        # Loaded like joinedload does, without populating the grimorio.requests backref
+        set_committed_value(request, "grimorio", grimorio)
+        requests.append(request)
+    return requests
+
+
+def test_serialization_benchmark():
+    requests = build_requests(1000)
+    adapter = TypeAdapter(List[RequestDetailResponse])
+
+    def before():
+        # Previous path: jsonable_encoder walks the ORM objects, then the default JSONResponse
+        return json.dumps(jsonable_encoder({"data": requests})).encode()
+
+    def after():
+        # Response model validated from attributes, then ORJSONResponse
+        data = adapter.dump_python(adapter.validate_python(requests, from_attributes=True), mode="json")
+        return orjson.dumps({"data": data})
+
+    def best_of(fn, repeat=5):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    assert orjson.loads(after())["data"][0]["grimorio"]["name"] == "Grimorio de un trébol"
+
+    before_time = best_of(before)
+    after_time = best_of(after)
+    print(f"\nserialization per 1k rows: before {before_time * 1000:.2f}ms, after {after_time * 1000:.2f}ms")
+    assert after_time < before_time
@@ -0,0 +1,90 @@
+import asyncio
+
+from fastapi import status
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.databases.database import build_async_engine
+from app.databases.database import build_engine
+from app.databases.migrations import LATEST_VERSION
+from app.databases.startup import warm_up
+from app.helpers.metrics import count_queries
+from app import main
+from app.main import app
+from app.scripts.create_grimorio_fixtures import create_grimorio_fixtures
+from app.settings import Settings
+from app.tests.test_requests import client
+
+
+def test_warm_up_skips_ddl_on_current_schema(tmp_path):
+    database_url = f"sqlite:///{tmp_path / 'startup.db'}"
+    engine_settings = Settings(_env_file=None, db_pool_size=3)
+    engine = build_engine(database_url, engine_settings)
+
+    async def start():
+        async_engine = build_async_engine(database_url, engine_settings)
+        try:
+            return await warm_up(engine, async_engine)
+        finally:
+            await async_engine.dispose()
+
+    first_start = asyncio.run(start())
+    assert first_start["migrations"] == list(range(1, LATEST_VERSION + 1))
+    assert first_start["pool_connections"] == 6
+    assert first_start["grimorios_loaded"] is False
+
+    with Session(engine) as db:
+        create_grimorio_fixtures(db)
+    with count_queries() as statements:
+        second_start = asyncio.run(start())
+
+    assert second_start["migrations"] == []
+    assert second_start["grimorios_loaded"] is True
+    # A single lookup of schema_migrations instead of inspecting every table
+    assert sum("table_info" in statement for statement in statements) == 1
+    assert not any(statement.lstrip().upper().startswith("CREATE") for statement in statements)
+    engine.dispose()
+
+
+def test_ready_endpoint(monkeypatch):
+    monkeypatch.setattr(app.state, "ready", False)
+
+    response = client.get("/ready")
+
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert response.json() == {"status": "starting"}
+
+    monkeypatch.setattr(app.state, "ready", True)
+    monkeypatch.setattr(app.state, "startup", {"startup_seconds": 0.5})
+
+    response = client.get("/ready")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {"status": "ready", "startup": {"startup_seconds": 0.5}}
+
+
+def test_lifespan_disposes_the_engines(tmp_path, monkeypatch):
+    database_url = f"sqlite:///{tmp_path / 'lifespan.db'}"
+    engine_settings = Settings(_env_file=None, db_pool_size=2)
+    engine = build_engine(database_url, engine_settings)
+    monkeypatch.setattr(main, "engine", engine)
+    monkeypatch.setattr(main.settings, "job_workers", 0)
+    monkeypatch.setattr(main.settings, "async_assignment", False)
+    monkeypatch.setattr(main.settings, "archive_interval", 0)
+
+    async def run():
+        async_engine = build_async_engine(database_url, engine_settings)
+        monkeypatch.setattr(main, "async_engine", async_engine)
+        async with main.lifespan(app):
+            async with async_engine.connect() as connection:
+                await connection.execute(text("SELECT 1"))
+            with engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+            assert async_engine.pool.checkedin() > 0
+            assert engine.pool.checkedin() > 0
+        return async_engine
+
+    async_engine = asyncio.run(run())
+
+    assert async_engine.pool.checkedin() == 0
+    assert engine.pool.checkedin() == 0
@@ -0,0 +1,79 @@
+import re
+import time
+
+from app.requests.models import Affinity
+from app.requests.models import RequestStatus
+from app.requests.validators import RequestValidation
+from app.requests.validators import status_exists
+from app.requests.validators import valid_affinity
+from app.requests.validators import validate_field
+from app.requests.validators import validate_request
+from app.requests.validators import validate_requests
+
+
+def test_validate_request():
+    assert validate_request({"name": "Juan", "last_name": "Pérez"})
+    assert validate_request({"affinity": "Agua", "last_name": "Pérez", "name": "Juan"})
+    assert not validate_request({"name": "Juan Carlos", "last_name": "Perez"})
+    assert not validate_request({"name": "Juan", "last_name": None})
+    assert not validate_request({"name": "Juan"})
+
+
+def test_validate_field_accepts_pattern_strings():
+    assert validate_field("abc", r'^[a-c]+$')
+    assert validate_field("abc", re.compile(r'^[a-c]+$'))
+    assert not validate_field(123, r'^[a-c]+$')
+
+
+def test_valid_affinity_and_status_exists():
+    assert valid_affinity("Agua")
+    assert valid_affinity(Affinity.AGUA)
+    assert not valid_affinity("BEER")
+    assert status_exists("Aprobado")
+    assert status_exists(RequestStatus.APPROVED)
+    assert not status_exists("INVALID_STATUS")
+
+
+def test_validate_requests_batch():
+    records = [
+        {"name": "Juan", "last_name": "Perez", "affinity": "Agua"},
+        {"name": "María Alejandra Valentina", "last_name": "Perez", "affinity": "Luz"},
+        {"name": "Juan", "last_name": "Perez", "affinity": "BEER"},
+    ]
+    assert validate_requests(records) == [
+        RequestValidation(True, True),
+        RequestValidation(False, True),
+        RequestValidation(True, False),
+    ]
+
+
+def test_validate_requests_benchmark():
+    records = [
+        {"name": "Juan", "last_name": "Perez", "affinity": "Agua"},
+        {"name": "María Alejandra Valentina", "last_name": "Perez", "affinity": "Luz"},
+        {"name": "Juan", "last_name": "Perez", "affinity": "BEER"},
+    ] * 10000
+
+    def legacy_validate(record):
+        # Previous implementation: raw patterns and linear scans of the enum members
+        name_pattern = r'^[a-zA-ZáéíóúÁÉÍÓÚüÜñÑ]{1,20}$'
+        valid_names = (
+            bool(re.match(name_pattern, record["name"])) and bool(re.match(name_pattern, record["last_name"]))
+        )
+        return valid_names, record["affinity"] in Affinity.__members__.values()
+
+    def best_of(fn, repeat=3):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    batch_time = best_of(lambda: validate_requests(records))
+    legacy_time = best_of(lambda: [legacy_validate(record) for record in records])
+
+    print(f"\nvalidate_requests: {batch_time / len(records) * 1e6:.2f}us/record, "
+          f"legacy: {legacy_time / len(records) * 1e6:.2f}us/record")
+    # Generous bound so the check stays stable on slow CI runners
+    assert batch_time / len(records) < 20e-6
@@ -0,0 +1,149 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException
+from sqlalchemy import event
+from sqlalchemy import func
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from app.databases.database import Base
+from app.helpers.db_dependency import ThreadedSession
+from app.requests import endpoints
+from app.requests.models import Request
+from app.requests.write_batcher import CreateBatcher
+from app.tests.test_requests import TestingSessionLocal
+from app.tests.test_requests import client
+
+
+def request_data(index, affinity="Agua", name="Juan"):
+    return {
+        "name": name,
+        "last_name": "Perez",
+        "identification": f"{index:08d}",
+        "age": 25,
+        "affinity": affinity,
+    }
+
+
+def run_with_batcher(coroutine_fn, **batcher_kwargs):
+    async def runner():
+        engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+        commits = []
+        event.listen(engine.sync_engine, "commit", lambda connection: commits.append(connection))
+        session_local = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+        batcher = CreateBatcher(session_factory=session_local, **batcher_kwargs)
+        result = await coroutine_fn(batcher)
+        async with session_local() as db:
+            total = await db.scalar(select(func.count()).select_from(Request))
+        await engine.dispose()
+        return result, total, len(commits), batcher.flushes
+
+    return asyncio.run(runner())
+
+
+def test_concurrent_creates_share_transactions():
+    async def scenario(batcher):
+        return await asyncio.gather(*(batcher.submit(request_data(index)) for index in range(50)))
+
+    results, total, commits, flushes = run_with_batcher(scenario, max_batch_size=20, max_delay=0.01)
+
+    assert total == 50
+    assert flushes == 3
+    assert commits == 3
+    assert [result["identification"] for result in results] == [f"{index:08d}" for index in range(50)]
+    assert all(result["status"] == "Pendiente" and result["created_at"] for result in results)
+
+
+def test_each_caller_gets_its_own_outcome():
+    async def scenario(batcher):
+        return await asyncio.gather(
+            batcher.submit(request_data(1)),
+            batcher.submit(request_data(2, affinity="Metal")),
+            batcher.submit(request_data(3, name="Juan123")),
+            return_exceptions=True,
+        )
+
+    (created, invalid, rejected), total, commits, flushes = run_with_batcher(scenario, max_delay=0.01)
+
+    assert flushes == 1
+    assert total == 2
+    assert created["status"] == "Pendiente"
+    assert isinstance(invalid, HTTPException)
+    assert invalid.detail == "Invalid affinity: Metal"
+    assert rejected["status"] == "Rechazado"
+
+
+def test_single_create_flushes_after_delay():
+    async def scenario(batcher):
+        return await batcher.submit(request_data(1))
+
+    result, total, commits, flushes = run_with_batcher(scenario, max_batch_size=100, max_delay=0.001)
+
+    assert total == 1
+    assert flushes == 1
+    assert result["affinity"] == "Agua"
+
+
+def test_cancelled_caller_does_not_block_its_batch():
+    async def scenario(batcher):
+        first = asyncio.create_task(batcher.submit(request_data(1)))
+        await asyncio.sleep(0)
+        # The second submit fills the batch and starts the flush, then its client goes away
+        second = asyncio.create_task(batcher.submit(request_data(2)))
+        await asyncio.sleep(0)
+        second.cancel()
+        return await asyncio.wait_for(first, 5)
+
+    result, total, commits, flushes = run_with_batcher(scenario, max_batch_size=2, max_delay=10)
+
+    assert result["identification"] == "00000001"
+    assert total == 2
+    assert flushes == 1
+
+
+def test_failed_batch_fails_every_caller():
+    async def scenario(batcher):
+        return await asyncio.gather(
+            batcher.submit(request_data(1)),
+            batcher.submit(request_data(2)),
+            return_exceptions=True,
+        )
+
+    def broken_session_factory():
+        raise RuntimeError("database unavailable")
+
+    async def runner():
+        batcher = CreateBatcher(session_factory=broken_session_factory, max_delay=0.001)
+        return await scenario(batcher)
+
+    results = asyncio.run(runner())
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_create_request_through_batcher(monkeypatch):
+    @asynccontextmanager
+    async def testing_session():
+        db = TestingSessionLocal()
+        try:
+            yield ThreadedSession(db)
+        finally:
+            db.close()
+
+    monkeypatch.setattr(endpoints.settings, "write_batching", True)
+    monkeypatch.setattr(endpoints, "create_batcher", CreateBatcher(session_factory=testing_session, max_delay=0.001))
+
+    response = client.post("/solicitud", json=request_data(1))
+
+    assert response.status_code == 200
+    assert response.json()["data"]["status"] == "Pendiente"
+
+    response = client.post("/solicitud", json=request_data(2, affinity="Metal"))
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid affinity: Metal"